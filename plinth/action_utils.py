@@ -5,16 +5,25 @@ Python action utility functions.
 
 import logging
 import os
-import shutil
+import socket
 import subprocess
 import tempfile
 from contextlib import contextmanager
 
+from plinth import addresses
+
 logger = logging.getLogger(__name__)
 
 UWSGI_ENABLED_PATH = '/etc/uwsgi/apps-enabled/{config_name}.ini'
 UWSGI_AVAILABLE_PATH = '/etc/uwsgi/apps-available/{config_name}.ini'
 
+# Directory with symlinks to enabled items and the suffix of the links
+WEBSERVER_ENABLED_PATHS = {
+    'config': ('/etc/apache2/conf-enabled', '.conf'),
+    'site': ('/etc/apache2/sites-enabled', '.conf'),
+    'module': ('/etc/apache2/mods-enabled', '.load'),
+}
+
 
 def is_systemd_running():
     """Return if we are running under systemd."""
@@ -124,18 +133,12 @@ def service_action(service_name, action):
 
 
 def webserver_is_enabled(name, kind='config'):
-    """Return whether a config/module/site is enabled in Apache."""
-    if not shutil.which('a2query'):
-        return False
+    """Return whether a config/module/site is enabled in Apache.
 
-    option_map = {'config': '-c', 'site': '-s', 'module': '-m'}
-    try:
-        # Don't print anything on the terminal
-        subprocess.check_output(['a2query', option_map[kind], name],
-                                stderr=subprocess.STDOUT)
-        return True
-    except subprocess.CalledProcessError:
-        return False
+    Like a2query, check for the symlink in the *-enabled directory.
+    """
+    directory, suffix = WEBSERVER_ENABLED_PATHS[kind]
+    return os.path.exists(os.path.join(directory, name + suffix))
 
 
 def webserver_enable(name, kind='config', apply_changes=True):
@@ -273,71 +276,74 @@ def uwsgi_disable(config_name):
     service_start('uwsgi')
 
 
+def read_file_tail(path, lines=100, before=None, pattern=None,
+                   block_size=65536):
+    """Return the last lines of a file without reading the whole file.
+
+    The file is read backwards in blocks starting from the byte offset
+    'before' or from the end of the file. If 'pattern' is given, only lines
+    containing it are returned. Along with the lines, the byte offset at which
+    the first returned line starts is returned. It can be used as 'before' to
+    retrieve the previous page of lines.
+
+    """
+    if pattern is not None:
+        pattern = pattern.encode()
+
+    found = []
+    with open(path, 'rb') as file_handle:
+        size = file_handle.seek(0, os.SEEK_END)
+        end = size if before is None else max(0, min(before, size))
+        position = start = end
+        buffer = b''
+        while position > 0 and len(found) < lines:
+            read_size = min(block_size, position)
+            position -= read_size
+            file_handle.seek(position)
+            buffer = file_handle.read(read_size) + buffer
+            if position:
+                # Skip the partial line at the beginning of the buffer
+                newline = buffer.find(b'\n')
+                if newline < 0:
+                    continue
+
+                buffer, chunk = buffer[:newline + 1], buffer[newline + 1:]
+            else:
+                buffer, chunk = b'', buffer
+
+            line_offset = position + len(buffer) + len(chunk)
+            for line in reversed(chunk.splitlines(keepends=True)):
+                line_offset -= len(line)
+                start = line_offset
+                if pattern is None or pattern in line:
+                    found.append(line)
+                    if len(found) >= lines:
+                        break
+
+    return {
+        'lines': [
+            line.decode(errors='replace').rstrip('\n')
+            for line in reversed(found)
+        ],
+        'start': start,
+        'end': end,
+        'size': size,
+    }
+
+
 def get_addresses():
     """Return a list of IP addresses and hostnames."""
-    addresses = get_ip_addresses()
-
-    hostname = get_hostname()
-    addresses.append({
-        'kind': '4',
-        'address': 'localhost',
-        'numeric': False,
-        'url_address': 'localhost'
-    })
-    addresses.append({
-        'kind': '6',
-        'address': 'localhost',
-        'numeric': False,
-        'url_address': 'localhost'
-    })
-    addresses.append({
-        'kind': '4',
-        'address': hostname,
-        'numeric': False,
-        'url_address': hostname
-    })
-
-    # XXX: When a hostname is resolved to IPv6 address, it may likely
-    # be link-local address.  Link local IPv6 addresses are valid only
-    # for a given link and need to be scoped with interface name such
-    # as '%eth0' to work.  Tools such as curl don't seem to handle
-    # this correctly.
-    # addresses.append({'kind': '6', 'address': hostname, 'numeric': False})
-
-    return addresses
+    return addresses.get_addresses()
 
 
 def get_ip_addresses():
     """Return a list of IP addresses assigned to the system."""
-    addresses = []
-
-    output = subprocess.check_output(['ip', '-o', 'addr'])
-    for line in output.decode().splitlines():
-        parts = line.split()
-        address = {
-            'kind': '4' if parts[2] == 'inet' else '6',
-            'address': parts[3].split('/')[0],
-            'url_address': parts[3].split('/')[0],
-            'numeric': True,
-            'scope': parts[5],
-            'interface': parts[1]
-        }
-
-        if address['kind'] == '6' and address['numeric']:
-            if address['scope'] != 'link':
-                address['url_address'] = '[{0}]'.format(address['address'])
-            else:
-                address['url_address'] = '[{0}%{1}]'.format(
-                    address['url_address'], address['interface'])
-
-        addresses.append(address)
-
-    return addresses
+    return addresses.get_ip_addresses()
 
 
 def get_hostname():
     """Return the current hostname."""
-    return subprocess.check_output(['hostname']).decode().strip()
+    return socket.gethostname()
 
 
 def dpkg_reconfigure(package, config):
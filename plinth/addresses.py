@@ -0,0 +1,255 @@
+# SPDX-License-Identifier: AGPL-3.0-or-later
+"""
+Enumerate the IP addresses of the machine using netlink.
+
+Addresses are requested from the kernel with an RTM_GETADDR dump on a netlink
+socket instead of running 'ip addr' and parsing its output. Each address is
+returned both as is and formatted for use as the host part of a URL. Once
+monitoring has started on the GLib main loop, the list is kept until the
+kernel announces that an address or a link has changed. Without monitoring,
+the addresses are read on every call. Importing this module does not require
+GLib so that it can be used by actions.
+"""
+
+import logging
+import socket
+import struct
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Netlink message types and flags, see linux/netlink.h and linux/rtnetlink.h
+_NLMSG_ERROR = 2
+_NLMSG_DONE = 3
+_RTM_NEWADDR = 20
+_RTM_GETADDR = 22
+_NLM_F_REQUEST = 0x1
+_NLM_F_DUMP = 0x300
+
+# Attributes of an address message, see linux/if_addr.h
+_IFA_ADDRESS = 1
+_IFA_LOCAL = 2
+_IFA_LABEL = 3
+
+# Multicast groups announcing changes to links and addresses
+_RTMGRP_LINK = 0x1
+_RTMGRP_IPV4_IFADDR = 0x10
+_RTMGRP_IPV6_IFADDR = 0x100
+
+_NLMSG_HEADER = struct.Struct('=IHHII')
+_IFADDRMSG = struct.Struct('=BBBBI')
+_RTATTR = struct.Struct('=HH')
+
+_BUFFER_SIZE = 65536
+
+_SCOPES = {0: 'global', 200: 'site', 253: 'link', 254: 'host'}
+
+_KINDS = {socket.AF_INET: '4', socket.AF_INET6: '6'}
+
+_lock = threading.Lock()
+_cache = {'addresses': None, 'generation': 0}
+_monitoring = {}
+
+
+def get_ip_addresses():
+    """Return a list of IP addresses assigned to the system.
+
+    Each address is a dictionary with the kind ('4' or '6'), the address, the
+    address as used in a URL, the scope and the interface name.
+    """
+    with _lock:
+        addresses = _cache['addresses']
+        generation = _cache['generation']
+
+    if addresses is None:
+        addresses = _dump_addresses()
+        with _lock:
+            # Don't keep the result if a change was announced meanwhile
+            if _monitoring and generation == _cache['generation']:
+                _cache['addresses'] = addresses
+
+    return [dict(address) for address in addresses]
+
+
+def get_addresses():
+    """Return a list of IP addresses and hostnames."""
+    addresses = get_ip_addresses()
+
+    hostname = socket.gethostname()
+    addresses.append({
+        'kind': '4',
+        'address': 'localhost',
+        'numeric': False,
+        'url_address': 'localhost'
+    })
+    addresses.append({
+        'kind': '6',
+        'address': 'localhost',
+        'numeric': False,
+        'url_address': 'localhost'
+    })
+    addresses.append({
+        'kind': '4',
+        'address': hostname,
+        'numeric': False,
+        'url_address': hostname
+    })
+
+    # XXX: When a hostname is resolved to IPv6 address, it may likely
+    # be link-local address.  Link local IPv6 addresses are valid only
+    # for a given link and need to be scoped with interface name such
+    # as '%eth0' to work.  Tools such as curl don't seem to handle
+    # this correctly.
+    # addresses.append({'kind': '6', 'address': hostname, 'numeric': False})
+
+    return addresses
+
+
+def get_url_address(kind, address, scope, interface):
+    """Return an address formatted as the host part of a URL.
+
+    IPv6 addresses are enclosed in brackets and link-local ones are scoped
+    with the interface name.
+    """
+    if kind != '6':
+        return address
+
+    if scope != 'link':
+        return '[{0}]'.format(address)
+
+    return '[{0}%{1}]'.format(address, interface)
+
+
+def invalidate():
+    """Forget the cached list of addresses."""
+    with _lock:
+        _cache['addresses'] = None
+        _cache['generation'] += 1
+
+
+def _dump_addresses():
+    """Request all addresses from the kernel and return them."""
+    request = _NLMSG_HEADER.pack(
+        _NLMSG_HEADER.size + _IFADDRMSG.size, _RTM_GETADDR,
+        _NLM_F_REQUEST | _NLM_F_DUMP, 1, 0) + _IFADDRMSG.pack(
+            socket.AF_UNSPEC, 0, 0, 0, 0)
+
+    addresses = []
+    with socket.socket(socket.AF_NETLINK, socket.SOCK_RAW,
+                       socket.NETLINK_ROUTE) as sock:
+        sock.bind((0, 0))
+        sock.send(request)
+        while True:
+            for message_type, payload in _parse_messages(
+                    sock.recv(_BUFFER_SIZE)):
+                if message_type == _NLMSG_DONE:
+                    # Same order as 'ip addr': by interface, IPv4 first
+                    addresses.sort(key=lambda item: (item[0], item[1]['kind']))
+                    return [address for _, address in addresses]
+
+                if message_type == _NLMSG_ERROR:
+                    error = -struct.unpack_from('=i', payload)[0]
+                    raise OSError(error, 'Unable to list addresses')
+
+                if message_type == _RTM_NEWADDR:
+                    address = _parse_address(payload)
+                    if address:
+                        addresses.append(address)
+
+
+def _align(length):
+    """Return a length rounded up to netlink alignment of 4 bytes."""
+    return (length + 3) & ~3
+
+
+def _parse_messages(data):
+    """Yield (type, payload) of netlink messages in received data."""
+    offset = 0
+    while offset + _NLMSG_HEADER.size <= len(data):
+        length, message_type = _NLMSG_HEADER.unpack_from(data, offset)[:2]
+        if length < _NLMSG_HEADER.size:
+            break
+
+        yield message_type, data[offset + _NLMSG_HEADER.size:offset + length]
+        offset += _align(length)
+
+
+def _parse_address(payload):
+    """Return (interface index, address) from an RTM_NEWADDR message."""
+    family, _, _, scope, index = _IFADDRMSG.unpack_from(payload)
+    if family not in _KINDS:
+        return None
+
+    attributes = {}
+    offset = _IFADDRMSG.size
+    while offset + _RTATTR.size <= len(payload):
+        length, attribute_type = _RTATTR.unpack_from(payload, offset)
+        if length < _RTATTR.size:
+            break
+
+        attributes[attribute_type] = payload[offset + _RTATTR.size:offset +
+                                             length]
+        offset += _align(length)
+
+    # For point-to-point links, IFA_ADDRESS is the address of the peer
+    value = attributes.get(_IFA_LOCAL) or attributes.get(_IFA_ADDRESS)
+    if not value:
+        return None
+
+    try:
+        interface = socket.if_indextoname(index)
+    except OSError:
+        label = attributes.get(_IFA_LABEL, b'').rstrip(b'\0')
+        interface = label.decode(errors='replace') or str(index)
+
+    kind = _KINDS[family]
+    address = socket.inet_ntop(family, value)
+    scope = _SCOPES.get(scope, str(scope))
+    return index, {
+        'kind': kind,
+        'address': address,
+        'url_address': get_url_address(kind, address, scope, interface),
+        'numeric': True,
+        'scope': scope,
+        'interface': interface,
+    }
+
+
+def _on_event(_fd, _condition, sock):
+    """Invalidate the cache when the kernel announces changes."""
+    while True:
+        try:
+            sock.recv(_BUFFER_SIZE)
+        except BlockingIOError:
+            break
+        except OSError:
+            # Receive buffer overflowed and changes were lost (ENOBUFS)
+            continue
+
+    invalidate()
+    return True  # Keep watching
+
+
+def init():
+    """Watch for changes to addresses and links on the GLib main loop."""
+    if _monitoring:
+        return
+
+    from plinth.utils import import_from_gi
+    glib = import_from_gi('GLib', '2.0')
+
+    try:
+        sock = socket.socket(socket.AF_NETLINK, socket.SOCK_RAW,
+                             socket.NETLINK_ROUTE)
+        sock.bind(
+            (0, _RTMGRP_LINK | _RTMGRP_IPV4_IFADDR | _RTMGRP_IPV6_IFADDR))
+        sock.setblocking(False)
+    except OSError as exception:
+        logger.warning('Unable to monitor network addresses: %s', exception)
+        return
+
+    _monitoring['socket'] = sock
+    _monitoring['source'] = glib.io_add_watch(sock.fileno(),
+                                              glib.PRIORITY_DEFAULT,
+                                              glib.IO_IN, _on_event, sock)
+    invalidate()
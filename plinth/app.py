@@ -4,6 +4,7 @@ Base class for all Freedombox applications.
 """
 
 import collections
+import contextlib
 
 from . import clients as clients_module
 
@@ -40,6 +41,8 @@ class App:
 
     _all_apps = collections.OrderedDict()
 
+    _change_contexts = []
+
     def __init__(self):
         """Initialize the app object."""
         if not self.app_id:
@@ -60,6 +63,26 @@ class App:
         """Return a list of all apps."""
         return cls._all_apps.values()
 
+    @classmethod
+    def register_change_context(cls, context):
+        """Register a context manager to wrap enabling/disabling of apps.
+
+        All the components of an app are enabled or disabled within the
+        registered contexts. Component types may use this to apply their
+        changes together, for example with a single reload of a server.
+        """
+        if context not in cls._change_contexts:
+            cls._change_contexts.append(context)
+
+    @contextlib.contextmanager
+    def _changes(self):
+        """Enter all the registered change contexts."""
+        with contextlib.ExitStack() as stack:
+            for context in self._change_contexts:
+                stack.enter_context(context())
+
+            yield
+
     def add(self, component):
         """Add a component to an app."""
         component.app_id = self.app_id
@@ -99,13 +122,15 @@ class App:
 
     def enable(self):
         """Enable all the components of the app."""
-        for component in self.components.values():
-            component.enable()
+        with self._changes():
+            for component in self.components.values():
+                component.enable()
 
     def disable(self):
-        """Enable all the components of the app."""
-        for component in reversed(self.components.values()):
-            component.disable()
+        """Disable all the components of the app."""
+        with self._changes():
+            for component in reversed(self.components.values()):
+                component.disable()
 
     def is_enabled(self):
         """Return whether all the leader components are enabled.
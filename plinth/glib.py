@@ -6,7 +6,7 @@ Module to handle glib main loop and provide asynchronous utilities.
 import logging
 import threading
 
-from plinth import dbus, network
+from plinth import addresses, dbus, metrics, network
 from plinth.utils import import_from_gi
 
 glib = import_from_gi('GLib', '2.0')
@@ -36,9 +36,17 @@ def _run():
     logger.info('Started new thread for glib main loop.')
 
     # Initialize all modules that use glib main loop
+    addresses.init()
     dbus.init()
     network.init()
 
+    # Sample usage of disk space and memory soon after start and periodically
+    schedule(3, metrics.sample, repeat=False)
+    schedule(metrics.INTERVAL, metrics.sample)
+
+    # Record usage of resources by the daemons of all apps
+    schedule(metrics.APP_INTERVAL, metrics.sample_apps)
+
     global _main_loop
     _main_loop = glib.MainLoop()
     _main_loop.run()
@@ -0,0 +1,479 @@
+# SPDX-License-Identifier: AGPL-3.0-or-later
+"""
+Sample usage of resources by the system and by apps at a fixed interval.
+
+Samples of the system are taken on the GLib scheduler by reading statvfs() of
+the root file system, /proc/meminfo and, inside a memory limited container,
+the cgroup v1 or v2 memory files. No processes are started. Recent samples are
+kept in a fixed size ring buffer in memory for charts. Handlers registered by
+apps are called with each new sample, for example to show notifications when
+space is running low.
+
+Usage of CPU, memory and disk I/O by apps is read from the cgroups that
+systemd creates for the units of an app's daemons. The cgroups of all units
+are looked up with a single call to systemctl for each sample. Usage is stored
+in a round robin file per app so that a month of usage, downsampled, takes a
+fixed amount of disk space.
+"""
+
+import array
+import collections
+import logging
+import math
+import os
+import pathlib
+import subprocess
+import threading
+import time
+
+from plinth import app as app_module
+from plinth import cfg, rrd
+from plinth.daemon import Daemon
+
+logger = logging.getLogger(__name__)
+
+# Number of seconds between samples
+INTERVAL = 60
+
+# Number of samples kept in memory, one day
+HISTORY_SIZE = 24 * 60 * 60 // INTERVAL
+
+MEMINFO_PATH = pathlib.Path('/proc/meminfo')
+
+CGROUP_PATH = pathlib.Path('/sys/fs/cgroup')
+
+# Number of seconds between samples of usage by apps
+APP_INTERVAL = 60
+
+# Fields of the samples of usage by apps: percentage of a CPU, bytes of memory,
+# bytes read and written per second
+APP_FIELDS = ('cpu', 'memory', 'io_read', 'io_write')
+
+# Step and number of records of the archives of usage by apps: a day of
+# samples, a week of 15 minute averages and a month of 2 hour averages
+APP_ARCHIVES = [(APP_INTERVAL, 24 * 60), (15 * 60, 7 * 24 * 4),
+                (2 * 60 * 60, 31 * 12)]
+
+# Period for which average and peak usage of apps are shown
+APP_USAGE_PERIOD = 24 * 60 * 60
+
+Sample = collections.namedtuple('Sample', [
+    'time', 'disk_total', 'disk_free', 'disk_percent_used', 'memory_total',
+    'memory_free', 'memory_percent_used'
+])
+
+_handlers = []
+_lock = threading.Lock()
+
+# Time and usage counters of each running unit at the last sample
+_unit_counters = {}
+_app_files = {}
+
+
+class History:
+    """Fixed number of the latest samples in a ring buffer.
+
+    Each field is kept in an array of doubles so that a day of samples takes
+    only a few hundred kilobytes.
+    """
+
+    def __init__(self, size):
+        """Initialize an empty history holding at most size samples."""
+        self.size = size
+        self._columns = [
+            array.array('d', bytes(8 * size)) for _ in Sample._fields
+        ]
+        self._next = 0
+        self._count = 0
+
+    def __len__(self):
+        """Return the number of samples in the history."""
+        return self._count
+
+    def append(self, sample):
+        """Add a sample replacing the oldest one if the history is full."""
+        for column, value in zip(self._columns, sample):
+            column[self._next] = value
+
+        self._next = (self._next + 1) % self.size
+        self._count = min(self._count + 1, self.size)
+
+    def get_samples(self, since=None):
+        """Return the list of samples, oldest first, taken after a time."""
+        start = self._next - self._count
+        samples = []
+        for index in range(start, self._next):
+            sample = Sample(*(column[index] for column in self._columns))
+            if since is None or sample.time > since:
+                samples.append(sample)
+
+        return samples
+
+    def get_latest(self):
+        """Return the latest sample or None if there are none."""
+        if not self._count:
+            return None
+
+        return Sample(*(column[self._next - 1] for column in self._columns))
+
+
+_history = History(HISTORY_SIZE)
+
+
+def get_disk_usage(path='/'):
+    """Return (total, free, percent used) of the file system at a path.
+
+    Free space is the space available to unprivileged users and the
+    percentage is rounded up like 'df' does.
+    """
+    stat = os.statvfs(path)
+    total = stat.f_blocks * stat.f_frsize
+    used = (stat.f_blocks - stat.f_bfree) * stat.f_frsize
+    free = stat.f_bavail * stat.f_frsize
+    percent_used = math.ceil(used * 100 / (used + free)) if used + free else 0
+    return total, free, percent_used
+
+
+def _read_fields(path):
+    """Return a dictionary of 'name value' lines of a file."""
+    fields = {}
+    for line in path.read_text().splitlines():
+        parts = line.replace(':', ' ').split()
+        if len(parts) >= 2 and parts[1].isdigit():
+            fields[parts[0]] = int(parts[1])
+
+    return fields
+
+
+def _get_memory_usage_from_meminfo():
+    """Return (total, available) bytes of memory of the system."""
+    fields = _read_fields(MEMINFO_PATH)
+    return fields['MemTotal'] * 1024, fields['MemAvailable'] * 1024
+
+
+def _get_memory_usage_from_cgroup():
+    """Return (limit, available) bytes of the memory cgroup or None.
+
+    cgroup v2 files are tried first and then the cgroup v1 ones. Page cache
+    that can be reclaimed is considered available like in /proc/meminfo.
+    """
+    for limit_file, usage_file, stat_file, inactive_key in (
+        ('memory.max', 'memory.current', 'memory.stat', 'inactive_file'),
+        ('memory/memory.limit_in_bytes', 'memory/memory.usage_in_bytes',
+         'memory/memory.stat', 'total_inactive_file'),
+    ):
+        try:
+            limit = (CGROUP_PATH / limit_file).read_text().strip()
+            usage = int((CGROUP_PATH / usage_file).read_text())
+            inactive = _read_fields(CGROUP_PATH / stat_file).get(
+                inactive_key, 0)
+        except (OSError, ValueError):
+            continue
+
+        if not limit.isdigit():
+            return None  # No limit, 'max' in cgroup v2
+
+        limit = int(limit)
+        return limit, max(limit - (usage - inactive), 0)
+
+    return None
+
+
+def get_memory_usage():
+    """Return (total, available, percent used) of memory.
+
+    Inside a container whose memory is limited with a cgroup, usage of the
+    cgroup is returned.
+    """
+    total, available = _get_memory_usage_from_meminfo()
+    cgroup_usage = _get_memory_usage_from_cgroup()
+    if cgroup_usage and cgroup_usage[0] < total:
+        total, available = cgroup_usage
+
+    percent_used = (total - available) * 100 / total if total else 0
+    return total, available, percent_used
+
+
+def add_handler(handler):
+    """Call a function with every new sample."""
+    _handlers.append(handler)
+
+
+def sample(_data=None):
+    """Take a sample, remember it and pass it to the handlers.
+
+    Meant to be run periodically by the GLib scheduler.
+    """
+    new_sample = Sample(time.time(), *get_disk_usage(),
+                        *get_memory_usage())
+    with _lock:
+        _history.append(new_sample)
+
+    for handler in _handlers:
+        try:
+            handler(new_sample)
+        except Exception as exception:  # pylint: disable=broad-except
+            logger.exception('Error handling metrics sample: %s', exception)
+
+
+def get_latest():
+    """Return the latest sample or None if none was taken yet."""
+    with _lock:
+        return _history.get_latest()
+
+
+def get_history(since=None):
+    """Return the list of samples in memory taken after a time."""
+    with _lock:
+        return _history.get_samples(since)
+
+
+def _read_int(path):
+    """Return the integer in a file or None if it is not available."""
+    try:
+        return int(path.read_text())
+    except (OSError, ValueError):
+        return None
+
+
+def _get_cgroup_usage_v2(control_group):
+    """Return the usage counters of a cgroup from the cgroup v2 hierarchy."""
+    path = CGROUP_PATH / control_group.lstrip('/')
+    if not path.is_dir():
+        return None
+
+    try:
+        cpu = _read_fields(path / 'cpu.stat').get('usage_usec', 0)
+    except OSError:
+        cpu = 0
+
+    memory = _read_int(path / 'memory.current') or 0
+    try:
+        memory -= _read_fields(path / 'memory.stat').get('inactive_file', 0)
+    except OSError:
+        pass
+
+    io_read = io_write = 0
+    try:
+        lines = (path / 'io.stat').read_text().splitlines()
+    except OSError:
+        lines = []
+
+    for line in lines:
+        for item in line.split()[1:]:
+            key, _, value = item.partition('=')
+            if key == 'rbytes':
+                io_read += int(value)
+            elif key == 'wbytes':
+                io_write += int(value)
+
+    return cpu, max(memory, 0), io_read, io_write
+
+
+def _get_cgroup_usage_v1(control_group):
+    """Return the usage counters of a cgroup from the cgroup v1 hierarchies.
+
+    systemd creates the same cgroup path in each controller's hierarchy.
+    """
+    control_group = control_group.lstrip('/')
+    memory_path = CGROUP_PATH / 'memory' / control_group
+    cpu_path = CGROUP_PATH / 'cpu,cpuacct' / control_group
+    if not memory_path.is_dir() and not cpu_path.is_dir():
+        return None
+
+    cpu = (_read_int(cpu_path / 'cpuacct.usage') or 0) // 1000
+    memory = _read_int(memory_path / 'memory.usage_in_bytes') or 0
+    try:
+        memory -= _read_fields(memory_path / 'memory.stat').get(
+            'total_inactive_file', 0)
+    except OSError:
+        pass
+
+    io_read = io_write = 0
+    blkio_path = CGROUP_PATH / 'blkio' / control_group
+    try:
+        lines = (blkio_path /
+                 'blkio.throttle.io_service_bytes').read_text().splitlines()
+    except OSError:
+        lines = []
+
+    for line in lines:
+        parts = line.split()
+        if len(parts) == 3 and parts[1] == 'Read':
+            io_read += int(parts[2])
+        elif len(parts) == 3 and parts[1] == 'Write':
+            io_write += int(parts[2])
+
+    return cpu, max(memory, 0), io_read, io_write
+
+
+def get_cgroup_usage(control_group):
+    """Return the usage counters of a cgroup of a systemd unit.
+
+    control_group is the path of the cgroup relative to the root of the
+    hierarchy, as given by the ControlGroup property of a unit. Return (CPU
+    time in microseconds, bytes of memory, bytes read, bytes written) or None
+    if the cgroup does not exist. Counters that are not available because
+    accounting is disabled are 0.
+    """
+    if (CGROUP_PATH / 'cgroup.controllers').exists():
+        return _get_cgroup_usage_v2(control_group)
+
+    return _get_cgroup_usage_v1(control_group)
+
+
+def get_control_groups(units):
+    """Return a dictionary with the cgroup of each running unit.
+
+    Units are names as used for managed services, such as 'ssh' or
+    'openvpn-server@freedombox'. systemd resolves names without a suffix as
+    services and knows where each unit's cgroup is, including for instances of
+    templates that are placed in a slice of their own. Units that are not
+    running have no cgroup and are left out.
+    """
+    units = list(units)
+    if not units:
+        return {}
+
+    try:
+        process = subprocess.run(
+            ['systemctl', 'show', '--property=ControlGroup', '--'] + units,
+            stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, check=True)
+    except (OSError, subprocess.CalledProcessError) as exception:
+        logger.warning('Unable to find cgroups of units: %s', exception)
+        return {}
+
+    # Properties of each unit are printed in order, separated by empty lines
+    blocks = process.stdout.decode().strip('\n').split('\n\n')
+    control_groups = {}
+    for unit, block in zip(units, blocks):
+        _, _, control_group = block.strip().partition('ControlGroup=')
+        if control_group:
+            control_groups[unit] = control_group
+
+    return control_groups
+
+
+def _get_app_file(app_id):
+    """Return the round robin file with usage of an app."""
+    with _lock:
+        if app_id not in _app_files:
+            path = os.path.join(cfg.data_dir, 'metrics', app_id + '.rrd')
+            _app_files[app_id] = rrd.RoundRobinFile(path, APP_FIELDS,
+                                                    APP_ARCHIVES)
+
+        return _app_files[app_id]
+
+
+def _get_app_units(app):
+    """Return the systemd units of the daemons of an app."""
+    return [daemon.unit for daemon in app.get_components_of_type(Daemon)]
+
+
+def _get_rate(value, previous_value, elapsed):
+    """Return the rate of increase of a counter."""
+    # Counters start again from 0 when a unit is restarted
+    increase = value - previous_value if value >= previous_value else value
+    return increase / elapsed
+
+
+def sample_apps(_data=None):
+    """Store the usage of resources by each app with running daemons.
+
+    CPU time and bytes read and written are counters which are stored as rates
+    since the previous sample of each unit. Meant to be run periodically by
+    the GLib scheduler.
+    """
+    global _unit_counters
+    now = time.time()
+    apps_units = [(app, _get_app_units(app)) for app in app_module.App.list()]
+    units = dict.fromkeys(unit for _, units in apps_units for unit in units)
+    control_groups = get_control_groups(units)
+    counters = {}
+    for app, units in apps_units:
+        memory = 0
+        rates = None
+        for unit in units:
+            if unit not in control_groups:
+                continue
+
+            usage = counters.get(unit) or get_cgroup_usage(
+                control_groups[unit])
+            if not usage:
+                continue
+
+            counters[unit] = usage
+            memory += usage[1]
+            previous = _unit_counters.get(unit)
+            if not previous or now <= previous[0]:
+                continue
+
+            elapsed = now - previous[0]
+            unit_rates = (
+                _get_rate(usage[0], previous[1], elapsed) / 10**4,
+                _get_rate(usage[2], previous[3], elapsed),
+                _get_rate(usage[3], previous[4], elapsed),
+            )
+            rates = unit_rates if rates is None else tuple(
+                map(sum, zip(rates, unit_rates)))
+
+        if rates is None:
+            continue
+
+        values = (rates[0], memory, rates[1], rates[2])
+        try:
+            _get_app_file(app.app_id).append(now, values)
+        except OSError as exception:
+            logger.warning('Unable to store usage of app %s: %s', app.app_id,
+                           exception)
+
+    _unit_counters = {
+        unit: (now, ) + usage
+        for unit, usage in counters.items()
+    }
+
+
+def get_app_usage(app_id):
+    """Return the current, average and peak usage of an app or None.
+
+    Each of 'current', 'average' and 'peak' is a dictionary with the fields of
+    APP_FIELDS. Average and peak are over APP_USAGE_PERIOD. Current usage is
+    None if the app was not running when last sampled.
+    """
+    path = os.path.join(cfg.data_dir, 'metrics', app_id + '.rrd')
+    if not os.path.exists(path):
+        return None
+
+    now = time.time()
+    records = _get_app_file(app_id).read(since=now - APP_USAGE_PERIOD)
+    if not records:
+        return None
+
+    columns = list(zip(*records))[1:]
+    current = None
+    if now - records[-1][0] <= 2 * APP_INTERVAL:
+        current = dict(zip(APP_FIELDS, records[-1][1:]))
+
+    return {
+        'current': current,
+        'average': {
+            field: sum(column) / len(column)
+            for field, column in zip(APP_FIELDS, columns)
+        },
+        'peak': {
+            field: max(column)
+            for field, column in zip(APP_FIELDS, columns)
+        },
+    }
+
+
+def get_apps_usage():
+    """Return a list of (app, usage) of apps with usage, busiest first."""
+    apps_usage = []
+    for app in app_module.App.list():
+        usage = get_app_usage(app.app_id)
+        if usage:
+            apps_usage.append((app, usage))
+
+    return sorted(apps_usage, key=lambda item: item[1]['average']['cpu'],
+                  reverse=True)
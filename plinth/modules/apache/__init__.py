@@ -14,6 +14,8 @@ from plinth.modules.firewall.components import Firewall
 from plinth.modules.letsencrypt.components import LetsEncrypt
 from plinth.utils import format_lazy, is_valid_user_name
 
+from . import state
+
 version = 8
 
 is_essential = True
@@ -59,6 +61,8 @@ class ApacheApp(app_module.App):
         daemon = Daemon('daemon-apache', managed_services[0])
         self.add(daemon)
 
+        state.start_monitoring()
+
 
 def setup(helper, old_version=None):
     """Configure the module."""
@@ -67,6 +71,7 @@ def setup(helper, old_version=None):
         'apache',
         ['setup', '--old-version', str(old_version)])
     helper.call('post', app.enable)
+    state.start_monitoring()
 
 
 # (U)ser (W)eb (S)ites
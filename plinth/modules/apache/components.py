@@ -3,14 +3,22 @@
 App component for other apps to use Apache configuration functionality.
 """
 
+import contextlib
+import json
 import re
 import subprocess
+import threading
 
 from django.utils.text import format_lazy
 from django.utils.translation import ugettext_lazy
 
 from plinth import action_utils, actions, app
 
+from . import probe, state
+
+# Apache configuration changes deferred in the current thread
+_changes = threading.local()
+
 
 class Webserver(app.LeaderComponent):
     """Component to enable/disable Apache configuration."""
@@ -41,18 +49,15 @@ class Webserver(app.LeaderComponent):
 
     def is_enabled(self):
         """Return whether the Apache configuration is enabled."""
-        return action_utils.webserver_is_enabled(self.web_name, kind=self.kind)
+        return webserver_is_enabled(self.web_name, kind=self.kind)
 
     def enable(self):
         """Enable the Apache configuration."""
-        actions.superuser_run(
-            'apache', ['enable', '--name', self.web_name, '--kind', self.kind])
+        webserver_enable(self.web_name, kind=self.kind)
 
     def disable(self):
         """Disable the Apache configuration."""
-        actions.superuser_run(
-            'apache',
-            ['disable', '--name', self.web_name, '--kind', self.kind])
+        webserver_disable(self.web_name, kind=self.kind)
 
     def diagnose(self):
         """Check if the web path is accessible by clients.
@@ -109,6 +114,86 @@ class Uwsgi(app.LeaderComponent):
             and action_utils.service_is_running('uwsgi')
 
 
+@contextlib.contextmanager
+def webserver_changes():
+    """Context to batch changes to Apache configuration.
+
+    Enabling and disabling of configuration in the current thread is deferred
+    until the outermost context exits. All changes are then made by a single
+    action followed by one reload or, if modules changed, one restart of
+    Apache. If an exception occurs, the changes requested so far are still
+    applied.
+
+    """
+    if getattr(_changes, 'pending', None) is not None:
+        yield
+        return
+
+    _changes.pending = []
+    try:
+        yield
+    finally:
+        pending = _changes.pending
+        _changes.pending = None
+        if pending:
+            try:
+                actions.superuser_run('apache', ['apply-changes'],
+                                      input=json.dumps(pending).encode())
+            finally:
+                state.invalidate()
+
+
+def _change_webserver(operation, name, kind):
+    """Enable or disable configuration now or when the batch is applied."""
+    pending = getattr(_changes, 'pending', None)
+    if pending is None:
+        try:
+            actions.superuser_run('apache',
+                                  [operation, '--name', name, '--kind', kind])
+        finally:
+            state.invalidate(kind)
+
+        return
+
+    # Only the last change to a configuration matters
+    pending[:] = [
+        change for change in pending
+        if (change['name'], change['kind']) != (name, kind)
+    ]
+    pending.append({'operation': operation, 'name': name, 'kind': kind})
+
+
+def webserver_is_enabled(name, kind='config'):
+    """Return whether Apache configuration is enabled.
+
+    Changes that are pending in the current thread are taken into account.
+    """
+    for change in reversed(getattr(_changes, 'pending', None) or []):
+        if (change['name'], change['kind']) == (name, kind):
+            return change['operation'] == 'enable'
+
+    return state.is_enabled(name, kind=kind)
+
+
+def webserver_enable(name, kind='config'):
+    """Enable Apache configuration.
+
+    Within webserver_changes() this is deferred until the batch is applied.
+    """
+    _change_webserver('enable', name, kind)
+
+
+def webserver_disable(name, kind='config'):
+    """Disable Apache configuration.
+
+    Within webserver_changes() this is deferred until the batch is applied.
+    """
+    _change_webserver('disable', name, kind)
+
+
+app.App.register_change_context(webserver_changes)
+
+
 def diagnose_url(url, kind=None, env=None, check_certificate=True,
                  extra_options=None, wrapper=None, expected_output=None):
     """Run a diagnostic on whether a URL is accessible.
@@ -129,19 +214,40 @@ def diagnose_url(url, kind=None, env=None, check_certificate=True,
 
 
 def diagnose_url_on_all(url, **kwargs):
-    """Run a diagnostic on whether a URL is accessible."""
-    results = []
-    for address in action_utils.get_addresses():
+    """Run a diagnostic on whether a URL is accessible on all addresses.
+
+    The addresses of the machine are enumerated once and reused for a while.
+    All the checks are run concurrently.
+    """
+    prober = probe.get_prober()
+    addresses = prober.get_addresses()
+
+    def _diagnose(address):
         current_url = url.format(host=address['url_address'])
-        results.append(
-            diagnose_url(current_url, kind=address['kind'], **kwargs))
+        return diagnose_url(current_url, kind=address['kind'], **kwargs)
 
-    return results
+    return prober.map(_diagnose, addresses)
 
 
 def check_url(url, kind=None, env=None, check_certificate=True,
               extra_options=None, wrapper=None, expected_output=None):
-    """Check whether a URL is accessible."""
+    """Check whether a URL is accessible.
+
+    The check is made in-process unless it needs a custom environment, extra
+    curl options or a wrapper command such as torsocks.
+    """
+    if env is None and extra_options is None and wrapper is None:
+        return probe.get_prober().check(url, kind, check_certificate,
+                                        expected_output)
+
+    return _check_url_with_curl(url, kind, env, check_certificate,
+                                extra_options, wrapper, expected_output)
+
+
+def _check_url_with_curl(url, kind=None, env=None, check_certificate=True,
+                         extra_options=None, wrapper=None,
+                         expected_output=None):
+    """Check whether a URL is accessible using curl."""
     command = ['curl', '--location', '-f', '-w', '%{response_code}']
 
     if kind == '6':
@@ -0,0 +1,273 @@
+# SPDX-License-Identifier: AGPL-3.0-or-later
+"""
+Check whether URLs are accessible without starting a process for each check.
+
+URLs are requested in-process with http.client. Connections are kept open and
+reused for further checks against the same server. Checks may be run
+concurrently on a thread pool. Results follow the semantics of checking with
+'curl --location --fail': redirects are followed, status codes below 400 pass
+and so do 401 and 405 which mean that authentication is needed.
+"""
+
+import concurrent.futures
+import http.client
+import socket
+import ssl
+import threading
+import time
+import urllib.parse
+
+from plinth import action_utils
+
+DEFAULT_TIMEOUT = 10
+
+MAX_REDIRECTS = 10
+
+MAX_WORKERS = 16
+
+# Number of seconds for which the list of addresses of the machine is reused
+ADDRESSES_TIMEOUT = 60
+
+_PASSING_ERROR_STATUSES = (401, 405)
+
+_REDIRECT_STATUSES = (301, 302, 303, 307, 308)
+
+_FAMILIES = {None: socket.AF_UNSPEC, '4': socket.AF_INET, '6': socket.AF_INET6}
+
+# Errors when reusing a connection closed by the server in the meantime
+_STALE_CONNECTION_ERRORS = (http.client.RemoteDisconnected, BrokenPipeError,
+                            ConnectionResetError)
+
+_prober = None
+_prober_lock = threading.Lock()
+
+
+def _split_zone(host):
+    """Split an IPv6 zone index from a host, return (host, zone)."""
+    host, _, zone = host.partition('%')
+    return host, zone
+
+
+def _create_connection(host, port, family, timeout):
+    """Connect to a host with a given address family and return the socket."""
+    error = None
+    host, zone = _split_zone(host)
+    infos = socket.getaddrinfo(host, port, family, socket.SOCK_STREAM)
+    for family_, type_, proto, _, address in infos:
+        if zone and family_ == socket.AF_INET6:
+            address = address[:3] + (socket.if_nametoindex(zone), )
+
+        sock = socket.socket(family_, type_, proto)
+        try:
+            sock.settimeout(timeout)
+            sock.connect(address)
+            return sock
+        except OSError as exception:
+            error = exception
+            sock.close()
+
+    raise error or OSError('No addresses found for {}'.format(host))
+
+
+class _HTTPConnection(http.client.HTTPConnection):
+    """HTTP connection using a particular address family."""
+
+    def __init__(self, host, port, family, timeout):
+        super().__init__(host, port, timeout=timeout)
+        self.family = family
+
+    def connect(self):
+        """Connect to the host."""
+        self.sock = _create_connection(self.host, self.port, self.family,
+                                       self.timeout)
+
+
+class _HTTPSConnection(http.client.HTTPSConnection):
+    """HTTPS connection using a particular address family."""
+
+    def __init__(self, host, port, family, timeout, context):
+        super().__init__(host, port, timeout=timeout, context=context)
+        self.family = family
+
+    def connect(self):
+        """Connect to the host and start TLS."""
+        sock = _create_connection(self.host, self.port, self.family,
+                                  self.timeout)
+        server_hostname = _split_zone(self.host)[0]
+        self.sock = self._context.wrap_socket(sock,
+                                              server_hostname=server_hostname)
+
+
+class Prober:
+    """Check accessibility of URLs reusing connections across checks."""
+
+    def __init__(self, timeout=DEFAULT_TIMEOUT, max_workers=MAX_WORKERS):
+        """Initialize the prober.
+
+        timeout is the number of seconds a single check may take including
+        following redirects.
+
+        max_workers is the maximum number of checks run at the same time by
+        map().
+        """
+        self.timeout = timeout
+        self._executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix='url-probe')
+        self._lock = threading.Lock()
+        self._idle_connections = {}
+        self._addresses = None
+        self._addresses_time = None
+
+        self._contexts = {True: ssl.create_default_context()}
+        context = ssl.create_default_context()
+        context.check_hostname = False
+        context.verify_mode = ssl.CERT_NONE
+        self._contexts[False] = context
+
+    def get_addresses(self):
+        """Return the addresses of the machine reusing a recent result."""
+        with self._lock:
+            if self._addresses is None or \
+               time.monotonic() - self._addresses_time > ADDRESSES_TIMEOUT:
+                self._addresses = action_utils.get_addresses()
+                self._addresses_time = time.monotonic()
+
+            return list(self._addresses)
+
+    def reset(self):
+        """Forget the addresses of the machine and close idle connections."""
+        with self._lock:
+            self._addresses = None
+            connections = [
+                connection for idle in self._idle_connections.values()
+                for connection in idle
+            ]
+            self._idle_connections = {}
+
+        for connection in connections:
+            connection.close()
+
+    def map(self, function, *iterables):
+        """Call a function on the thread pool and return the list of results.
+
+        The function must not itself wait for other calls made on the pool.
+        """
+        return list(self._executor.map(function, *iterables))
+
+    def check(self, url, kind=None, check_certificate=True,
+              expected_output=None):
+        """Check whether a URL is accessible.
+
+        Kind can be '4' for IPv4 or '6' for IPv6. IPv6 addresses with a zone
+        index such as 'http://[fe80::1%eth0]/' are supported. Return 'passed'
+        or 'failed'.
+        """
+        deadline = time.monotonic() + self.timeout
+        try:
+            for _ in range(MAX_REDIRECTS + 1):
+                status, headers, body = self._request(url, kind,
+                                                      check_certificate,
+                                                      deadline)
+                location = headers.get('Location')
+                if status not in _REDIRECT_STATUSES or not location:
+                    break
+
+                url = urllib.parse.urljoin(url, location)
+            else:
+                return 'failed'
+        except (OSError, http.client.HTTPException, ValueError):
+            return 'failed'
+
+        if status >= 400:
+            return 'passed' if status in _PASSING_ERROR_STATUSES else 'failed'
+
+        if expected_output and \
+           expected_output not in body.decode(errors='replace'):
+            return 'failed'
+
+        return 'passed'
+
+    def _request(self, url, kind, check_certificate, deadline):
+        """Make a GET request and return status, headers and body."""
+        parts = urllib.parse.urlsplit(url)
+        if parts.scheme not in ('http', 'https'):
+            raise ValueError('Unsupported URL scheme')
+
+        # Parse host from netloc as .hostname lowercases the zone index
+        host = parts.netloc.rpartition('@')[2]
+        if host.startswith('['):
+            host = host[1:host.index(']')]
+        else:
+            host = host.partition(':')[0]
+
+        port = parts.port or (443 if parts.scheme == 'https' else 80)
+        key = (parts.scheme, host, port, kind, check_certificate)
+        path = urllib.parse.urlunsplit(('', '', parts.path or '/',
+                                        parts.query, ''))
+        host_header = _split_zone(host)[0]
+        if ':' in host_header:
+            host_header = '[{}]'.format(host_header)
+
+        if port != (443 if parts.scheme == 'https' else 80):
+            host_header += ':{}'.format(port)
+
+        headers = {'Host': host_header, 'Accept': '*/*'}
+
+        connection = self._get_idle_connection(key)
+        if connection:
+            try:
+                return self._send(connection, key, path, headers, deadline)
+            except _STALE_CONNECTION_ERRORS:
+                connection.close()
+
+        timeout = max(deadline - time.monotonic(), 0.001)
+        family = _FAMILIES[kind]
+        if parts.scheme == 'https':
+            connection = _HTTPSConnection(host, port, family, timeout,
+                                          self._contexts[check_certificate])
+        else:
+            connection = _HTTPConnection(host, port, family, timeout)
+
+        return self._send(connection, key, path, headers, deadline)
+
+    def _send(self, connection, key, path, headers, deadline):
+        """Send a request on a connection and keep it for reuse."""
+        timeout = deadline - time.monotonic()
+        if timeout <= 0:
+            raise socket.timeout('Timed out')
+
+        connection.timeout = timeout
+        if connection.sock:
+            connection.sock.settimeout(timeout)
+
+        try:
+            connection.request('GET', path, headers=headers)
+            response = connection.getresponse()
+            body = response.read()
+        except Exception:
+            connection.close()
+            raise
+
+        if response.will_close:
+            connection.close()
+        else:
+            with self._lock:
+                self._idle_connections.setdefault(key, []).append(connection)
+
+        return response.status, response.headers, body
+
+    def _get_idle_connection(self, key):
+        """Return an idle connection to a server, if any."""
+        with self._lock:
+            idle = self._idle_connections.get(key)
+            return idle.pop() if idle else None
+
+
+def get_prober():
+    """Return the prober shared by all diagnostics."""
+    global _prober
+    with _prober_lock:
+        if not _prober:
+            _prober = Prober()
+
+        return _prober
@@ -0,0 +1,95 @@
+# SPDX-License-Identifier: AGPL-3.0-or-later
+"""
+Track which Apache sites, configurations and modules are enabled.
+
+The enabled state is read from the symlinks in /etc/apache2/*-enabled/ instead
+of running a2query for each check. The list of enabled items is cached and the
+cache is invalidated when the directories are changed, as reported by inotify
+through GIO file monitors. Without monitoring, the directories are read on
+every check.
+"""
+
+import logging
+import os
+import threading
+
+from plinth.action_utils import WEBSERVER_ENABLED_PATHS
+from plinth.utils import import_from_gi
+
+gio = import_from_gi('Gio', '2.0')
+glib = import_from_gi('GLib', '2.0')
+
+_lock = threading.Lock()
+_cache = {}
+_monitors = {}
+
+logger = logging.getLogger(__name__)
+
+
+def _read_enabled(kind):
+    """Return the set of enabled items of a kind from the filesystem."""
+    directory, suffix = WEBSERVER_ENABLED_PATHS[kind]
+    try:
+        filenames = os.listdir(directory)
+    except FileNotFoundError:
+        return frozenset()
+
+    return frozenset(
+        filename[:-len(suffix)] for filename in filenames
+        if filename.endswith(suffix)
+        and os.path.exists(os.path.join(directory, filename)))
+
+
+def get_enabled(kind):
+    """Return the set of enabled items of a kind."""
+    with _lock:
+        enabled = _cache.get(kind)
+        if enabled is None:
+            enabled = _read_enabled(kind)
+            if kind in _monitors:
+                _cache[kind] = enabled
+
+    return enabled
+
+
+def is_enabled(name, kind='config'):
+    """Return whether a site/config/module is enabled in Apache."""
+    return name in get_enabled(kind)
+
+
+def invalidate(kind=None):
+    """Forget the cached state of a kind or of all kinds."""
+    with _lock:
+        if kind:
+            _cache.pop(kind, None)
+        else:
+            _cache.clear()
+
+
+def _on_changed(_monitor, _file, _other_file, _event_type, kind):
+    """Invalidate the cache when a directory is changed."""
+    invalidate(kind)
+
+
+def start_monitoring():
+    """Watch the directories with enabled items for changes.
+
+    Events are delivered by the GLib main loop. Directories which don't exist
+    yet, such as when Apache is not installed, are not monitored and not
+    cached.
+    """
+    for kind, (directory, _) in WEBSERVER_ENABLED_PATHS.items():
+        if kind in _monitors or not os.path.isdir(directory):
+            continue
+
+        try:
+            monitor = gio.File.new_for_path(directory).monitor_directory(
+                gio.FileMonitorFlags.NONE, None)
+        except glib.Error as exception:
+            logger.warning('Unable to monitor %s: %s', directory, exception)
+            continue
+
+        monitor.connect('changed', _on_changed, kind)
+        with _lock:
+            _cache.pop(kind, None)
+            _monitors[kind] = monitor
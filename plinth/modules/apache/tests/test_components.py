@@ -3,14 +3,17 @@
 Test module for webserver components.
 """
 
+import json
 import subprocess
 from unittest.mock import call, patch
 
 import pytest
 
-from plinth.modules.apache.components import (Uwsgi, Webserver, check_url,
+from plinth.modules.apache.components import (Uwsgi, Webserver,
+                                              _check_url_with_curl, check_url,
                                               diagnose_url,
-                                              diagnose_url_on_all)
+                                              diagnose_url_on_all,
+                                              webserver_changes)
 
 
 def test_webserver_init():
@@ -30,7 +33,7 @@ def test_webserver_init():
     assert webserver.urls == []
 
 
-@patch('plinth.action_utils.webserver_is_enabled')
+@patch('plinth.modules.apache.state.is_enabled')
 def test_webserver_is_enabled(webserver_is_enabled):
     """Test that checking webserver configuration enabled works."""
     webserver = Webserver('test-webserver', 'test-config', kind='module')
@@ -68,6 +71,59 @@ def test_webserver_disable(superuser_run):
     ])
 
 
+@patch('plinth.modules.apache.state.is_enabled')
+@patch('plinth.actions.superuser_run')
+def test_webserver_changes(superuser_run, webserver_is_enabled):
+    """Test that webserver configuration changes are applied together."""
+    webserver1 = Webserver('test-webserver1', 'test-config1')
+    webserver2 = Webserver('test-webserver2', 'test-module2', kind='module')
+    webserver_is_enabled.return_value = False
+
+    with webserver_changes():
+        webserver1.enable()
+        with webserver_changes():
+            webserver2.enable()
+            webserver2.disable()
+            webserver2.enable()
+
+        assert webserver1.is_enabled()
+        assert webserver2.is_enabled()
+        superuser_run.assert_not_called()
+
+    changes = [{
+        'operation': 'enable',
+        'name': 'test-config1',
+        'kind': 'config'
+    }, {
+        'operation': 'enable',
+        'name': 'test-module2',
+        'kind': 'module'
+    }]
+    superuser_run.assert_called_once_with('apache', ['apply-changes'],
+                                          input=json.dumps(changes).encode())
+    assert not webserver1.is_enabled()
+
+    superuser_run.reset_mock()
+    with pytest.raises(RuntimeError):
+        with webserver_changes():
+            webserver1.disable()
+            raise RuntimeError
+
+    changes = [{
+        'operation': 'disable',
+        'name': 'test-config1',
+        'kind': 'config'
+    }]
+    superuser_run.assert_called_once_with('apache', ['apply-changes'],
+                                          input=json.dumps(changes).encode())
+
+    superuser_run.reset_mock()
+    with webserver_changes():
+        pass
+
+    superuser_run.assert_not_called()
+
+
 @patch('plinth.modules.apache.components.diagnose_url')
 @patch('plinth.modules.apache.components.diagnose_url_on_all')
 def test_webserver_diagnose(diagnose_url_on_all, diagnose_url):
@@ -170,6 +226,7 @@ def test_uwsgi_is_running(uwsgi_is_enabled, service_is_running):
 
 @patch('plinth.modules.apache.components.check_url')
 @patch('plinth.action_utils.get_addresses')
+@patch('plinth.modules.apache.probe._prober', None)
 def test_diagnose_url(get_addresses, check):
     """Test diagnosing a URL."""
     args = {
@@ -215,38 +272,38 @@ def test_diagnose_url(get_addresses, check):
 
 
 @patch('subprocess.run')
-def test_check_url(run):
-    """Test checking whether a URL is accessible."""
+def test_check_url_with_curl(run):
+    """Test checking whether a URL is accessible using curl."""
     url = 'http://localhost/test'
     basic_command = ['curl', '--location', '-f', '-w', '%{response_code}']
     extra_args = {'env': None, 'check': True, 'stdout': -1, 'stderr': -1}
 
     # Basic
-    assert check_url(url) == 'passed'
+    assert _check_url_with_curl(url) == 'passed'
     run.assert_called_with(basic_command + [url], **extra_args)
 
     # Wrapper
-    check_url(url, wrapper='test-wrapper')
+    _check_url_with_curl(url, wrapper='test-wrapper')
     run.assert_called_with(['test-wrapper'] + basic_command + [url],
                            **extra_args)
 
     # No certificate check
-    check_url(url, check_certificate=False)
+    _check_url_with_curl(url, check_certificate=False)
     run.assert_called_with(basic_command + [url, '-k'], **extra_args)
 
     # Extra options
-    check_url(url, extra_options=['test-opt1', 'test-opt2'])
+    _check_url_with_curl(url, extra_options=['test-opt1', 'test-opt2'])
     run.assert_called_with(basic_command + [url, 'test-opt1', 'test-opt2'],
                            **extra_args)
 
     # TCP4/TCP6
-    check_url(url, kind='4')
+    _check_url_with_curl(url, kind='4')
     run.assert_called_with(basic_command + [url, '-4'], **extra_args)
-    check_url(url, kind='6')
+    _check_url_with_curl(url, kind='6')
     run.assert_called_with(basic_command + [url, '-6'], **extra_args)
 
     # IPv6 Link Local URLs
-    check_url('https://[::2%eth0]/test', kind='6')
+    _check_url_with_curl('https://[::2%eth0]/test', kind='6')
     run.assert_called_with(
         basic_command + ['--interface', 'eth0', 'https://[::2]/test', '-6'],
         **extra_args)
@@ -255,15 +312,33 @@ def test_check_url(run):
     exception = subprocess.CalledProcessError(returncode=1, cmd=['curl'])
     run.side_effect = exception
     run.side_effect.stdout = b'500'
-    assert check_url(url) == 'failed'
+    assert _check_url_with_curl(url) == 'failed'
 
     # Return code 401, 405
     run.side_effect = exception
     run.side_effect.stdout = b' 401 '
-    assert check_url(url) == 'passed'
+    assert _check_url_with_curl(url) == 'passed'
     run.side_effect.stdout = b'405\n'
-    assert check_url(url) == 'passed'
+    assert _check_url_with_curl(url) == 'passed'
 
     # Error
     run.side_effect = FileNotFoundError()
-    assert check_url(url) == 'error'
+    assert _check_url_with_curl(url) == 'error'
+
+
+@patch('plinth.modules.apache.components._check_url_with_curl')
+@patch('plinth.modules.apache.probe.Prober.check')
+def test_check_url(check, check_with_curl):
+    """Test that checks are made in-process unless curl is needed."""
+    url = 'http://localhost/test'
+    check.return_value = 'passed'
+    assert check_url(url, kind='6', check_certificate=False) == 'passed'
+    check.assert_called_with(url, '6', False, None)
+    check_with_curl.assert_not_called()
+
+    check_with_curl.return_value = 'failed'
+    assert check_url(url, wrapper='torsocks') == 'failed'
+    assert check_url(url, env={'https_proxy': 'http://localhost:8118/'}) == \
+        'failed'
+    assert check_url(url, extra_options=['-x']) == 'failed'
+    assert check.call_count == 1
@@ -0,0 +1,142 @@
+# SPDX-License-Identifier: AGPL-3.0-or-later
+"""
+Test module for checking accessibility of URLs in-process.
+"""
+
+import http.server
+import socket
+import threading
+from unittest.mock import patch
+
+import pytest
+
+from plinth.modules.apache.probe import Prober
+
+
+class _RequestHandler(http.server.BaseHTTPRequestHandler):
+    """Respond with the status code given in the request path."""
+
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        """Handle a GET request."""
+        self.server.connections.add(self.client_address)
+        status = int(self.path.split('/')[1])
+        body = b'Test page for ' + self.headers['Host'].encode()
+        self.send_response(status)
+        if status in (301, 302):
+            self.send_header('Location', '/200/redirected')
+
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        """Don't log requests."""
+
+
+def _start_server(family, address):
+    """Start an HTTP server and return it."""
+    server_class = type('Server', (http.server.ThreadingHTTPServer, ),
+                        {'address_family': family})
+    server = server_class((address, 0), _RequestHandler)
+    server.connections = set()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+@pytest.fixture(name='server')
+def fixture_server():
+    """Start an HTTP server on the IPv4 loopback address."""
+    server = _start_server(socket.AF_INET, '127.0.0.1')
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture(name='prober')
+def fixture_prober():
+    """Return a prober with a short timeout."""
+    return Prober(timeout=2)
+
+
+def test_check(server, prober):
+    """Test results of checking URLs."""
+    base_url = 'http://127.0.0.1:{}/'.format(server.server_port)
+    assert prober.check(base_url + '200') == 'passed'
+    assert prober.check(base_url + '302', kind='4') == 'passed'
+    assert prober.check(base_url + '401') == 'passed'
+    assert prober.check(base_url + '405') == 'passed'
+    assert prober.check(base_url + '404') == 'failed'
+    assert prober.check(base_url + '500') == 'failed'
+    assert prober.check(base_url + '200', kind='6') == 'failed'
+    assert prober.check('ftp://127.0.0.1/') == 'failed'
+
+    expected_output = 'Test page for 127.0.0.1:{}'.format(server.server_port)
+    assert prober.check(base_url + '301',
+                        expected_output=expected_output) == 'passed'
+    assert prober.check(base_url + '200',
+                        expected_output='Not in page') == 'failed'
+
+
+def test_check_connection_failure(prober):
+    """Test that checking a URL without a server fails."""
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        port = sock.getsockname()[1]
+
+    assert prober.check('http://127.0.0.1:{}/'.format(port)) == 'failed'
+
+
+def test_check_ipv6():
+    """Test checking IPv6 URLs with and without zone index."""
+    if not socket.has_ipv6:
+        pytest.skip('IPv6 is not available')
+
+    try:
+        server = _start_server(socket.AF_INET6, '::1')
+    except OSError:
+        pytest.skip('IPv6 loopback address is not available')
+
+    prober = Prober(timeout=2)
+    try:
+        url = 'http://[::1]:{}/200'.format(server.server_port)
+        assert prober.check(url, kind='6') == 'passed'
+        assert prober.check(url, kind='4') == 'failed'
+
+        url = 'http://[::1%lo]:{}/200'.format(server.server_port)
+        assert prober.check(
+            url, kind='6',
+            expected_output='Test page for [::1]:') == 'passed'
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_connection_reuse(server, prober):
+    """Test that connections are reused across checks."""
+    url = 'http://127.0.0.1:{}/200'.format(server.server_port)
+    results = prober.map(prober.check, [url] * 20)
+    assert results == ['passed'] * 20
+    assert len(server.connections) <= 16
+
+    connections = set(server.connections)
+    assert prober.check(url) == 'passed'
+    assert server.connections == connections
+
+    prober.reset()
+    assert prober.check(url) == 'passed'
+    assert len(server.connections) == len(connections) + 1
+
+
+@patch('plinth.action_utils.get_addresses')
+def test_get_addresses(get_addresses, prober):
+    """Test that addresses are enumerated once until reset."""
+    get_addresses.return_value = [{'kind': '4', 'url_address': '127.0.0.1'}]
+    assert prober.get_addresses() == get_addresses.return_value
+    assert prober.get_addresses() == get_addresses.return_value
+    get_addresses.assert_called_once()
+
+    prober.reset()
+    prober.get_addresses()
+    assert get_addresses.call_count == 2
@@ -0,0 +1,86 @@
+# SPDX-License-Identifier: AGPL-3.0-or-later
+"""
+Test module for tracking enabled Apache configuration.
+"""
+
+import time
+from unittest.mock import patch
+
+import pytest
+
+from plinth import action_utils
+from plinth.modules.apache import state
+
+
+@pytest.fixture(name='apache_directory')
+def fixture_apache_directory(tmp_path):
+    """Use temporary *-enabled directories."""
+    paths = {}
+    for kind, (_, suffix) in action_utils.WEBSERVER_ENABLED_PATHS.items():
+        directory = tmp_path / (kind + '-enabled')
+        directory.mkdir()
+        paths[kind] = (str(directory), suffix)
+
+    available = tmp_path / 'available'
+    available.mkdir()
+    (available / 'test.conf').touch()
+    (available / 'test.load').touch()
+    (tmp_path / 'config-enabled' / 'test.conf').symlink_to(available /
+                                                           'test.conf')
+    (tmp_path / 'module-enabled' / 'test.load').symlink_to(available /
+                                                           'test.load')
+    (tmp_path / 'module-enabled' / 'test.conf').symlink_to(available /
+                                                           'test.conf')
+    (tmp_path / 'site-enabled' / 'broken.conf').symlink_to(available /
+                                                           'broken.conf')
+
+    with patch.dict(action_utils.WEBSERVER_ENABLED_PATHS, paths), \
+            patch.object(state, '_monitors', {}), \
+            patch.object(state, '_cache', {}):
+        yield tmp_path
+
+
+def test_is_enabled(apache_directory):
+    """Test checking enabled state from symlinks."""
+    assert state.is_enabled('test', kind='config')
+    assert state.is_enabled('test', kind='module')
+    assert not state.is_enabled('test', kind='site')
+    assert not state.is_enabled('broken', kind='site')
+    assert not state.is_enabled('missing', kind='config')
+
+    assert action_utils.webserver_is_enabled('test', kind='config')
+    assert not action_utils.webserver_is_enabled('broken', kind='site')
+
+    # Without monitoring, changes are seen immediately
+    (apache_directory / 'config-enabled' / 'test.conf').unlink()
+    assert not state.is_enabled('test', kind='config')
+
+
+def _wait_for(condition):
+    """Run GLib main loop iterations until a condition is met."""
+    context = state.glib.MainContext.default()
+    end_time = time.monotonic() + 5
+    while not condition() and time.monotonic() < end_time:
+        context.iteration(False)
+        time.sleep(0.01)
+
+    return condition()
+
+
+def test_monitoring(apache_directory):
+    """Test that state is cached and invalidated on changes."""
+    state.start_monitoring()
+    assert set(state._monitors) == {'config', 'site', 'module'}
+
+    with patch('os.listdir', wraps=state.os.listdir) as listdir:
+        assert state.is_enabled('test', kind='config')
+        assert state.is_enabled('test', kind='config')
+        assert not state.is_enabled('other', kind='config')
+        listdir.assert_called_once()
+
+    (apache_directory / 'config-enabled' / 'test.conf').unlink()
+    assert _wait_for(lambda: not state.is_enabled('test', kind='config'))
+    assert state.is_enabled('test', kind='module')
+
+    state.invalidate()
+    assert not state._cache
@@ -17,6 +17,7 @@ from django.utils.translation import ugettext_noop
 from plinth import actions
 from plinth import app as app_module
 from plinth import cfg, glib, menu
+from plinth.errors import ActionError
 
 from . import api
 
@@ -35,8 +36,12 @@ _description = [
 ]
 
 MANIFESTS_FOLDER = '/var/lib/plinth/backups-manifests/'
+# data of apps is copied here during a backup, see api.backup_apps()
+STAGING_FOLDER = '/var/lib/plinth/backups-staging/'
 # session variable name that stores when a backup file should be deleted
 SESSION_PATH_VARIABLE = 'fbx-backups-upload-path'
+# session variable name that stores apps in the uploaded backup file
+SESSION_APPS_VARIABLE = 'fbx-backups-upload-apps'
 
 app = None
 
@@ -79,8 +84,13 @@ def setup(helper, old_version=None):
         _show_schedule_setup_notification()
 
 
-def _backup_handler(packet, encryption_passphrase=None):
-    """Performs backup operation on packet."""
+def _backup_handler(packet, encryption_passphrase=None, operation=None):
+    """Performs backup operation on packet.
+
+    If an operation is given, progress is reported to it and it may cancel
+    the backup.
+
+    """
     if not os.path.exists(MANIFESTS_FOLDER):
         os.makedirs(MANIFESTS_FOLDER)
 
@@ -102,13 +112,69 @@ def _backup_handler(packet, encryption_passphrase=None):
     if packet.archive_comment:
         arguments += ['--comment', packet.archive_comment]
 
+    if packet.staging:
+        arguments += ['--staging-directory', _get_staging_path(packet.path)]
+
+    if operation:
+        arguments.append('--progress')
+
     arguments += ['--paths'] + paths
     input_data = ''
     if encryption_passphrase:
         input_data = json.dumps(
             {'encryption_passphrase': encryption_passphrase})
 
-    actions.superuser_run('backups', arguments, input=input_data.encode())
+    if operation:
+        operation.run_action(arguments, input_data.encode())
+    else:
+        actions.superuser_run('backups', arguments, input=input_data.encode())
+
+
+def _get_staging_path(archive_path):
+    """Return the directory to which data is staged for an archive."""
+    return os.path.join(STAGING_FOLDER, get_valid_filename(archive_path))
+
+
+def _stage_handler(packet, component):
+    """Copy the data of an app aside to be archived later."""
+    directories, files = api.get_component_paths(component)
+    arguments = [
+        'stage-paths', '--destination',
+        _get_staging_path(packet.path), '--paths'
+    ] + directories + files
+    actions.superuser_run('backups', arguments)
+
+
+def _can_stage(components):
+    """Return whether the data of apps with services can be staged.
+
+    Staging must not fill up the file system when data can't be copied as
+    reflinks.
+    """
+    paths = []
+    for component in components:
+        if component.services:
+            directories, files = api.get_component_paths(component)
+            paths += directories + files
+
+    if not paths:
+        return False
+
+    try:
+        output = actions.superuser_run('backups',
+                                       ['check-staging', '--paths'] + paths)
+    except ActionError as exception:
+        logger.warning('Unable to check space for staging data: %s',
+                       exception)
+        return False
+
+    result = json.loads(output)
+    if not result['can_stage']:
+        logger.info(
+            'Not enough space to stage %d bytes of data for backup, '
+            'stopping all apps instead', result['size'])
+
+    return result['can_stage']
 
 
 def backup_by_schedule(data):
@@ -12,10 +12,12 @@ TODO:
 
 import importlib
 import logging
+import time
 
 from plinth import action_utils, actions
 from plinth import app as app_module
 from plinth import setup
+from plinth.modules.apache import components as apache_components
 
 from .components import BackupRestore
 
@@ -57,6 +59,9 @@ class Packet:
         path is the full path of an (possibly exported) archive.
         TODO: create two variables out of it as it's distinct information.
 
+        staging is True when the data of apps has been copied aside before
+        being archived, see backup_apps().
+
         """
         self.operation = operation
         self.scope = scope
@@ -64,6 +69,7 @@ class Packet:
         self.components = components
         self.path = path
         self.archive_comment = archive_comment
+        self.staging = False
         self.errors = []
 
         self.directories = []
@@ -74,10 +80,21 @@ class Packet:
     def _process_manifests(self):
         """Look at manifests and fill up the list of directories/files."""
         for component in self.components:
-            for section in ['config', 'data', 'secrets']:
-                section = getattr(component, section)
-                self.directories += section.get('directories', [])
-                self.files += section.get('files', [])
+            directories, files = get_component_paths(component)
+            self.directories += directories
+            self.files += files
+
+
+def get_component_paths(component):
+    """Return the directories and files of a component's manifest."""
+    directories = []
+    files = []
+    for section in ['config', 'data', 'secrets']:
+        section = getattr(component, section)
+        directories += section.get('directories', [])
+        files += section.get('files', [])
+
+    return directories, files
 
 
 def backup_full(backup_handler, path=None):
@@ -108,8 +125,20 @@ def restore_full(restore_handler):
 
 
 def backup_apps(backup_handler, path, app_ids=None, encryption_passphrase=None,
-                archive_comment=None):
-    """Backup data belonging to a set of applications."""
+                archive_comment=None, stage_handler=None, can_stage=None):
+    """Backup data belonging to a set of applications.
+
+    Without snapshots, the services of apps must be stopped while their data
+    is read. If a stage handler is given, the data of each app is copied
+    aside in turn and the app is started again right after. Only then is the
+    archive created from the copies. Otherwise, or if can_stage() returns
+    False for the components, all apps are stopped until the archive has been
+    created.
+
+    Return the number of seconds for which the services of each app were
+    stopped, keyed by app ID.
+
+    """
     if not app_ids:
         components = get_all_components_for_backup()
     else:
@@ -118,24 +147,86 @@ def backup_apps(backup_handler, path, app_ids=None, encryption_passphrase=None,
     if _is_snapshot_available():
         snapshot = _take_snapshot()
         backup_root = snapshot['mount_path']
-        snapshotted = True
-    else:
-        _lockdown_apps(components, lockdown=True)
-        original_state = _shutdown_services(components)
-        backup_root = '/'
-        snapshotted = False
-
-    packet = Packet('backup', 'apps', backup_root, components, path,
-                    archive_comment)
-    _run_operation(backup_handler, packet,
-                   encryption_passphrase=encryption_passphrase)
-
-    if snapshotted:
+        packet = Packet('backup', 'apps', backup_root, components, path,
+                        archive_comment)
+        _run_operation(backup_handler, packet,
+                       encryption_passphrase=encryption_passphrase)
         _delete_snapshot(snapshot)
-    else:
+        return {}
+
+    packet = Packet('backup', 'apps', '/', components, path, archive_comment)
+    if stage_handler and (not can_stage or can_stage(components)):
+        return _backup_apps_staged(backup_handler, stage_handler, packet,
+                                   encryption_passphrase)
+
+    _lockdown_apps(components, lockdown=True)
+    start_time = time.monotonic()
+    original_state = _shutdown_services(components)
+    try:
+        _run_operation(backup_handler, packet,
+                       encryption_passphrase=encryption_passphrase)
+    finally:
         _restore_services(original_state)
         _lockdown_apps(components, lockdown=False)
 
+    downtime = time.monotonic() - start_time
+    return {
+        component.app.app_id: downtime
+        for component in components if component.services
+    }
+
+
+def _backup_apps_staged(backup_handler, stage_handler, packet,
+                        encryption_passphrase):
+    """Backup apps stopping each one only while its data is staged.
+
+    An app whose data could not be staged is kept stopped until the archive
+    has been created from the live data.
+
+    """
+    packet.staging = True
+    components = packet.components
+    downtime = {}
+    stopped = []
+    _lockdown_apps(components, lockdown=True)
+    try:
+        for component in components:
+            if not component.services:
+                _run_hook(component, 'backup_pre', packet)
+                continue
+
+            start_time = time.monotonic()
+            original_state = _shutdown_services([component])
+            stopped.append((component, original_state, start_time))
+            _run_hook(component, 'backup_pre', packet)
+            try:
+                stage_handler(packet, component)
+            except Exception as exception:
+                logger.warning(
+                    'Unable to stage data of app %s, keeping it stopped: %s',
+                    component.app.app_id, exception)
+                continue
+
+            stopped.pop()
+            _restore_services(original_state)
+            _lockdown_apps([component], lockdown=False)
+            downtime[component.app.app_id] = time.monotonic() - start_time
+
+        backup_handler(packet, encryption_passphrase=encryption_passphrase)
+        _run_hooks('backup_post', packet)
+    finally:
+        for component, original_state, start_time in stopped:
+            _restore_services(original_state)
+            downtime[component.app.app_id] = time.monotonic() - start_time
+
+        _lockdown_apps(components, lockdown=False)
+
+    for app_id, seconds in downtime.items():
+        logger.info('App %s was stopped for %.1f seconds during backup',
+                    app_id, seconds)
+
+    return downtime
+
 
 def restore_apps(restore_handler, app_ids=None, create_subvolume=True,
                  backup_file=None, encryption_passphrase=None):
@@ -339,25 +430,22 @@ class ApacheServiceHandler(ServiceHandler):
 
     def stop(self):
         """Stop the service."""
-        self.was_enabled = action_utils.webserver_is_enabled(
+        self.was_enabled = apache_components.webserver_is_enabled(
             self.web_name, kind=self.kind)
         if self.was_enabled:
-            actions.superuser_run(
-                'apache',
-                ['disable', '--name', self.web_name, '--kind', self.kind])
+            apache_components.webserver_disable(self.web_name, kind=self.kind)
 
     def restart(self):
         """Restart the service if it was earlier running."""
         if self.was_enabled:
-            actions.superuser_run(
-                'apache',
-                ['enable', '--name', self.web_name, '--kind', self.kind])
+            apache_components.webserver_enable(self.web_name, kind=self.kind)
 
 
 def _shutdown_services(components):
     """Shutdown all services specified by backup manifests.
 
     - Services are shutdown in the reverse order of the components listing.
+    - Apache configuration is disabled with a single reload at the end.
 
     Return the current state of the services so they can be restored
     accurately.
@@ -368,8 +456,9 @@ def _shutdown_services(components):
         for service in component.services:
             state.append(ServiceHandler.create(component, service))
 
-    for service in reversed(state):
-        service.stop()
+    with apache_components.webserver_changes():
+        for service in reversed(state):
+            service.stop()
 
     return state
 
@@ -377,10 +466,12 @@ def _shutdown_services(components):
 def _restore_services(original_state):
     """Re-run services to restore them to their initial state.
 
-    Maintain exact order of services so dependencies are satisfied.
+    Maintain exact order of services so dependencies are satisfied. Apache
+    configuration is re-enabled with a single reload.
     """
-    for service_handler in original_state:
-        service_handler.restart()
+    with apache_components.webserver_changes():
+        for service_handler in original_state:
+            service_handler.restart()
 
 
 def _run_hooks(hook, packet):
@@ -412,13 +503,17 @@ def _run_hooks(hook, packet):
     """
     logger.info('Running %s hooks', hook)
     for component in packet.components:
-        try:
-            getattr(component, hook)(packet)
-        except Exception as exception:
-            logger.exception(
-                'Error running backup/restore hook for app %s: %s',
-                component.app.app_id, exception)
-            packet.errors.append(BackupError('hook', component, hook=hook))
+        _run_hook(component, hook, packet)
+
+
+def _run_hook(component, hook, packet):
+    """Run a pre/post operation hook of a single application."""
+    try:
+        getattr(component, hook)(packet)
+    except Exception as exception:
+        logger.exception('Error running backup/restore hook for app %s: %s',
+                         component.app.app_id, exception)
+        packet.errors.append(BackupError('hook', component, hook=hook))
 
 
 def _run_operation(handler, packet, encryption_passphrase=None):
@@ -6,7 +6,7 @@ Decorators for the backup views.
 import functools
 import os
 
-from . import SESSION_PATH_VARIABLE
+from . import SESSION_APPS_VARIABLE, SESSION_PATH_VARIABLE
 
 
 def delete_tmp_backup_file(function):
@@ -22,6 +22,7 @@ def delete_tmp_backup_file(function):
             if os.path.isfile(path):
                 os.remove(path)
             del request.session[SESSION_PATH_VARIABLE]
+        request.session.pop(SESSION_APPS_VARIABLE, None)
         return function(request, *args, **kwargs)
 
     return wrapper
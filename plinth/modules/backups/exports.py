@@ -0,0 +1,396 @@
+# SPDX-License-Identifier: AGPL-3.0-or-later
+"""
+Stream exported archives and keep them on disk for resumable downloads.
+
+Archives are exported by 'borg export-tar' and compressed with gzip (pigz, if
+available), zstd or not at all. When a resumable download of an archive from
+an unencrypted repository is requested, the exported data is written to a
+cache file while it is sent. Archives of encrypted repositories are never
+cached as that would leave decrypted copies on disk. If the client goes away,
+the export is completed in the background, by a limited number of threads, so
+that the download can be resumed with an HTTP Range request. Cache files are
+evicted, least recently used first, when they take more than a small fraction
+of the free disk space.
+"""
+
+import hashlib
+import io
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+from django.utils.translation import ugettext_lazy as _
+
+from plinth import cfg
+
+logger = logging.getLogger(__name__)
+
+CACHE_DIR = os.path.join(cfg.data_dir, 'backups-exports')
+
+# Size of the chunks read from the export and sent to the client. This is a
+# multiple of the tar record size and of the page size.
+CHUNK_SIZE = 1024 * 1024
+
+# Fraction of the disk space, free or used by the cache, that cached exports
+# may take
+CACHE_DISK_FRACTION = 0.1
+
+# Number of exports that may be completed in the background at the same time
+MAX_BACKGROUND_EXPORTS = 2
+
+# Number of seconds after which an unfinished cache file is considered stale
+PARTIAL_TIMEOUT = 24 * 60 * 60
+
+_PARTIAL_PREFIX = '.partial-'
+
+# Compression: (file name suffix, content type, label, required program)
+COMPRESSIONS = {
+    'gzip': ('.tar.gz', 'application/gzip', _('gzip'), None),
+    'zstd': ('.tar.zst', 'application/zstd', _('zstd'), 'zstd'),
+    'none': ('.tar', 'application/x-tar', _('uncompressed'), None),
+}
+
+DEFAULT_COMPRESSION = 'gzip'
+
+_lock = threading.Lock()
+
+_background_exports = threading.BoundedSemaphore(MAX_BACKGROUND_EXPORTS)
+
+
+def get_compressions():
+    """Return the list of (compression, label) available on this machine."""
+    return [(compression, label)
+            for compression, (_, _, label, program) in COMPRESSIONS.items()
+            if not program or shutil.which(program)]
+
+
+def get_filename(archive_name, compression):
+    """Return the name of the file offered for download."""
+    return archive_name + COMPRESSIONS[compression][0]
+
+
+def get_content_type(compression):
+    """Return the content type of an exported archive."""
+    return COMPRESSIONS[compression][1]
+
+
+def _hash(value):
+    """Return a short hash of a string usable in file names."""
+    return hashlib.sha256(value.encode()).hexdigest()[:32]
+
+
+def get_path(uuid, archive_name, compression):
+    """Return the path of the cache file of an exported archive.
+
+    File names are prefixed with a hash of the repository so that all the
+    exports of a repository can be removed together.
+    """
+    name = '{}-{}{}'.format(_hash(uuid),
+                            _hash(archive_name + '/' + compression),
+                            COMPRESSIONS[compression][0])
+    return os.path.join(CACHE_DIR, name)
+
+
+def open_cached(path):
+    """Return the cache file at a path opened for reading or None.
+
+    Opening a cache file marks it as recently used.
+    """
+    try:
+        file_handle = open(path, 'rb')
+    except FileNotFoundError:
+        return None
+
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+
+    return file_handle
+
+
+def get_etag(file_handle):
+    """Return an entity tag that changes when a cache file is replaced."""
+    stat = os.fstat(file_handle.fileno())
+    return '"{:x}-{:x}"'.format(stat.st_ino, stat.st_size)
+
+
+def get_range(header, size):
+    """Return (start, end) of the bytes requested in a Range header or None.
+
+    end is exclusive. None is returned when the whole file should be sent,
+    such as when there is no header or multiple ranges are requested. Raise
+    ValueError if the range can't be satisfied.
+    """
+    if not header:
+        return None
+
+    unit, _, ranges = header.partition('=')
+    if unit.strip() != 'bytes' or ',' in ranges:
+        return None
+
+    first, separator, last = ranges.strip().partition('-')
+    try:
+        first = int(first) if first else None
+        last = int(last) if last else None
+    except ValueError:
+        return None
+
+    if not separator or (first is None and last is None) or \
+       (first is not None and last is not None and last < first):
+        return None
+
+    if first is None:  # Suffix range, last bytes of the file
+        if last == 0:
+            raise ValueError('Empty range')
+
+        return max(size - last, 0), size
+
+    if first >= size:
+        raise ValueError('Range starts after the end of file')
+
+    end = size if last is None else min(last + 1, size)
+    return first, end
+
+
+def read_file(file_handle, start, end):
+    """Yield the data of a file between two offsets in chunks."""
+    with file_handle:
+        file_handle.seek(start)
+        remaining = end - start
+        while remaining > 0:
+            chunk = file_handle.read(min(CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+
+            remaining -= len(chunk)
+            yield chunk
+
+
+class ExportStream(io.BufferedReader):
+    """Output of an export-tar process read in large chunks.
+
+    Django simply returns the iterator as a response for the WSGI app.
+    CherryPy then iterates over this iterator and writes to HTTP response.
+    The default __next__() calls readline() which looks for \\n in binary data
+    which leads to short unpredictably sized chunks which in turn lead to
+    severe performance degradation. So, read fixed sized chunks instead.
+    """
+
+    def __init__(self, process):
+        """Initialize with an export-tar process."""
+        super().__init__(process.stdout, buffer_size=CHUNK_SIZE)
+        self.process = process
+
+    def __next__(self):
+        """Override to call read() instead of readline()."""
+        chunk = self.read(CHUNK_SIZE)
+        if not chunk:
+            raise StopIteration
+
+        return chunk
+
+    def wait(self):
+        """Wait for the export to end and return whether it succeeded."""
+        return self.process.wait() == 0
+
+
+def cache_stream(stream, path):
+    """Yield the chunks of an export while writing them to a cache file.
+
+    The cache file is made available only after the export has succeeded. If
+    the download is stopped, the rest of the export is written to the cache
+    file in a background thread. If MAX_BACKGROUND_EXPORTS are already being
+    completed, the export is cancelled instead. Failing to write the cache
+    file does not affect the download.
+    """
+    try:
+        os.makedirs(CACHE_DIR, mode=0o700, exist_ok=True)
+        file_descriptor, partial_path = tempfile.mkstemp(
+            prefix=_PARTIAL_PREFIX, dir=CACHE_DIR)
+        file_handle = os.fdopen(file_descriptor, 'wb')
+    except OSError as exception:
+        logger.warning('Unable to cache exported archive: %s', exception)
+        yield from stream
+        return
+
+    cache = _CacheWriter(stream, file_handle, partial_path, path)
+    try:
+        for chunk in stream:
+            cache.write(chunk)
+            yield chunk
+    except GeneratorExit:
+        if cache.is_writing() and _background_exports.acquire(blocking=False):
+            threading.Thread(target=_complete, args=(cache, ),
+                             daemon=True).start()
+        else:
+            if cache.is_writing():
+                logger.info('Too many exports being completed, cancelling')
+
+            cache.discard()
+            stream.close()
+
+        raise
+    except Exception:
+        cache.discard()
+        raise
+
+    cache.finish()
+
+
+def _complete(cache):
+    """Complete writing a cache file in a background thread."""
+    try:
+        cache.complete()
+    finally:
+        _background_exports.release()
+
+
+class _CacheWriter:
+    """Write an export to a temporary file and move it into the cache."""
+
+    def __init__(self, stream, file_handle, partial_path, path):
+        """Initialize with an open temporary file and final path."""
+        self.stream = stream
+        self.file_handle = file_handle
+        self.partial_path = partial_path
+        self.path = path
+
+    def is_writing(self):
+        """Return whether the cache file is still being written."""
+        return self.file_handle is not None
+
+    def write(self, chunk):
+        """Write a chunk to the cache file, give up caching on error."""
+        if not self.file_handle:
+            return
+
+        try:
+            self.file_handle.write(chunk)
+        except OSError as exception:
+            logger.warning('Unable to cache exported archive: %s', exception)
+            self.discard()
+
+    def complete(self):
+        """Write the rest of the export to the cache file."""
+        try:
+            for chunk in self.stream:
+                self.write(chunk)
+                if not self.file_handle:
+                    break
+        except Exception as exception:
+            logger.warning('Unable to complete exported archive: %s',
+                           exception)
+            self.discard()
+        finally:
+            self.stream.close()
+
+        self.finish()
+
+    def finish(self):
+        """Move the cache file into place if the export succeeded."""
+        if not self.file_handle:
+            return
+
+        if not self.stream.wait():
+            logger.warning('Exporting archive failed, not caching it')
+            self.discard()
+            return
+
+        try:
+            self.file_handle.close()
+            os.replace(self.partial_path, self.path)
+        except OSError as exception:
+            logger.warning('Unable to cache exported archive: %s', exception)
+            self.discard()
+            return
+
+        self.file_handle = None
+        evict()
+
+    def discard(self):
+        """Stop caching and remove the temporary file."""
+        if not self.file_handle:
+            return
+
+        self.file_handle.close()
+        self.file_handle = None
+        try:
+            os.remove(self.partial_path)
+        except FileNotFoundError:
+            pass
+
+
+def _list_cache():
+    """Return a list of (mtime, size, path, is_partial) of cache files."""
+    files = []
+    try:
+        entries = list(os.scandir(CACHE_DIR))
+    except FileNotFoundError:
+        return files
+
+    for entry in entries:
+        try:
+            stat = entry.stat(follow_symlinks=False)
+        except FileNotFoundError:
+            continue
+
+        files.append((stat.st_mtime, stat.st_size, entry.path,
+                      entry.name.startswith(_PARTIAL_PREFIX)))
+
+    return files
+
+
+def evict():
+    """Remove least recently used cache files that exceed the size budget.
+
+    Unfinished cache files that are no longer written to are removed too.
+    """
+    with _lock:
+        files = _list_cache()
+        now = time.time()
+        cached = []
+        for mtime, size, path, is_partial in files:
+            if not is_partial:
+                cached.append((mtime, size, path))
+            elif now - mtime > PARTIAL_TIMEOUT:
+                _remove(path)
+
+        used = sum(size for _mtime, size, _path in cached)
+        try:
+            free = shutil.disk_usage(CACHE_DIR).free
+        except FileNotFoundError:
+            return
+
+        budget = (free + used) * CACHE_DISK_FRACTION
+        for _mtime, size, path in sorted(cached):
+            if used <= budget:
+                break
+
+            _remove(path)
+            used -= size
+
+
+def remove(uuid, archive_name=None):
+    """Remove the cached exports of an archive or of all of a repository."""
+    if archive_name is not None:
+        for compression in COMPRESSIONS:
+            _remove(get_path(uuid, archive_name, compression))
+
+        return
+
+    prefix = _hash(uuid) + '-'
+    for _mtime, _size, path, _is_partial in _list_cache():
+        if os.path.basename(path).startswith(prefix):
+            _remove(path)
+
+
+def _remove(path):
+    """Remove a cache file if it exists."""
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
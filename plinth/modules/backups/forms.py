@@ -136,7 +136,8 @@ class UploadForm(forms.Form):
     file = forms.FileField(
         label=_('Upload File'), required=True, validators=[
             FileExtensionValidator(
-                ['gz'], _('Backup files have to be in .tar.gz format'))
+                ['gz', 'tar'],
+                _('Backup files have to be in .tar.gz or .tar format'))
         ], help_text=_('Select the backup file you want to upload'))
 
 
@@ -0,0 +1,280 @@
+# SPDX-License-Identifier: AGPL-3.0-or-later
+"""
+Run backups as operations with progress that can be cancelled.
+
+An operation creates an archive either in a background thread, when started
+from the web interface, or in the calling thread, when run by the schedule.
+Running operations are listed so that their progress can be shown and they
+can be cancelled from any page. borg reports progress with --progress
+--log-json as JSON lines which are parsed into files, bytes, rate and
+estimated time remaining.
+"""
+
+import collections
+import json
+import logging
+import threading
+import time
+import uuid
+
+from django.utils.translation import ugettext_lazy as _
+
+from plinth import actions
+from plinth.errors import ActionError
+
+logger = logging.getLogger(__name__)
+
+# Number of finished operations remembered until their result is shown
+MAX_FINISHED = 10
+
+# Number of seconds of progress over which the transfer rate is computed
+RATE_WINDOW = 10
+
+_operations = collections.OrderedDict()
+_lock = threading.Lock()
+
+
+class BackupCancelled(Exception):
+    """The backup operation was cancelled."""
+
+
+class Progress:
+    """Progress of creating an archive as reported by borg."""
+
+    def __init__(self):
+        """Initialize with nothing done yet."""
+        self.total_size = None
+        self.total_files = None
+        self.size = 0
+        self.compressed_size = 0
+        self.deduplicated_size = 0
+        self.files = 0
+        self.path = None
+        self.finished = False
+        self._samples = collections.deque()
+
+    def update(self, message):
+        """Update progress from a JSON message of borg --log-json."""
+        if message.get('type') == 'backup_size':
+            self.total_size = message['size']
+            self.total_files = message['nfiles']
+        elif message.get('type') == 'archive_progress':
+            if message.get('finished'):
+                self.finished = True
+                return
+
+            self.size = message.get('original_size', self.size)
+            self.compressed_size = message.get('compressed_size',
+                                               self.compressed_size)
+            self.deduplicated_size = message.get('deduplicated_size',
+                                                 self.deduplicated_size)
+            self.files = message.get('nfiles', self.files)
+            self.path = message.get('path') or self.path
+            self._add_sample(time.monotonic(), self.size)
+
+    def _add_sample(self, now, size):
+        """Remember size at a time dropping samples out of the window."""
+        self._samples.append((now, size))
+        while now - self._samples[0][0] > RATE_WINDOW:
+            self._samples.popleft()
+
+    @property
+    def rate(self):
+        """Return the number of bytes read per second recently or None."""
+        if len(self._samples) < 2:
+            return None
+
+        (start_time, start_size), (end_time, end_size) = \
+            self._samples[0], self._samples[-1]
+        if end_time <= start_time:
+            return None
+
+        return (end_size - start_size) / (end_time - start_time)
+
+    @property
+    def percentage(self):
+        """Return the percentage of data read or None if not known."""
+        if not self.total_size:
+            return None
+
+        return min(100, int(self.size * 100 / self.total_size))
+
+    @property
+    def eta(self):
+        """Return the estimated number of seconds remaining or None."""
+        rate = self.rate
+        if not rate or self.total_size is None:
+            return None
+
+        return max(0, (self.total_size - self.size) / rate)
+
+
+class BackupOperation:
+    """Creation of an archive with its progress and result."""
+
+    def __init__(self, repository, archive_name, app_ids,
+                 archive_comment=None):
+        """Initialize the operation."""
+        self.operation_id = uuid.uuid4().hex
+        self.repository = repository
+        self.archive_name = archive_name
+        self.app_ids = app_ids
+        self.archive_comment = archive_comment
+        self.state = 'pending'
+        self.progress = Progress()
+        self.downtime = {}
+        self.exception = None
+        self._cancelled = False
+        self._process = None
+        self._lock = threading.Lock()
+
+    @property
+    def is_running(self):
+        """Return whether the operation has not finished yet."""
+        return self.state in ('pending', 'running')
+
+    @property
+    def is_cancelled(self):
+        """Return whether the operation was asked to stop."""
+        return self._cancelled
+
+    def start(self):
+        """Run the operation in a background thread."""
+        _add(self)
+        thread = threading.Thread(target=self._run, daemon=True)
+        thread.start()
+
+    def run(self):
+        """Run the operation and wait for it to finish.
+
+        Raise the exception that made the backup fail. Cancelling is not
+        considered a failure.
+
+        """
+        _add(self)
+        self._run()
+        if self.state == 'failed':
+            raise self.exception
+
+    def _run(self):
+        """Create the archive and collect the result."""
+        self.state = 'running'
+        try:
+            self.downtime = self.repository.create_archive(
+                self.archive_name, self.app_ids,
+                archive_comment=self.archive_comment, operation=self)
+        except Exception as exception:
+            if self._cancelled:
+                logger.info('Backup %s cancelled', self.archive_name)
+                self.state = 'cancelled'
+            else:
+                logger.exception('Error creating backup %s: %s',
+                                 self.archive_name, exception)
+                self.exception = exception
+                self.state = 'failed'
+        else:
+            self.state = 'finished'
+
+    def cancel(self):
+        """Stop the operation as soon as possible.
+
+        borg is asked to terminate so that it releases the repository lock.
+        If borg is not running yet, the operation stops before starting it.
+
+        """
+        with self._lock:
+            self._cancelled = True
+            if self._process:
+                self._process.terminate()
+
+    def run_action(self, arguments, input_data):
+        """Run the backups action parsing progress from its stderr."""
+        with self._lock:
+            if self._cancelled:
+                raise BackupCancelled()
+
+            process = actions.superuser_run('backups', arguments,
+                                            run_in_background=True)
+            self._process = process
+
+        try:
+            process.stdin.write(input_data)
+            process.stdin.close()
+            errors = []
+            for line in process.stderr:
+                self._parse_line(line.decode(errors='replace'), errors)
+
+            output = process.stdout.read().decode()
+        finally:
+            process.wait()
+            with self._lock:
+                self._process = None
+
+        if self._cancelled:
+            raise BackupCancelled()
+
+        if process.returncode:
+            raise ActionError('backups', output, ''.join(errors))
+
+        return output
+
+    def _parse_line(self, line, errors):
+        """Update progress from a line or collect it as error output."""
+        try:
+            message = json.loads(line)
+        except ValueError:
+            errors.append(line)
+            return
+
+        if not isinstance(message, dict):
+            errors.append(line)
+        elif message.get('type') == 'log_message':
+            errors.append(message.get('message', '') + '\n')
+        else:
+            self.progress.update(message)
+
+    def get_status_message(self):
+        """Return a message describing the state of the operation."""
+        messages = {
+            'pending': _('Backup {name} is starting.'),
+            'running': _('Creating backup {name}.'),
+            'finished': _('Archive created.'),
+            'failed': _('Creating backup {name} failed.'),
+            'cancelled': _('Backup {name} cancelled.'),
+        }
+        return str(messages[self.state]).format(name=self.archive_name)
+
+
+def _add(operation):
+    """Remember an operation forgetting old finished ones."""
+    with _lock:
+        _operations[operation.operation_id] = operation
+        finished = [
+            operation_id for operation_id, operation_ in _operations.items()
+            if not operation_.is_running
+        ]
+        for operation_id in finished[:-MAX_FINISHED]:
+            del _operations[operation_id]
+
+
+def get(operation_id):
+    """Return an operation by its ID or None."""
+    with _lock:
+        return _operations.get(operation_id)
+
+
+def get_running():
+    """Return the list of operations that have not finished."""
+    with _lock:
+        return [
+            operation for operation in _operations.values()
+            if operation.is_running
+        ]
+
+
+def remove(operation_id):
+    """Forget a finished operation after its result has been shown."""
+    with _lock:
+        operation = _operations.get(operation_id)
+        if operation and not operation.is_running:
+            del _operations[operation_id]
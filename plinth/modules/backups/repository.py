@@ -5,11 +5,12 @@ Remote and local Borg backup repositories
 
 import abc
 import contextlib
-import io
+import functools
 import json
 import logging
 import os
 import re
+import threading
 from uuid import uuid1
 
 import paramiko
@@ -19,12 +20,22 @@ from plinth import actions, cfg
 from plinth.errors import ActionError
 from plinth.utils import format_lazy
 
-from . import (_backup_handler, api, errors, get_known_hosts_path,
-               restore_archive_handler, split_path, store)
+from . import (_backup_handler, _can_stage, _stage_handler, api, errors,
+               exports, get_known_hosts_path, restore_archive_handler,
+               split_path, store)
 from .schedule import Schedule
 
 logger = logging.getLogger(__name__)
 
+# Apps in archives by (repository uuid, archive id). Archives don't change
+# after they are created.
+_archive_apps = {}
+
+# IDs of archives by (repository uuid, archive name) as last listed
+_archive_ids = {}
+
+_archive_lock = threading.Lock()
+
 # known errors that come up when remotely accessing a borg repository
 # 'errors' are error strings to look for in the stacktrace.
 KNOWN_ERRORS = [
@@ -129,6 +140,11 @@ class BaseBorgRepository(abc.ABC):
         """Return the repository that the backups action script should use."""
         return self._path
 
+    @property
+    def is_encrypted(self):
+        """Return whether the repository is encrypted with a passphrase."""
+        return bool(self._get_encryption_data())
+
     @staticmethod
     def prepare():
         """Prepare the repository for operations."""
@@ -150,7 +166,7 @@ class BaseBorgRepository(abc.ABC):
             'uuid': self.uuid,
             'name': self.name,
             'storage_type': self.storage_type,
-            'is_encrypted': bool(self._get_encryption_data()),
+            'is_encrypted': self.is_encrypted,
             'flags': self.flags,
             'error': None,
         }
@@ -170,21 +186,47 @@ class BaseBorgRepository(abc.ABC):
         """Return list of archives in this repository."""
         output = self.run(['list-repo', '--path', self.borg_path])
         archives = json.loads(output)['archives']
+        with _archive_lock:
+            for key in [key for key in _archive_ids if key[0] == self.uuid]:
+                del _archive_ids[key]
+
+            for archive in archives:
+                _archive_ids[(self.uuid, archive['name'])] = archive['id']
+
         return sorted(archives, key=lambda archive: archive['start'],
                       reverse=True)
 
-    def create_archive(self, archive_name, app_ids, archive_comment=None):
-        """Create a new archive in this repository with given name."""
+    def create_archive(self, archive_name, app_ids, archive_comment=None,
+                       operation=None):
+        """Create a new archive in this repository with given name.
+
+        Progress is reported to an operation, if given, see
+        operations.BackupOperation. Return the number of seconds for which
+        each app was stopped.
+
+        """
         archive_path = self._get_archive_path(archive_name)
         passphrase = self.credentials.get('encryption_passphrase', None)
-        api.backup_apps(_backup_handler, path=archive_path, app_ids=app_ids,
-                        encryption_passphrase=passphrase,
-                        archive_comment=archive_comment)
+        backup_handler = _backup_handler
+        if operation:
+            backup_handler = functools.partial(_backup_handler,
+                                               operation=operation)
+
+        return api.backup_apps(backup_handler, path=archive_path,
+                               app_ids=app_ids,
+                               encryption_passphrase=passphrase,
+                               archive_comment=archive_comment,
+                               stage_handler=_stage_handler,
+                               can_stage=_can_stage)
 
     def delete_archive(self, archive_name):
         """Delete an archive with given name from this repository."""
         archive_path = self._get_archive_path(archive_name)
         self.run(['delete-archive', '--path', archive_path])
+        exports.remove(self.uuid, archive_name)
+        with _archive_lock:
+            archive_id = _archive_ids.pop((self.uuid, archive_name), None)
+            _archive_apps.pop((self.uuid, archive_id), None)
 
     def initialize(self):
         """Initialize / create a borg repository."""
@@ -229,37 +271,22 @@ class BaseBorgRepository(abc.ABC):
         return self._run('backups', arguments, superuser=superuser,
                          input=input_data.encode())
 
-    def get_download_stream(self, archive_name):
-        """Return an stream of .tar.gz binary data for a backup archive."""
-
-        class BufferedReader(io.BufferedReader):
-            """Improve performance of buffered binary streaming.
+    def get_download_stream(self, archive_name,
+                            compression=exports.DEFAULT_COMPRESSION):
+        """Return a stream of tar binary data for a backup archive.
 
-            Django simply returns the iterator as a response for the WSGI app.
-            CherryPy then iterates over this iterator and writes to HTTP
-            response. This calls __next__ over the BufferedReader that is
-            process.stdout. However, this seems to call readline() which looks
-            for \n in binary data which leads to short unpredictably sized
-            chunks which in turn lead to severe performance degradation. So,
-            overwrite this and call read() which is better geared for handling
-            binary data.
+        The data is compressed with 'gzip', 'zstd' or not at all with 'none'.
 
-            """
-
-            def __next__(self):
-                """Override to call read() instead of readline()."""
-                chunk = self.read(io.DEFAULT_BUFFER_SIZE)
-                if not chunk:
-                    raise StopIteration
-
-                return chunk
-
-        args = ['export-tar', '--path', self._get_archive_path(archive_name)]
+        """
+        args = [
+            'export-tar', '--path',
+            self._get_archive_path(archive_name), '--compression', compression
+        ]
         input_data = json.dumps(self._get_encryption_data())
         proc = self._run('backups', args, run_in_background=True)
         proc.stdin.write(input_data.encode())
         proc.stdin.close()
-        return BufferedReader(proc.stdout)
+        return exports.ExportStream(proc)
 
     def _get_archive_path(self, archive_name):
         """Return full borg path for an archive."""
@@ -285,10 +312,27 @@ class BaseBorgRepository(abc.ABC):
         return None
 
     def get_archive_apps(self, archive_name):
-        """Get list of apps included in an archive."""
+        """Get list of apps included in an archive.
+
+        The apps are remembered by the ID of the archive found when archives
+        were last listed.
+
+        """
+        with _archive_lock:
+            archive_id = _archive_ids.get((self.uuid, archive_name))
+            apps = _archive_apps.get((self.uuid, archive_id))
+
+        if apps is not None:
+            return list(apps)
+
         archive_path = self._get_archive_path(archive_name)
         output = self.run(['get-archive-apps', '--path', archive_path])
-        return output.splitlines()
+        apps = output.splitlines()
+        if archive_id:
+            with _archive_lock:
+                _archive_apps[(self.uuid, archive_id)] = apps
+
+        return list(apps)
 
     def restore_archive(self, archive_name, app_ids=None):
         """Restore an archive from this repository to the system."""
@@ -351,6 +395,7 @@ class BorgRepository(BaseBorgRepository):
     def remove(self):
         """Remove a repository from the kvstore."""
         store.delete(self.uuid)
+        exports.remove(self.uuid)
 
 
 class SshBorgRepository(BaseBorgRepository):
@@ -444,6 +489,7 @@ class SshBorgRepository(BaseBorgRepository):
         """Remove a repository from the kvstore and delete its mountpoint"""
         self.umount()
         store.delete(self.uuid)
+        exports.remove(self.uuid)
         try:
             if os.path.exists(self._mountpoint):
                 try:
@@ -293,8 +293,10 @@ class Schedule:
             if component.app_id not in self.unselected_apps
         ]
 
+        from .operations import BackupOperation
         repository = self._get_repository()
-        repository.create_archive(name, app_ids, archive_comment=comment)
+        BackupOperation(repository, name, app_ids,
+                        archive_comment=comment).run()
 
     def _run_cleanup(self, repository):
         """Cleanup old backups."""
@@ -0,0 +1,326 @@
+# SPDX-License-Identifier: AGPL-3.0-or-later
+"""
+Tests for backups actions.
+"""
+
+import imp
+import io
+import json
+import pathlib
+import random
+import tarfile
+from unittest.mock import Mock, patch
+
+import pytest
+
+
+def _action_file():
+    """Return the path to the 'backups' actions file."""
+    current_directory = pathlib.Path(__file__).parent
+    return str(current_directory / '..' / '..' / '..' / '..' / 'actions' /
+               'backups')
+
+
+actions = imp.load_source('backups', _action_file())
+
+LOCATIONS = {
+    'files': ['/etc/app1/config', '/etc/app2/config'],
+    'directories': ['/var/lib/app1/', '/var/lib/app2', '/etc/app3/conf.d/'],
+}
+
+
+def _matches(path, locations):
+    """Check whether a path is selected the slow way."""
+    return path in locations['files'] or any(
+        path.startswith(directory) for directory in locations['directories'])
+
+
+def test_location_matcher():
+    """Test matching paths against selected files and directories."""
+    matcher = actions._LocationMatcher(LOCATIONS['files'],
+                                       LOCATIONS['directories'])
+    assert matcher.matches('/etc/app1/config')
+    assert not matcher.matches('/etc/app1/config2')
+    assert not matcher.matches('/etc/app1')
+    assert matcher.matches('/var/lib/app1/')
+    assert matcher.matches('/var/lib/app1/data/file')
+    assert not matcher.matches('/var/lib/app1')
+    assert matcher.matches('/var/lib/app2')
+    assert matcher.matches('/var/lib/app2x/file')
+    assert not matcher.matches('/var/lib/app')
+    assert not matcher.matches('/')
+
+    segments = ['etc', 'var', 'lib', 'app1', 'app2', 'app3', 'conf.d', 'x']
+    for _ in range(1000):
+        path = '/' + '/'.join(
+            random.choice(segments) for _ in range(random.randint(0, 5)))
+        path += random.choice(['', '/'])
+        assert matcher.matches(path) == _matches(path, LOCATIONS)
+
+
+@pytest.fixture(name='archive')
+def fixture_archive(tmp_path):
+    """Create an exported archive."""
+    path = tmp_path / 'archive.tar.gz'
+    with tarfile.open(path, 'w:gz') as tar_handle:
+        for name in [
+                'etc/app1/config', 'etc/app1/other', 'var/lib/app1/data',
+                'var/lib/app2/data', 'var/lib/app4/data'
+        ]:
+            content = name.encode()
+            info = tarfile.TarInfo(name)
+            info.size = len(content)
+            tar_handle.addfile(info, io.BytesIO(content))
+
+    return path
+
+
+@pytest.mark.parametrize('pigz', [None, 'gzip'])
+def test_restore_exported_archive(archive, tmp_path, pigz):
+    """Test restoring selected files from an exported archive."""
+    destination = tmp_path / 'root'
+    with patch('shutil.which', return_value=pigz):
+        actions._restore_exported_archive(str(archive), LOCATIONS,
+                                          str(destination))
+
+    files = sorted(
+        str(path.relative_to(destination))
+        for path in destination.glob('**/*') if path.is_file())
+    assert files == ['etc/app1/config', 'var/lib/app1/data',
+                     'var/lib/app2/data']
+    assert (destination / 'etc/app1/config').read_text() == 'etc/app1/config'
+
+
+@pytest.mark.parametrize('pigz', [None, 'gzip'])
+def test_restore_exported_archive_hard_link(tmp_path, pigz):
+    """Test restoring a hard link without the file it links to."""
+    path = tmp_path / 'archive.tar.gz'
+    with tarfile.open(path, 'w:gz') as tar_handle:
+        info = tarfile.TarInfo('etc/x/a')
+        info.size = 4
+        tar_handle.addfile(info, io.BytesIO(b'data'))
+        info = tarfile.TarInfo('etc/x/b')
+        info.type = tarfile.LNKTYPE
+        info.linkname = 'etc/x/a'
+        tar_handle.addfile(info)
+        info = tarfile.TarInfo('etc/x/c')
+        info.type = tarfile.LNKTYPE
+        info.linkname = 'etc/x/b'
+        tar_handle.addfile(info)
+
+    destination = tmp_path / 'root'
+    locations = {'files': ['/etc/x/b', '/etc/x/c'], 'directories': []}
+    with patch('shutil.which', return_value=pigz):
+        actions._restore_exported_archive(str(path), locations,
+                                          str(destination))
+
+    assert not (destination / 'etc/x/a').exists()
+    assert (destination / 'etc/x/b').read_text() == 'data'
+    assert (destination / 'etc/x/c').read_text() == 'data'
+
+
+def test_restore_exported_archive_error(tmp_path):
+    """Test that errors while decompressing are reported."""
+    path = tmp_path / 'archive.tar.gz'
+    path.write_bytes(b'\x1f\x8b' + b'x' * 100)
+    with patch('shutil.which', return_value='gzip'), \
+            pytest.raises(Exception):
+        actions._restore_exported_archive(str(path), LOCATIONS,
+                                          str(tmp_path / 'root'))
+
+
+@pytest.mark.parametrize('available, compression, expected', [
+    (['pigz', 'gzip'], 'gzip', 'pigz'),
+    (['gzip'], 'gzip', 'gzip'),
+    (['zstd'], 'zstd', 'zstd --threads=0 --quiet'),
+    ([], 'none', None),
+])
+def test_get_tar_filter(available, compression, expected):
+    """Test choosing the program that compresses exported archives."""
+    with patch('shutil.which', lambda program: program in available):
+        assert actions._get_tar_filter(compression) == expected
+
+
+def test_get_tar_filter_missing():
+    """Test that a missing compression program is an error."""
+    with patch('shutil.which', return_value=None):
+        with pytest.raises(RuntimeError):
+            actions._get_tar_filter('zstd')
+
+
+@pytest.mark.parametrize('members, returncode, error, expected', [
+    (['var/lib/plinth/backups-manifests/test.json'], 0, b'', 'bind\ntor\n'),
+    ([], 1, b"Include pattern 'x' never matched.", ''),
+])
+def test_get_archive_apps(capsys, members, returncode, error, expected):
+    """Test reading apps of an archive from the exported manifest."""
+    data = io.BytesIO()
+    with tarfile.open(fileobj=data, mode='w') as tar_handle:
+        for name in members:
+            content = b'{"apps": [{"name": "bind"}, {"name": "tor"}]}'
+            info = tarfile.TarInfo(name)
+            info.size = len(content)
+            tar_handle.addfile(info, io.BytesIO(content))
+
+    if not members:
+        data = io.BytesIO()
+
+    arguments = Mock(path='/repository::archive', stdin='{}')
+    with patch('subprocess.Popen') as popen:
+        process = popen.return_value
+        process.stdout = io.BytesIO(data.getvalue())
+        process.returncode = returncode
+        process.communicate.return_value = (b'', error)
+        actions.subcommand_get_archive_apps(arguments)
+
+    assert popen.call_args[0][0] == [
+        'borg', 'export-tar', '/repository::archive', '-',
+        'var/lib/plinth/backups-manifests'
+    ]
+    assert capsys.readouterr().out == expected
+
+
+def test_get_archive_apps_failed():
+    """Test that borg errors are reported."""
+    arguments = Mock(path='/repository::archive', stdin='{}')
+    with patch('subprocess.Popen') as popen:
+        process = popen.return_value
+        process.stdout = io.BytesIO()
+        process.returncode = 2
+        process.communicate.return_value = (b'', b'Repository not found')
+        with pytest.raises(SystemExit):
+            actions.subcommand_get_archive_apps(arguments)
+
+
+@pytest.fixture(name='staging_folder')
+def fixture_staging_folder(tmp_path):
+    """Use a temporary staging folder."""
+    staging_folder = tmp_path / 'staging'
+    with patch.object(actions, 'STAGING_FOLDER', str(staging_folder) + '/'):
+        yield staging_folder
+
+
+def test_stage_paths(tmp_path, staging_folder):
+    """Test copying paths to a staging directory."""
+    source = tmp_path / 'source'
+    (source / 'directory').mkdir(parents=True)
+    (source / 'directory' / 'file').write_text('data')
+    (source / 'file').write_text('other data')
+    (source / 'file').chmod(0o600)
+    destination = staging_folder / 'archive'
+    arguments = Mock(destination=str(destination), paths=[
+        str(source / 'directory' / 'file'),
+    ])
+    actions.subcommand_stage_paths(arguments)
+    (source / 'directory' / 'file2').touch()
+    arguments = Mock(destination=str(destination), paths=[
+        str(source / 'directory') + '/',
+        str(source / 'file'),
+        str(source / 'missing'),
+    ])
+    actions.subcommand_stage_paths(arguments)
+
+    staged = destination / str(source).lstrip('/')
+    assert (staged / 'directory' / 'file').read_text() == 'data'
+    assert (staged / 'directory' / 'file2').exists()
+    assert not (staged / 'directory' / 'directory').exists()
+    assert (staged / 'file').stat().st_mode & 0o777 == 0o600
+    assert staging_folder.stat().st_mode & 0o777 == 0o700
+
+    paths = [str(source / 'file'), str(tmp_path / 'other'), '/missing']
+    (tmp_path / 'other').touch()
+    assert actions._split_staged_paths(paths, str(destination)) == [
+        str(source / 'file').lstrip('/'),
+        str(tmp_path / 'other')
+    ]
+
+
+@pytest.mark.parametrize('reflinks, free, can_stage', [
+    (True, 0, True),
+    (False, 1000 + 100, True),
+    (False, 1000 + 99, False),
+])
+def test_check_staging(capsys, tmp_path, staging_folder, reflinks, free,
+                       can_stage):
+    """Test checking for space to stage paths without reflinks."""
+    (tmp_path / 'directory').mkdir()
+    (tmp_path / 'directory' / 'file').write_bytes(b'x' * 600)
+    (tmp_path / 'file').write_bytes(b'x' * 400)
+    arguments = Mock(paths=[
+        str(tmp_path / 'directory'),
+        str(tmp_path / 'file'),
+        str(tmp_path / 'missing')
+    ])
+    stat = Mock(f_bavail=free, f_blocks=1000, f_frsize=1)
+    with patch('os.statvfs', return_value=stat), \
+            patch.object(actions, '_supports_reflinks',
+                         return_value=reflinks):
+        actions.subcommand_check_staging(arguments)
+
+    assert json.loads(capsys.readouterr().out) == {
+        'size': 1000,
+        'free': free,
+        'reflinks': reflinks,
+        'can_stage': can_stage
+    }
+
+
+@patch('subprocess.run')
+def test_supports_reflinks(run, tmp_path, staging_folder):
+    """Test checking whether copies can be reflinks."""
+    staging_folder.mkdir()
+    (tmp_path / 'file').touch()
+    run.return_value.returncode = 0
+    assert actions._supports_reflinks([str(tmp_path / 'file')])
+    assert run.call_args[0][0][:2] == ['cp', '--reflink=always']
+
+    run.return_value.returncode = 1
+    assert not actions._supports_reflinks([str(tmp_path / 'file')])
+    assert not list(staging_folder.iterdir())
+
+
+def test_stage_paths_invalid_destination(staging_folder):
+    """Test that only directories in the staging folder are used."""
+    for destination in [str(staging_folder / '..' / 'other'), '/etc']:
+        arguments = Mock(destination=destination, paths=['/etc/hostname'])
+        with pytest.raises(ValueError):
+            actions.subcommand_stage_paths(arguments)
+
+
+def test_create_archive_staged(tmp_path, staging_folder):
+    """Test archiving staged copies and removing them afterwards."""
+    staging_directory = staging_folder / 'archive'
+    (staging_directory / 'etc').mkdir(parents=True)
+    (staging_directory / 'etc' / 'staged').touch()
+    (tmp_path / 'live').touch()
+    arguments = Mock(path='/repository::archive', comment='', progress=False,
+                     staging_directory=str(staging_directory),
+                     paths=['/etc/staged', str(tmp_path / 'live')])
+    with patch.object(actions, '_run_interruptible') as run:
+        actions.subcommand_create_archive(arguments)
+
+    run.assert_called_once_with([
+        'borg', 'create', '--json', '/repository::archive', 'etc/staged',
+        str(tmp_path / 'live')
+    ], arguments, cwd=str(staging_directory))
+    assert not staging_directory.exists()
+
+
+def test_create_archive_progress(capsys, tmp_path):
+    """Test reporting the size of data to archive before borg progress."""
+    (tmp_path / 'directory').mkdir()
+    (tmp_path / 'directory' / 'file1').write_bytes(b'x' * 100)
+    (tmp_path / 'directory' / 'file2').write_bytes(b'x' * 50)
+    (tmp_path / 'file').write_bytes(b'x' * 10)
+    arguments = Mock(path='/repository::archive', comment='', progress=True,
+                     staging_directory=None,
+                     paths=[str(tmp_path / 'directory'),
+                            str(tmp_path / 'file')])
+    with patch.object(actions, '_run_interruptible') as run:
+        actions.subcommand_create_archive(arguments)
+
+    assert run.call_args[0][0][:5] == [
+        'borg', 'create', '--json', '--progress', '--log-json'
+    ]
+    message = json.loads(capsys.readouterr().err)
+    assert message == {'type': 'backup_size', 'size': 160, 'nfiles': 3}
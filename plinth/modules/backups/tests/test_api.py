@@ -3,6 +3,7 @@
 Tests for backups module API.
 """
 
+import json
 from unittest.mock import MagicMock, call, patch
 
 import pytest
@@ -93,6 +94,64 @@ class TestBackupProcesses:
                         path=repository.RootBorgRepository.PATH)
         backup_handler.assert_called_once()
 
+    @staticmethod
+    @patch('plinth.modules.backups.api._is_snapshot_available')
+    @patch('plinth.modules.backups.api._backup_apps_staged')
+    def test_backup_apps_cannot_stage(backup_apps_staged,
+                                      is_snapshot_available):
+        """Test that all apps are stopped if data can't be staged."""
+        is_snapshot_available.return_value = False
+        backup_handler = MagicMock()
+        stage_handler = MagicMock()
+        can_stage = MagicMock(return_value=False)
+        api.backup_apps(backup_handler,
+                        path=repository.RootBorgRepository.PATH,
+                        stage_handler=stage_handler, can_stage=can_stage)
+        can_stage.assert_called_once()
+        backup_apps_staged.assert_not_called()
+        assert not backup_handler.call_args[0][0].staging
+
+        can_stage.return_value = True
+        api.backup_apps(backup_handler,
+                        path=repository.RootBorgRepository.PATH,
+                        stage_handler=stage_handler, can_stage=can_stage)
+        backup_apps_staged.assert_called_once()
+
+    @staticmethod
+    @patch('plinth.modules.backups.api._restore_services')
+    @patch('plinth.modules.backups.api._shutdown_services')
+    def test_backup_apps_staged(shutdown_services, restore_services):
+        """Test that apps are stopped only while their data is staged."""
+        apps = [_get_test_app('a'), _get_test_app('b'), _get_test_app('c')]
+        components = [list(app_.components.values())[0] for app_ in apps]
+        components[2].services = []
+        packet = api.Packet('backup', 'apps', '/', components)
+        events = []
+
+        def shutdown(components):
+            app_id = components[0].app.app_id
+            events.append(('stop', app_id))
+            return app_id
+
+        def stage_handler(packet, component):
+            if component.app.app_id == 'b':
+                raise RuntimeError('No space left')
+
+            events.append(('stage', component.app.app_id))
+
+        def backup_handler(packet, encryption_passphrase):
+            events.append(('backup', packet.staging))
+
+        shutdown_services.side_effect = shutdown
+        restore_services.side_effect = lambda state: events.append(
+            ('start', state))
+        downtime = api._backup_apps_staged(backup_handler, stage_handler,
+                                           packet, None)
+        assert events == [('stop', 'a'), ('stage', 'a'), ('start', 'a'),
+                          ('stop', 'b'), ('backup', True), ('start', 'b')]
+        assert set(downtime) == {'a', 'b'}
+        assert not any(app_.locked for app_ in apps)
+
     @staticmethod
     @patch('plinth.modules.backups.api._install_apps_before_restore')
     @patch('plinth.module_loader.loaded_modules.items')
@@ -156,7 +215,7 @@ class TestBackupProcesses:
         assert not apps[1].locked
 
     @staticmethod
-    @patch('plinth.action_utils.webserver_is_enabled')
+    @patch('plinth.modules.apache.state.is_enabled')
     @patch('plinth.action_utils.service_is_running')
     @patch('plinth.actions.superuser_run')
     def test__shutdown_services(run, service_is_running, webserver_is_enabled):
@@ -183,13 +242,22 @@ class TestBackupProcesses:
             [call('b', kind='site'),
              call('a', kind='site')])
 
+        changes = [{
+            'operation': 'disable',
+            'name': 'b',
+            'kind': 'site'
+        }, {
+            'operation': 'disable',
+            'name': 'a',
+            'kind': 'site'
+        }]
         calls = [
-            call('apache', ['disable', '--name', 'b', '--kind', 'site']),
             call('service', ['stop', 'b']),
-            call('apache', ['disable', '--name', 'a', '--kind', 'site']),
-            call('service', ['stop', 'a'])
+            call('service', ['stop', 'a']),
+            call('apache', ['apply-changes'],
+                 input=json.dumps(changes).encode())
         ]
-        run.assert_has_calls(calls)
+        assert run.mock_calls == calls
 
     @staticmethod
     @patch('plinth.actions.superuser_run')
@@ -212,11 +280,17 @@ class TestBackupProcesses:
         original_state[2].was_enabled = True
         original_state[3].was_enabled = False
         api._restore_services(original_state)
+        changes = [{
+            'operation': 'enable',
+            'name': 'c-service',
+            'kind': 'site'
+        }]
         calls = [
             call('service', ['start', 'a-service']),
-            call('apache', ['enable', '--name', 'c-service', '--kind', 'site'])
+            call('apache', ['apply-changes'],
+                 input=json.dumps(changes).encode())
         ]
-        run.assert_has_calls(calls)
+        assert run.mock_calls == calls
 
     @staticmethod
     def test__run_operation():
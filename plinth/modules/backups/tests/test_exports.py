@@ -0,0 +1,167 @@
+# SPDX-License-Identifier: AGPL-3.0-or-later
+"""
+Tests for streaming and caching exported archives.
+"""
+
+import io
+import os
+from unittest.mock import Mock, patch
+
+import pytest
+
+from .. import exports
+
+
+@pytest.fixture(name='cache_dir', autouse=True)
+def fixture_cache_dir(tmp_path):
+    """Use a temporary cache directory."""
+    cache_dir = tmp_path / 'exports'
+    with patch.object(exports, 'CACHE_DIR', str(cache_dir)):
+        yield cache_dir
+
+
+def _stream(data, returncode=0):
+    """Return an export stream of some data from a fake process."""
+    process = Mock(stdout=io.BytesIO(data))
+    process.wait.return_value = returncode
+    return exports.ExportStream(process)
+
+
+@pytest.mark.parametrize('header, expected', [
+    (None, None),
+    ('bytes=0-99', (0, 100)),
+    ('bytes=100-', (100, 1000)),
+    ('bytes=990-2000', (990, 1000)),
+    ('bytes=-10', (990, 1000)),
+    ('bytes=-2000', (0, 1000)),
+    ('bytes=0-1,5-6', None),
+    ('bytes=10-5', None),
+    ('bytes=a-b', None),
+    ('items=0-1', None),
+])
+def test_get_range(header, expected):
+    """Test parsing Range headers."""
+    assert exports.get_range(header, 1000) == expected
+
+
+@pytest.mark.parametrize('header', ['bytes=1000-', 'bytes=-0'])
+def test_get_range_unsatisfiable(header):
+    """Test that ranges outside the file are errors."""
+    with pytest.raises(ValueError):
+        exports.get_range(header, 1000)
+
+
+def test_export_stream():
+    """Test reading an export in large chunks."""
+    data = os.urandom(exports.CHUNK_SIZE * 2 + 10)
+    chunks = list(_stream(data))
+    assert [len(chunk) for chunk in chunks] == [
+        exports.CHUNK_SIZE, exports.CHUNK_SIZE, 10
+    ]
+    assert b''.join(chunks) == data
+
+
+def test_cache_stream():
+    """Test that a completely sent export is cached."""
+    data = os.urandom(exports.CHUNK_SIZE + 10)
+    path = exports.get_path('uuid', 'archive', 'gzip')
+    assert b''.join(exports.cache_stream(_stream(data), path)) == data
+    with exports.open_cached(path) as file_handle:
+        assert file_handle.read() == data
+
+    assert oct(os.stat(path).st_mode & 0o777) == oct(0o600)
+    assert oct(os.stat(exports.CACHE_DIR).st_mode & 0o777) == oct(0o700)
+    assert exports.open_cached(exports.get_path('uuid', 'archive',
+                                                'none')) is None
+
+
+def test_cache_stream_interrupted(cache_dir):
+    """Test that an export is cached when the download is stopped."""
+    data = os.urandom(exports.CHUNK_SIZE * 3)
+    path = exports.get_path('uuid', 'archive', 'gzip')
+    with patch('threading.Thread') as thread:
+        stream = exports.cache_stream(_stream(data), path)
+        assert next(stream) == data[:exports.CHUNK_SIZE]
+        stream.close()
+
+    assert not os.path.exists(path)
+    thread.return_value.start.assert_called_once_with()
+    thread.call_args[1]['target'](*thread.call_args[1]['args'])
+    with exports.open_cached(path) as file_handle:
+        assert file_handle.read() == data
+
+    assert len(list(cache_dir.iterdir())) == 1
+
+    # The slot for completing an export in the background is released
+    assert exports._background_exports.acquire(blocking=False)
+    exports._background_exports.release()
+
+
+def test_cache_stream_interrupted_too_many(cache_dir):
+    """Test that an export is cancelled if too many are being completed."""
+    data = os.urandom(exports.CHUNK_SIZE * 3)
+    path = exports.get_path('uuid', 'archive', 'gzip')
+    export_stream = _stream(data)
+    with patch('threading.Thread') as thread, \
+            patch.object(exports, '_background_exports',
+                         exports.threading.BoundedSemaphore(1)) as semaphore:
+        semaphore.acquire()
+        stream = exports.cache_stream(export_stream, path)
+        next(stream)
+        stream.close()
+
+    thread.assert_not_called()
+    assert export_stream.closed
+    assert not list(cache_dir.iterdir())
+
+
+def test_cache_stream_failed(cache_dir):
+    """Test that a failed export is not cached."""
+    path = exports.get_path('uuid', 'archive', 'gzip')
+    assert b''.join(exports.cache_stream(_stream(b'data', 2), path)) == b'data'
+    assert not list(cache_dir.iterdir())
+
+
+def test_remove(cache_dir):
+    """Test removing cached exports of an archive and a repository."""
+    cache_dir.mkdir()
+    paths = [
+        exports.get_path('uuid1', 'archive1', 'gzip'),
+        exports.get_path('uuid1', 'archive1', 'none'),
+        exports.get_path('uuid1', 'archive2', 'gzip'),
+        exports.get_path('uuid2', 'archive1', 'gzip'),
+    ]
+    for path in paths:
+        open(path, 'w').close()
+
+    exports.remove('uuid1', 'archive1')
+    assert [os.path.exists(path) for path in paths] == [
+        False, False, True, True
+    ]
+    exports.remove('uuid1')
+    assert [os.path.exists(path) for path in paths] == [
+        False, False, False, True
+    ]
+
+
+def test_evict(cache_dir):
+    """Test evicting least recently used exports over the budget."""
+    cache_dir.mkdir()
+    paths = []
+    for index in range(4):
+        path = cache_dir / 'file{}'.format(index)
+        path.write_bytes(b'x' * 100)
+        os.utime(path, (index, index))
+        paths.append(path)
+
+    partial = cache_dir / '.partial-stale'
+    partial.touch()
+    os.utime(partial, (0, 0))
+    exports.open_cached(str(paths[0]))  # Mark as recently used
+
+    usage = Mock(free=600)
+    with patch('shutil.disk_usage', return_value=usage), \
+            patch.object(exports, 'CACHE_DISK_FRACTION', 0.25):
+        exports.evict()
+
+    assert sorted(cache_dir.iterdir()) == [paths[0], paths[3]]
@@ -0,0 +1,144 @@
+# SPDX-License-Identifier: AGPL-3.0-or-later
+"""
+Tests for backup operations and their progress.
+"""
+
+import io
+import json
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from plinth.errors import ActionError
+
+from .. import operations
+
+
+@pytest.fixture(autouse=True)
+def fixture_operations():
+    """Use an empty list of operations."""
+    with patch.object(operations, '_operations',
+                      operations.collections.OrderedDict()):
+        yield
+
+
+def _process(messages, returncode=0):
+    """Return a fake action process writing messages on stderr."""
+    process = MagicMock()
+    process.stderr = io.BytesIO(''.join(
+        (json.dumps(message) if isinstance(message, dict) else message) + '\n'
+        for message in messages).encode())
+    process.stdout = io.BytesIO(b'{}')
+    process.returncode = returncode
+    return process
+
+
+def _repository(process):
+    """Return a repository creating archives by running a fake process."""
+
+    def create_archive(archive_name, app_ids, archive_comment, operation):
+        operation.run_action(['create-archive'], b'')
+        return {'app': 1.5}
+
+    repository = MagicMock()
+    repository.create_archive.side_effect = create_archive
+    return repository
+
+
+def test_progress():
+    """Test computing progress from borg messages."""
+    progress = operations.Progress()
+    assert progress.percentage is None
+    assert progress.rate is None
+    assert progress.eta is None
+
+    progress.update({'type': 'backup_size', 'size': 1000, 'nfiles': 10})
+    with patch('time.monotonic', return_value=100):
+        progress.update({
+            'type': 'archive_progress',
+            'original_size': 100,
+            'nfiles': 1,
+            'path': 'etc/file'
+        })
+
+    with patch('time.monotonic', return_value=102):
+        progress.update({
+            'type': 'archive_progress',
+            'original_size': 300,
+            'deduplicated_size': 50,
+            'nfiles': 3,
+            'path': ''
+        })
+
+    assert progress.files == 3
+    assert progress.deduplicated_size == 50
+    assert progress.path == 'etc/file'
+    assert progress.percentage == 30
+    assert progress.rate == 100
+    assert progress.eta == 7
+
+    with patch('time.monotonic', return_value=200):
+        progress.update({'type': 'archive_progress', 'original_size': 400})
+
+    assert progress.rate is None
+
+    progress.update({'type': 'archive_progress', 'finished': True})
+    assert progress.finished
+
+
+@patch('plinth.actions.superuser_run')
+def test_run(superuser_run):
+    """Test that a successful operation reports progress and downtime."""
+    superuser_run.return_value = _process([
+        {'type': 'backup_size', 'size': 100, 'nfiles': 1},
+        {'type': 'archive_progress', 'original_size': 100, 'nfiles': 1},
+    ])
+    operation = operations.BackupOperation(
+        _repository(superuser_run.return_value), 'archive', ['app'])
+    operation.run()
+    assert operation.state == 'finished'
+    assert operation.downtime == {'app': 1.5}
+    assert operation.progress.percentage == 100
+    assert operations.get(operation.operation_id) == operation
+    assert not operations.get_running()
+
+    operations.remove(operation.operation_id)
+    assert not operations.get(operation.operation_id)
+
+
+@patch('plinth.actions.superuser_run')
+def test_run_failed(superuser_run):
+    """Test that errors of borg are collected."""
+    superuser_run.return_value = _process([
+        {'type': 'log_message', 'message': 'Repository is locked'},
+        'Traceback',
+    ], returncode=2)
+    operation = operations.BackupOperation(
+        _repository(superuser_run.return_value), 'archive', ['app'])
+    with pytest.raises(ActionError) as exception:
+        operation.run()
+
+    assert operation.state == 'failed'
+    assert exception.value.args[2] == 'Repository is locked\nTraceback\n'
+
+
+@patch('plinth.actions.superuser_run')
+def test_cancel(superuser_run):
+    """Test cancelling before and while the action runs."""
+    process = _process([], returncode=2)
+    superuser_run.return_value = process
+    operation = operations.BackupOperation(_repository(process), 'archive',
+                                           ['app'])
+    operation.cancel()
+    operation.run()
+    assert operation.state == 'cancelled'
+    superuser_run.assert_not_called()
+
+    operation = operations.BackupOperation(_repository(process), 'archive',
+                                           ['app'])
+    process.stderr = MagicMock()
+    process.stderr.__iter__.side_effect = lambda: (operation.cancel()
+                                                   or iter([]))
+    operation.run()
+    assert operation.state == 'cancelled'
+    process.terminate.assert_called_once_with()
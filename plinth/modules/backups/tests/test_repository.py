@@ -0,0 +1,70 @@
+# SPDX-License-Identifier: AGPL-3.0-or-later
+"""
+Tests for backup repositories without running borg.
+"""
+
+import json
+from unittest.mock import call, patch
+
+import pytest
+
+from .. import repository as repository_module
+from ..repository import BorgRepository
+
+ARCHIVES = {
+    'archives': [
+        {'name': 'archive1', 'id': 'id1', 'start': '2020-01-01T00:00:00'},
+        {'name': 'archive2', 'id': 'id2', 'start': '2020-01-02T00:00:00'},
+    ]
+}
+
+
+@pytest.fixture(name='repository')
+def fixture_repository():
+    """Return a repository with borg calls replaced."""
+    repository = BorgRepository('/tmp/repository', uuid='test-uuid')
+
+    def run(arguments):
+        if arguments[0] == 'list-repo':
+            return json.dumps(ARCHIVES)
+
+        if arguments[0] == 'get-archive-apps':
+            return 'bind\ntor\n'
+
+        return ''
+
+    with patch.object(repository_module, '_archive_apps', {}), \
+            patch.object(repository_module, '_archive_ids', {}), \
+            patch.object(repository_module.exports, 'remove'), \
+            patch.object(repository, 'run', side_effect=run):
+        yield repository
+
+
+def test_get_archive_apps_cached(repository):
+    """Test that apps of listed archives are read once."""
+    repository.list_archives()
+    assert repository.get_archive_apps('archive1') == ['bind', 'tor']
+    assert repository.get_archive_apps('archive1') == ['bind', 'tor']
+    assert repository.get_archive_apps('archive2') == ['bind', 'tor']
+    assert repository.run.call_args_list == [
+        call(['list-repo', '--path', '/tmp/repository']),
+        call(['get-archive-apps', '--path', '/tmp/repository::archive1']),
+        call(['get-archive-apps', '--path', '/tmp/repository::archive2']),
+    ]
+
+
+def test_get_archive_apps_not_listed(repository):
+    """Test that apps of archives with unknown IDs are not cached."""
+    repository.get_archive_apps('archive1')
+    repository.get_archive_apps('archive1')
+    assert repository.run.call_count == 2
+
+
+def test_get_archive_apps_deleted(repository):
+    """Test that apps are read again after an archive is deleted."""
+    repository.list_archives()
+    repository.get_archive_apps('archive1')
+    repository.delete_archive('archive1')
+    assert not repository_module._archive_apps
+    repository.get_archive_apps('archive1')
+    assert repository.run.call_count == 4
@@ -5,7 +5,7 @@ Test scheduling of backups.
 
 import json
 from datetime import datetime, timedelta
-from unittest.mock import MagicMock, call, patch
+from unittest.mock import ANY, MagicMock, call, patch
 
 import pytest
 
@@ -469,8 +469,10 @@ def test_run_schedule(get_instance, schedule_params, archives_data, test_now,
                 'type': 'scheduled',
                 'periods': run_periods
             }).replace('{', '{{').replace('}', '}}')
-            repository.create_archive.assert_has_calls(
-                [call(name, app_ids, archive_comment=archive_comment)])
+            repository.create_archive.assert_has_calls([
+                call(name, app_ids, archive_comment=archive_comment,
+                     operation=ANY)
+            ])
 
         if not cleanups:
             repository.delete_archive.assert_not_called()
@@ -0,0 +1,113 @@
+# SPDX-License-Identifier: AGPL-3.0-or-later
+"""
+Tests for receiving uploaded backup archives.
+"""
+
+import io
+import json
+import os
+import tarfile
+
+import pytest
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test.client import RequestFactory
+
+from .. import upload
+
+MANIFEST = {'apps': [{'name': 'bind'}, {'name': 'tor'}]}
+
+
+def _archive(mode='w:gz', tar_format=tarfile.PAX_FORMAT,
+             manifest_name='var/lib/plinth/backups-manifests/test.json',
+             manifest=MANIFEST):
+    """Return the bytes of an archive with some files and a manifest."""
+    data = io.BytesIO()
+    with tarfile.open(fileobj=data, mode=mode, format=tar_format) as tar:
+        for index, size in enumerate([0, 100, 512, 70000]):
+            info = tarfile.TarInfo('etc/file{}'.format(index))
+            info.size = size
+            tar.addfile(info, io.BytesIO(os.urandom(size)))
+
+        info = tarfile.TarInfo('var/lib/plinth/backups-manifests')
+        info.type = tarfile.DIRTYPE
+        tar.addfile(info)
+        if manifest_name:
+            content = json.dumps(manifest).encode()
+            info = tarfile.TarInfo(manifest_name)
+            info.size = len(content)
+            tar.addfile(info, io.BytesIO(content))
+
+        info = tarfile.TarInfo('var/lib/other')
+        info.size = 10
+        tar.addfile(info, io.BytesIO(b'0123456789'))
+
+    return data.getvalue()
+
+
+def _scan(data, chunk_size):
+    """Feed data to a new scanner in chunks and return it."""
+    scanner = upload.ManifestScanner()
+    for start in range(0, len(data), chunk_size):
+        scanner.feed(data[start:start + chunk_size])
+
+    return scanner
+
+
+@pytest.mark.parametrize('chunk_size', [1, 511, 4096, 65536])
+@pytest.mark.parametrize('mode', ['w:gz', 'w'])
+def test_scan(mode, chunk_size):
+    """Test finding the manifest in compressed and plain archives."""
+    if chunk_size == 1 and mode == 'w':
+        pytest.skip('Slow and same as other chunk sizes')
+
+    scanner = _scan(_archive(mode), chunk_size)
+    assert scanner.done
+    assert scanner.get_apps() == ['bind', 'tor']
+
+
+@pytest.mark.parametrize('tar_format',
+                         [tarfile.PAX_FORMAT, tarfile.GNU_FORMAT])
+def test_scan_long_name(tar_format):
+    """Test finding a manifest with a long name."""
+    name = 'var/lib/plinth/backups-manifests/' + 'x' * 200 + '.json'
+    scanner = _scan(_archive(tar_format=tar_format, manifest_name=name), 4096)
+    assert scanner.get_apps() == ['bind', 'tor']
+
+
+def test_scan_old_manifest():
+    """Test reading manifest in list format of plinth <= 0.42."""
+    scanner = _scan(_archive(manifest=MANIFEST['apps']), 4096)
+    assert scanner.get_apps() == ['bind', 'tor']
+
+
+@pytest.mark.parametrize('data', [
+    _archive(manifest_name=None),
+    _archive(manifest={'invalid': []}),
+    _archive()[:1000],
+    b'\x1f\x8b' + b'x' * 10000,
+    b'x' * 10000,
+])
+def test_scan_without_manifest(data):
+    """Test that apps are not found in archives without a valid manifest."""
+    assert _scan(data, 4096).get_apps() is None
+
+
+def test_upload_handler(tmp_path):
+    """Test that uploads are written to disk and scanned."""
+    data = _archive()
+    request = RequestFactory().post(
+        '/', {'backups-file': SimpleUploadedFile('test.tar.gz', data)})
+    request.upload_handlers = [upload.ArchiveUploadHandler(request)]
+    uploaded_file = request.FILES['backups-file']
+    uploaded_file.close()
+    path = uploaded_file.temporary_file_path()
+    try:
+        assert uploaded_file.name == 'test.tar.gz'
+        assert uploaded_file.size == len(data)
+        assert uploaded_file.apps == ['bind', 'tor']
+        with open(path, 'rb') as file_handle:
+            assert file_handle.read() == data
+    finally:
+        uploaded_file.delete()
+
+    assert not os.path.exists(path)
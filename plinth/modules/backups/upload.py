@@ -0,0 +1,266 @@
+# SPDX-License-Identifier: AGPL-3.0-or-later
+"""
+Receive uploaded backup archives.
+
+Uploaded archives are written straight to the file from which they are later
+restored. While the data arrives, the archive is decompressed and its tar
+headers are read to capture the manifest of apps. This avoids copying the file
+after the upload and reading the whole archive again to list its apps.
+"""
+
+import json
+import logging
+import os
+import tarfile
+import tempfile
+import zlib
+
+from django.core.files.uploadedfile import UploadedFile
+from django.core.files.uploadhandler import FileUploadHandler
+
+logger = logging.getLogger(__name__)
+
+MANIFESTS_PATH = 'var/lib/plinth/backups-manifests/'
+
+# Maximum number of bytes decompressed at a time
+_MAX_OUTPUT = 1024 * 1024
+
+# Largest manifest or extended header that is read into memory
+_MAX_MEMBER_SIZE = 16 * 1024 * 1024
+
+_GZIP_MAGIC = b'\x1f\x8b'
+
+
+def get_apps_of_manifest(manifest):
+    """Return the names of apps in a manifest.
+
+    Supports both dict format as well as list format of plinth <=0.42
+
+    """
+    if isinstance(manifest, list):
+        apps = manifest
+    elif isinstance(manifest, dict) and 'apps' in manifest:
+        apps = manifest['apps']
+    else:
+        raise ValueError('Unknown manifest format')
+
+    return [app['name'] for app in apps]
+
+
+class ManifestScanner:
+    """Find the manifest of a .tar.gz or .tar archive fed in pieces.
+
+    Only the tar headers are parsed and the data of other members is skipped
+    as soon as it is decompressed. Scanning stops when the manifest is found
+    or the data can't be understood.
+    """
+
+    def __init__(self):
+        """Initialize the scanner."""
+        self.manifest = None
+        self.done = False
+        self._decompressor = None
+        self._compressed = None
+        self._head = bytearray()
+        self._buffer = bytearray()
+        self._skip = 0
+        self._member = None
+        self._long_name = None
+
+    def feed(self, data):
+        """Scan the next piece of the archive."""
+        if self.done:
+            return
+
+        if self._compressed is None:
+            self._head += data
+            if len(self._head) < len(_GZIP_MAGIC):
+                return
+
+            data = bytes(self._head)
+            self._head.clear()
+            self._compressed = data.startswith(_GZIP_MAGIC)
+            if self._compressed:
+                self._decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+
+        if not self._compressed:
+            self._process(data)
+            return
+
+        try:
+            output = self._decompressor.decompress(data, _MAX_OUTPUT)
+            self._process(output)
+            while self._decompressor.unconsumed_tail and not self.done:
+                output = self._decompressor.decompress(
+                    self._decompressor.unconsumed_tail, _MAX_OUTPUT)
+                self._process(output)
+        except zlib.error as exception:
+            logger.warning('Unable to decompress uploaded archive: %s',
+                           exception)
+            self.done = True
+
+    def get_apps(self):
+        """Return names of apps in the manifest or None if not found."""
+        if self.manifest is None:
+            return None
+
+        try:
+            return get_apps_of_manifest(json.loads(self.manifest))
+        except (ValueError, KeyError, TypeError) as exception:
+            logger.warning('Invalid manifest in uploaded archive: %s',
+                           exception)
+            return None
+
+    def _process(self, data):
+        """Parse tar headers and member data from decompressed data."""
+        if self._skip >= len(data) and not self._buffer:
+            self._skip -= len(data)
+            return
+
+        self._buffer += data
+        while not self.done:
+            if self._skip:
+                skipped = min(self._skip, len(self._buffer))
+                del self._buffer[:skipped]
+                self._skip -= skipped
+                if self._skip:
+                    return
+
+            if self._member:
+                kind, size = self._member
+                padded_size = _padded(size)
+                if len(self._buffer) < padded_size:
+                    return
+
+                content = bytes(self._buffer[:size])
+                del self._buffer[:padded_size]
+                self._member = None
+                self._handle_member(kind, content)
+                continue
+
+            if len(self._buffer) < tarfile.BLOCKSIZE:
+                return
+
+            header = bytes(self._buffer[:tarfile.BLOCKSIZE])
+            del self._buffer[:tarfile.BLOCKSIZE]
+            self._handle_header(header)
+
+    def _handle_header(self, header):
+        """Decide what to do with the data of a member from its header."""
+        if header == tarfile.NUL * tarfile.BLOCKSIZE:
+            self.done = True  # End of archive
+            return
+
+        try:
+            info = tarfile.TarInfo.frombuf(header, 'utf-8', 'surrogateescape')
+        except tarfile.HeaderError:
+            logger.warning('Unable to read uploaded archive')
+            self.done = True
+            return
+
+        name = self._long_name or info.name
+        self._long_name = None
+        if info.type in (tarfile.GNUTYPE_LONGNAME, tarfile.XHDTYPE):
+            kind = info.type
+        elif info.isreg() and MANIFESTS_PATH in name and \
+                name.endswith('.json'):
+            kind = 'manifest'
+        else:
+            self._skip = _padded(info.size)
+            return
+
+        if info.size > _MAX_MEMBER_SIZE:
+            self.done = True
+            return
+
+        self._member = (kind, info.size)
+
+    def _handle_member(self, kind, content):
+        """Process the data of a member that was read completely."""
+        if kind == 'manifest':
+            self.manifest = content
+            self.done = True
+        elif kind == tarfile.GNUTYPE_LONGNAME:
+            self._long_name = content.rstrip(tarfile.NUL).decode(
+                'utf-8', 'surrogateescape')
+        else:
+            self._long_name = _get_pax_path(content)
+
+
+def _padded(size):
+    """Return size rounded up to a multiple of tar block size."""
+    blocks, remainder = divmod(size, tarfile.BLOCKSIZE)
+    return (blocks + bool(remainder)) * tarfile.BLOCKSIZE
+
+
+def _get_pax_path(content):
+    """Return the path from pax extended header records, if any."""
+    path = None
+    while content:
+        length, _, rest = content.partition(b' ')
+        try:
+            length = int(length)
+        except ValueError:
+            break
+
+        if length <= 0:
+            break
+
+        record = rest[:length - len(b'%d ' % length) - 1]
+        keyword, _, value = record.partition(b'=')
+        if keyword == b'path':
+            path = value.decode('utf-8', 'surrogateescape')
+
+        content = content[length:]
+
+    return path
+
+
+class UploadedArchive(UploadedFile):
+    """An uploaded archive kept on disk after the request."""
+
+    def __init__(self, file, name, content_type, size, charset, apps):
+        """Initialize with names of apps in the manifest, if found."""
+        super().__init__(file, name, content_type, size, charset)
+        self.apps = apps
+
+    def temporary_file_path(self):
+        """Return the full path of the file."""
+        return self.file.name
+
+    def delete(self):
+        """Remove the file from disk."""
+        self.close()
+        try:
+            os.remove(self.file.name)
+        except FileNotFoundError:
+            pass
+
+
+class ArchiveUploadHandler(FileUploadHandler):
+    """Write uploaded archives to disk and scan them for a manifest."""
+
+    def new_file(self, *args, **kwargs):
+        """Start writing a new file."""
+        super().new_file(*args, **kwargs)
+        self.file = tempfile.NamedTemporaryFile(delete=False)
+        self.scanner = ManifestScanner()
+
+    def receive_data_chunk(self, raw_data, start):
+        """Write a piece of the file and scan it."""
+        self.file.write(raw_data)
+        self.scanner.feed(raw_data)
+
+    def file_complete(self, file_size):
+        """Return the uploaded file after all of it was received."""
+        self.file.flush()
+        self.file.seek(0)
+        return UploadedArchive(self.file, self.file_name, self.content_type,
+                               file_size, self.charset,
+                               self.scanner.get_apps())
+
+    def upload_interrupted(self):
+        """Remove a partially received file."""
+        if hasattr(self, 'file'):
+            self.file.close()
+            os.remove(self.file.name)
@@ -6,8 +6,9 @@ URLs for the backups module.
 from django.conf.urls import url
 
 from .views import (AddRemoteRepositoryView, AddRepositoryView,
-                    CreateArchiveView, DeleteArchiveView, DownloadArchiveView,
-                    IndexView, RemoveRepositoryView, RestoreArchiveView,
+                    CancelOperationView, CreateArchiveView, DeleteArchiveView,
+                    DownloadArchiveView, IndexView, OperationView,
+                    RemoveRepositoryView, RestoreArchiveView,
                     RestoreFromUploadView, ScheduleView, UploadArchiveView,
                     VerifySshHostkeyView, mount_repository, umount_repository)
 
@@ -16,6 +17,10 @@ urlpatterns = [
     url(r'^sys/backups/(?P<uuid>[^/]+)/schedule/$', ScheduleView.as_view(),
         name='schedule'),
     url(r'^sys/backups/create/$', CreateArchiveView.as_view(), name='create'),
+    url(r'^sys/backups/operations/(?P<operation_id>[0-9a-f]+)/$',
+        OperationView.as_view(), name='operation'),
+    url(r'^sys/backups/operations/(?P<operation_id>[0-9a-f]+)/cancel/$',
+        CancelOperationView.as_view(), name='operation-cancel'),
     url(r'^sys/backups/(?P<uuid>[^/]+)/download/(?P<name>[^/]+)/$',
         DownloadArchiveView.as_view(), name='download'),
     url(r'^sys/backups/(?P<uuid>[^/]+)/delete/(?P<name>[^/]+)/$',
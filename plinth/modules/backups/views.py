@@ -5,26 +5,28 @@ Views for the backups app.
 
 import logging
 import os
-import tempfile
-from datetime import datetime
+from datetime import datetime, timedelta
 from urllib.parse import unquote
 
 import paramiko
 from django.contrib import messages
 from django.contrib.messages.views import SuccessMessageMixin
-from django.http import Http404, StreamingHttpResponse
+from django.http import Http404, HttpResponse, StreamingHttpResponse
 from django.shortcuts import redirect
 from django.urls import reverse, reverse_lazy
 from django.utils.decorators import method_decorator
 from django.utils.translation import ugettext as _
 from django.utils.translation import ugettext_lazy
+from django.views.decorators.csrf import csrf_exempt, csrf_protect
 from django.views.generic import FormView, TemplateView, View
 
+from plinth.app import App
 from plinth.errors import PlinthError
 from plinth.modules import backups, storage
 
-from . import (SESSION_PATH_VARIABLE, api, forms, get_known_hosts_path,
-               is_ssh_hostkey_verified)
+from . import (SESSION_APPS_VARIABLE, SESSION_PATH_VARIABLE, api, exports,
+               forms, get_known_hosts_path, is_ssh_hostkey_verified,
+               operations, upload)
 from .decorators import delete_tmp_backup_file
 from .repository import (BorgRepository, SshBorgRepository, get_instance,
                          get_repositories)
@@ -44,6 +46,8 @@ class IndexView(TemplateView):
         context['repositories'] = [
             repository.get_view_content() for repository in get_repositories()
         ]
+        context['download_formats'] = exports.get_compressions()
+        context['operations'] = operations.get_running()
         return context
 
 
@@ -97,13 +101,11 @@ class ScheduleView(SuccessMessageMixin, FormView):
         return super().form_valid(form)
 
 
-class CreateArchiveView(SuccessMessageMixin, FormView):
+class CreateArchiveView(FormView):
     """View to create a new archive."""
     form_class = forms.CreateArchiveForm
     prefix = 'backups'
     template_name = 'backups_form.html'
-    success_url = reverse_lazy('backups:index')
-    success_message = ugettext_lazy('Archive created.')
 
     def get_context_data(self, **kwargs):
         """Return additional context for rendering the template."""
@@ -112,7 +114,7 @@ class CreateArchiveView(SuccessMessageMixin, FormView):
         return context
 
     def form_valid(self, form):
-        """Create the archive on valid form submission."""
+        """Start creating the archive on valid form submission."""
         repository = get_instance(form.cleaned_data['repository'])
         if repository.flags.get('mountable'):
             repository.mount()
@@ -120,8 +122,77 @@ class CreateArchiveView(SuccessMessageMixin, FormView):
         name = form.cleaned_data['name'] or datetime.now().strftime(
             '%Y-%m-%d:%H:%M')
         selected_apps = form.cleaned_data['selected_apps']
-        repository.create_archive(name, selected_apps)
-        return super().form_valid(form)
+        operation = operations.BackupOperation(repository, name,
+                                               selected_apps)
+        operation.start()
+        return redirect(
+            reverse('backups:operation', args=[operation.operation_id]))
+
+
+class OperationView(TemplateView):
+    """View to show the progress of a backup and its result when done."""
+    template_name = 'backups_operation.html'
+
+    def get(self, request, operation_id):
+        """Show progress or redirect with the result once finished."""
+        operation = operations.get(operation_id)
+        if not operation:
+            raise Http404
+
+        if operation.is_running:
+            return super().get(request, operation=operation)
+
+        _show_operation_result(request, operation)
+        operations.remove(operation_id)
+        return redirect('backups:index')
+
+    def get_context_data(self, **kwargs):
+        """Return additional context for rendering the template."""
+        context = super().get_context_data(**kwargs)
+        context['title'] = _('Creating Backup')
+        context['refresh_page_sec'] = 3
+        eta = kwargs['operation'].progress.eta
+        if eta is not None:
+            context['remaining'] = str(timedelta(seconds=int(eta)))
+
+        return context
+
+
+def _show_operation_result(request, operation):
+    """Show a message with the result of a finished backup operation."""
+    if operation.state == 'cancelled':
+        messages.info(request, operation.get_status_message())
+        return
+
+    if operation.state == 'failed':
+        messages.error(
+            request,
+            _('Creating backup {name} failed: {error}').format(
+                name=operation.archive_name, error=operation.exception))
+        return
+
+    messages.success(request, operation.get_status_message())
+    if operation.downtime:
+        apps = ', '.join(
+            _('{app} ({seconds:.1f} s)').format(
+                app=App.get(app_id).info.name, seconds=seconds)
+            for app_id, seconds in operation.downtime.items())
+        messages.info(request,
+                      _('Apps stopped during backup: {apps}').format(
+                          apps=apps))
+
+
+class CancelOperationView(View):
+    """View to cancel a running backup."""
+
+    def post(self, request, operation_id):
+        """Cancel the operation and go back to its progress."""
+        operation = operations.get(operation_id)
+        if not operation:
+            raise Http404
+
+        operation.cancel()
+        return redirect(reverse('backups:operation', args=[operation_id]))
 
 
 class DeleteArchiveView(SuccessMessageMixin, TemplateView):
@@ -147,6 +218,7 @@ class DeleteArchiveView(SuccessMessageMixin, TemplateView):
         return redirect('backups:index')
 
 
+@method_decorator(csrf_exempt, name='dispatch')
 class UploadArchiveView(SuccessMessageMixin, FormView):
     form_class = forms.UploadForm
     prefix = 'backups'
@@ -166,9 +238,8 @@ class UploadArchiveView(SuccessMessageMixin, FormView):
         else:
             # The maximum file size that can be uploaded and restored is at
             # most half of the available disk space:
-            # - Django stores uploaded files that do not fit into memory to
-            #   disk (/tmp/). These are only copied by form_valid() after
-            #   the upload is finished.
+            # - Uploaded files are written to disk (/tmp/) as they are
+            #   received.
             # - For restoring it's highly advisable to have at least as much
             #   free disk space as the file size.
             context['max_filesize'] = storage.format_bytes(
@@ -176,14 +247,41 @@ class UploadArchiveView(SuccessMessageMixin, FormView):
 
         return context
 
+    def dispatch(self, request, *args, **kwargs):
+        """Stream the uploaded file to disk, then check CSRF token.
+
+        Upload handlers can't be changed after the CSRF middleware has read the
+        request body, so the check is done here instead.
+        """
+        request.upload_handlers = [upload.ArchiveUploadHandler(request)]
+        response = csrf_protect(super().dispatch)(request, *args, **kwargs)
+        if request.method == 'POST' and response.status_code == 403:
+            for uploaded_file in request.FILES.values():
+                uploaded_file.delete()
+
+        return response
+
     def form_valid(self, form):
-        """store uploaded file."""
-        with tempfile.NamedTemporaryFile(delete=False) as tmp_file:
-            self.request.session[SESSION_PATH_VARIABLE] = tmp_file.name
-            for chunk in self.request.FILES['backups-file'].chunks():
-                tmp_file.write(chunk)
+        """Keep the uploaded file for restoring."""
+        uploaded_file = self.request.FILES['backups-file']
+        uploaded_file.close()
+        self.request.session[SESSION_PATH_VARIABLE] = \
+            uploaded_file.temporary_file_path()
+        if uploaded_file.apps is not None:
+            self.request.session[SESSION_APPS_VARIABLE] = uploaded_file.apps
+        else:
+            self.request.session.pop(SESSION_APPS_VARIABLE, None)
+
         return super().form_valid(form)
 
+    def form_invalid(self, form):
+        """Remove the uploaded file."""
+        uploaded_file = self.request.FILES.get('backups-file')
+        if uploaded_file:
+            uploaded_file.delete()
+
+        return super().form_invalid(form)
+
 
 class BaseRestoreView(SuccessMessageMixin, FormView):
     """View to restore files from an archive."""
@@ -232,6 +330,10 @@ class RestoreFromUploadView(BaseRestoreView):
 
     def _get_included_apps(self):
         """Save some data used to instantiate the form."""
+        apps = self.request.session.get(SESSION_APPS_VARIABLE)
+        if apps is not None:
+            return apps
+
         path = self.request.session.get(SESSION_PATH_VARIABLE)
         return backups.get_exported_archive_apps(path)
 
@@ -262,16 +364,65 @@ class RestoreArchiveView(BaseRestoreView):
 
 
 class DownloadArchiveView(View):
-    """View to export and download an archive as stream."""
+    """View to export and download an archive as stream.
+
+    The compression is chosen with the 'compression' query parameter. With
+    'resumable=1', the export of an archive from an unencrypted repository is
+    kept on disk so that an interrupted download can be resumed with a Range
+    request.
+    """
 
     def get(self, request, uuid, name):
+        compression = request.GET.get('compression',
+                                      exports.DEFAULT_COMPRESSION)
+        if compression not in dict(exports.get_compressions()):
+            raise Http404
+
         repository = get_instance(uuid)
-        filename = f'{name}.tar.gz'
+        path = exports.get_path(uuid, name, compression)
+        file_handle = exports.open_cached(path)
+        if file_handle:
+            response = self._get_cached_response(request, file_handle)
+        else:
+            stream = repository.get_download_stream(name, compression)
+            if request.GET.get('resumable') == '1' and \
+               not repository.is_encrypted:
+                stream = exports.cache_stream(stream, path)
 
-        response = StreamingHttpResponse(repository.get_download_stream(name),
-                                         content_type='application/gzip')
+            response = StreamingHttpResponse(stream)
+
+        response['Content-Type'] = exports.get_content_type(compression)
         response['Content-Disposition'] = 'attachment; filename="%s"' % \
-            filename
+            exports.get_filename(name, compression)
+        return response
+
+    @staticmethod
+    def _get_cached_response(request, file_handle):
+        """Return a response with all or a range of a cached export."""
+        size = os.fstat(file_handle.fileno()).st_size
+        etag = exports.get_etag(file_handle)
+        byte_range = None
+        if request.META.get('HTTP_IF_RANGE', etag) == etag:
+            try:
+                byte_range = exports.get_range(request.META.get('HTTP_RANGE'),
+                                               size)
+            except ValueError:
+                file_handle.close()
+                response = HttpResponse(status=416)
+                response['Content-Range'] = 'bytes */%d' % size
+                return response
+
+        start, end = byte_range or (0, size)
+        response = StreamingHttpResponse(
+            exports.read_file(file_handle, start, end))
+        if byte_range:
+            response.status_code = 206
+            response['Content-Range'] = 'bytes %d-%d/%d' % (start, end - 1,
+                                                            size)
+
+        response['Content-Length'] = end - start
+        response['Accept-Ranges'] = 'bytes'
+        response['ETag'] = etag
         return response
 
 
@@ -4,17 +4,17 @@ FreedomBox app for system diagnostics.
 """
 
 import collections
+import concurrent.futures
 import importlib
 import logging
-import pathlib
 import threading
 
-import psutil
 from django.utils.translation import ugettext_lazy as _
 from django.utils.translation import ugettext_noop
 
 from plinth import app as app_module
-from plinth import cfg, daemon, glib, menu
+from plinth import daemon, menu, metrics
+from plinth.modules.apache import probe
 from plinth.modules.apache.components import diagnose_url_on_all
 from plinth.modules.backups.components import BackupRestore
 
@@ -38,6 +38,12 @@ running_task = None
 
 current_results = {}
 
+# Number of apps whose diagnostics are run at the same time
+_MAX_PARALLEL_APPS = 8
+
+# Severity and percentage of the low memory notification last written
+_low_ram_space_state = {}
+
 
 class DiagnosticsApp(app_module.App):
     """FreedomBox app for diagnostics."""
@@ -62,9 +68,8 @@ class DiagnosticsApp(app_module.App):
                                        **manifest.backup)
         self.add(backup_restore)
 
-        # Check periodically for low RAM space
-        interval = 180 if cfg.develop else 3600
-        glib.schedule(interval, _warn_about_low_ram_space)
+        # Check for low memory with each sample of memory usage
+        metrics.add_handler(_warn_about_low_ram_space)
 
     def diagnose(self):
         """Run diagnostics and return the results."""
@@ -121,105 +126,85 @@ def run_on_all_enabled_modules():
         current_results['results'][app.app_id] = {'name': app_name}
 
     current_results['apps'] = apps
-    for current_index, (app_id, app) in enumerate(apps):
-        app_results = {
-            'diagnosis': None,
-            'exception': None,
-        }
 
-        try:
-            app_results['diagnosis'] = app.diagnose()
-        except Exception as exception:
-            logger.exception('Error running %s diagnostics - %s', app_id,
-                             exception)
-            app_results['exception'] = str(exception)
+    # Enumerate addresses afresh once for the run
+    probe.get_prober().reset()
 
-        current_results['results'][app_id].update(app_results)
-        current_results['progress_percentage'] = \
-            int((current_index + 1) * 100 / len(apps))
+    with concurrent.futures.ThreadPoolExecutor(
+            max_workers=_MAX_PARALLEL_APPS) as executor:
+        futures = {
+            executor.submit(_run_on_app, app_id, app): app_id
+            for app_id, app in apps
+        }
+        for current_index, future in enumerate(
+                concurrent.futures.as_completed(futures)):
+            current_results['results'][futures[future]].update(future.result())
+            current_results['progress_percentage'] = \
+                int((current_index + 1) * 100 / len(apps))
 
     global running_task
     running_task = None
 
 
-def _get_memory_info_from_cgroups():
-    """Return information about RAM usage from cgroups."""
-    cgroups_memory_path = pathlib.Path('/sys/fs/cgroup/memory')
-    memory_limit_file = cgroups_memory_path / 'memory.limit_in_bytes'
-    memory_usage_file = cgroups_memory_path / 'memory.usage_in_bytes'
-    memory_stat_file = cgroups_memory_path / 'memory.stat'
-
-    try:
-        memory_total = int(memory_limit_file.read_text())
-        memory_usage = int(memory_usage_file.read_text())
-        memory_stat_lines = memory_stat_file.read_text().split('\n')
-    except OSError:
-        return {}
-
-    memory_inactive = int([
-        line.rsplit(maxsplit=1)[1] for line in memory_stat_lines
-        if line.startswith('total_inactive_file')
-    ][0])
-    memory_used = memory_usage - memory_inactive
-
-    return {
-        'total_bytes': memory_total,
-        'percent_used': memory_used * 100 / memory_total,
-        'free_bytes': memory_total - memory_used
+def _run_on_app(app_id, app):
+    """Run diagnostics on an app and return the results."""
+    app_results = {
+        'diagnosis': None,
+        'exception': None,
     }
 
+    try:
+        app_results['diagnosis'] = app.diagnose()
+    except Exception as exception:
+        logger.exception('Error running %s diagnostics - %s', app_id,
+                         exception)
+        app_results['exception'] = str(exception)
 
-def _get_memory_info():
-    """Return RAM usage information."""
-    memory_info = psutil.virtual_memory()
-
-    cgroups_memory_info = _get_memory_info_from_cgroups()
-    if cgroups_memory_info and cgroups_memory_info[
-            'total_bytes'] < memory_info.total:
-        return cgroups_memory_info
+    return app_results
 
-    return {
-        'total_bytes': memory_info.total,
-        'percent_used': memory_info.percent,
-        'free_bytes': memory_info.available
-    }
 
+def _warn_about_low_ram_space(sample):
+    """Warn about insufficient RAM space.
 
-def _warn_about_low_ram_space(request):
-    """Warn about insufficient RAM space."""
+    The notification is only written when its severity or the rounded
+    percentage of memory used changes.
+    """
     from plinth.notification import Notification
 
-    memory_info = _get_memory_info()
-    if memory_info['free_bytes'] < 1024**3:
-        # Translators: This is the unit of computer storage Mebibyte similar to
-        # Megabyte.
-        memory_available_unit = ugettext_noop('MiB')
-        memory_available = memory_info['free_bytes'] / 1024**2
-    else:
-        # Translators: This is the unit of computer storage Gibibyte similar to
-        # Gigabyte.
-        memory_available_unit = ugettext_noop('GiB')
-        memory_available = memory_info['free_bytes'] / 1024**3
-
-    show = False
-    if memory_info['percent_used'] > 90:
+    percent_used = round(sample.memory_percent_used)
+    severity = None
+    if sample.memory_percent_used > 90:
         severity = 'error'
         advice_message = ugettext_noop(
             'You should disable some apps to reduce memory usage.')
-        show = True
-    elif memory_info['percent_used'] > 75:
+    elif sample.memory_percent_used > 75:
         severity = 'warning'
         advice_message = ugettext_noop(
             'You should not install any new apps on this system.')
-        show = True
 
-    if not show:
+    state = (severity, percent_used) if severity else None
+    if _low_ram_space_state.get('last', False) == state:
+        return
+
+    _low_ram_space_state['last'] = state
+    if not severity:
         try:
             Notification.get('diagnostics-low-ram-space').delete()
         except KeyError:
             pass
         return
 
+    if sample.memory_free < 1024**3:
+        # Translators: This is the unit of computer storage Mebibyte similar to
+        # Megabyte.
+        memory_available_unit = ugettext_noop('MiB')
+        memory_available = sample.memory_free / 1024**2
+    else:
+        # Translators: This is the unit of computer storage Gibibyte similar to
+        # Gigabyte.
+        memory_available_unit = ugettext_noop('GiB')
+        memory_available = sample.memory_free / 1024**3
+
     message = ugettext_noop(
         # xgettext:no-python-format
         'System is low on memory: {percent_used}% used, {memory_available} '
@@ -228,7 +213,7 @@ def _warn_about_low_ram_space(request):
     data = {
         'app_icon': 'fa-heartbeat',
         'app_name': 'translate:' + ugettext_noop('Diagnostics'),
-        'percent_used': f'{memory_info["percent_used"]:.1f}',
+        'percent_used': f'{sample.memory_percent_used:.1f}',
         'memory_available': f'{memory_available:.1f}',
         'memory_available_unit': 'translate:' + memory_available_unit,
         'advice_message': 'translate:' + advice_message
@@ -9,6 +9,8 @@ from . import views
 
 urlpatterns = [
     url(r'^sys/diagnostics/$', views.index, name='index'),
+    url(r'^sys/diagnostics/metrics/$', views.metrics_history,
+        name='metrics'),
     url(r'^sys/diagnostics/(?P<app_id>[1-9a-z\-]+)/$', views.diagnose_app,
         name='app'),
 ]
@@ -3,13 +3,15 @@
 FreedomBox app for running diagnostics.
 """
 
+import json
 import logging
 
-from django.http import Http404
+from django.http import Http404, HttpResponse, HttpResponseBadRequest
 from django.template.response import TemplateResponse
 from django.utils.translation import ugettext_lazy as _
 from django.views.decorators.http import require_POST
 
+from plinth import metrics
 from plinth.app import App
 from plinth.modules import diagnostics
 
@@ -56,3 +58,23 @@ def diagnose_app(request, app_id):
             'results': diagnosis,
             'exception': diagnosis_exception,
         })
+
+
+def metrics_history(request):
+    """Return recent usage of disk space and memory as JSON for charts.
+
+    Samples are lists of values in the order of the fields. Only samples taken
+    after the time in the 'since' parameter, if given, are returned.
+    """
+    since = request.GET.get('since')
+    try:
+        since = float(since) if since else None
+    except ValueError:
+        return HttpResponseBadRequest('Invalid time')
+
+    response = {
+        'interval': metrics.INTERVAL,
+        'fields': metrics.Sample._fields,
+        'samples': [list(sample) for sample in metrics.get_history(since)],
+    }
+    return HttpResponse(json.dumps(response), content_type='application/json')
@@ -5,6 +5,7 @@ FreedomBox app to configure a firewall.
 
 import contextlib
 import logging
+import threading
 
 from django.utils.translation import ugettext_lazy as _
 
@@ -15,7 +16,7 @@ from plinth.daemon import Daemon
 from plinth.modules.backups.components import BackupRestore
 from plinth.utils import Version, format_lazy, import_from_gi
 
-from . import manifest
+from . import manifest, state
 
 gio = import_from_gi('Gio', '2.0')
 glib = import_from_gi('GLib', '2.0')
@@ -36,7 +37,9 @@ _description = [
           'security threat from the Internet.'), box_name=cfg.box_name)
 ]
 
-_port_details = {}
+# D-Bus proxies for firewalld objects, (object, interface) -> proxy
+_proxies = {}
+_proxies_lock = threading.Lock()
 
 app = None
 
@@ -79,16 +82,15 @@ class FirewallApp(app_module.App):
                                        **manifest.backup)
         self.add(backup_restore)
 
+        state.start_monitoring()
+
 
 def _run_setup():
     """Run firewalld setup."""
     _run(['setup'], superuser=True)
-    add_service('http', 'external')
-    add_service('http', 'internal')
-    add_service('https', 'external')
-    add_service('https', 'internal')
-    add_service('dns', 'internal')
-    add_service('dhcp', 'internal')
+    apply_service_changes(add=[('http', 'external'), ('http', 'internal'),
+                               ('https', 'external'), ('https', 'internal'),
+                               ('dns', 'internal'), ('dhcp', 'internal')])
 
 
 def setup(helper, old_version=None):
@@ -114,10 +116,21 @@ def force_upgrade(helper, packages):
 
 
 def _get_dbus_proxy(object, interface):
-    """Return a DBusProxy for a given firewalld object and interface."""
-    connection = gio.bus_get_sync(gio.BusType.SYSTEM)
-    return gio.DBusProxy.new_sync(connection, gio.DBusProxyFlags.NONE, None,
-                                  _DBUS_NAME, object, interface)
+    """Return a DBusProxy for a given firewalld object and interface.
+
+    Proxies are created once and reused. They follow firewalld across
+    restarts as they are bound to the well-known bus name.
+    """
+    with _proxies_lock:
+        proxy = _proxies.get((object, interface))
+        if not proxy:
+            connection = gio.bus_get_sync(gio.BusType.SYSTEM)
+            proxy = gio.DBusProxy.new_sync(
+                connection, gio.DBusProxyFlags.DO_NOT_LOAD_PROPERTIES, None,
+                _DBUS_NAME, object, interface)
+            _proxies[(object, interface)] = proxy
+
+        return proxy
 
 
 @contextlib.contextmanager
@@ -157,6 +170,8 @@ def reload():
         proxy = _get_dbus_proxy(_FIREWALLD_OBJECT, _FIREWALLD_INTERFACE)
         proxy.reload()
 
+    state.invalidate()
+
 
 def try_with_reload(operation):
     """Try an operation and retry after firewalld reload.
@@ -181,18 +196,13 @@ def try_with_reload(operation):
 
 def get_enabled_status():
     """Return whether firewall is enabled"""
-    output = _run(['get-status'], superuser=True)
-    if not output:
-        return False
-    else:
-        return output.split()[0] == 'running'
+    return state.is_running()
 
 
 def get_enabled_services(zone):
     """Return the status of various services currently enabled"""
     with ignore_dbus_error(dbus_error='ServiceUnknown'):
-        zone_proxy = _get_dbus_proxy(_FIREWALLD_OBJECT, _ZONE_INTERFACE)
-        return zone_proxy.getServices('(s)', zone)
+        return state.get_zone(zone)['services']
 
     return []  # When firewalld is not running
 
@@ -200,54 +210,68 @@ def get_enabled_services(zone):
 def get_port_details(service_port):
     """Return the port types and numbers for a service port"""
     try:
-        return _port_details[service_port]
-    except KeyError:
-        config = _get_dbus_proxy(_CONFIG_OBJECT, _CONFIG_INTERFACE)
-        try:
-            service_path = config.getServiceByName('(s)', service_port)
-        except glib.Error:
-            return []  # Don't cache the error result
-
-        service = _get_dbus_proxy(service_path, _CONFIG_SERVICE_INTERFACE)
-        _port_details[service_port] = service.getPorts()
-        return _port_details[service_port]
+        return state.get_service_ports(service_port)
+    except glib.Error:
+        return []  # Not cached, service may be installed later
 
 
 def get_interfaces(zone):
     """Return the list of interfaces in a zone."""
     with ignore_dbus_error(dbus_error='ServiceUnknown'):
-        zone_proxy = _get_dbus_proxy(_FIREWALLD_OBJECT, _ZONE_INTERFACE)
-        return zone_proxy.getInterfaces('(s)', zone)
+        return state.get_zone(zone)['interfaces']
 
     return []  # When firewalld is not running
 
 
-def add_service(port, zone):
-    """Enable a service in firewall"""
+def apply_service_changes(add=(), remove=()):
+    """Enable and disable services in firewall zones in one batch.
+
+    add and remove are lists of (service, zone) tuples. The runtime services of
+    each affected zone are read once and only the services that need a change
+    are added or removed. The permanent configuration of each zone is then
+    written with a single call.
+
+    """
+    add = list(add)
+    remove = list(remove)
+    zones = {zone for _, zone in add + remove}
+    if not zones:
+        return
+
     with ignore_dbus_error(dbus_error='ServiceUnknown'):
         zone_proxy = _get_dbus_proxy(_FIREWALLD_OBJECT, _ZONE_INTERFACE)
-        with ignore_dbus_error(service_error='ALREADY_ENABLED'):
-            zone_proxy.addService('(ssi)', zone, port, 0)
-
         config = _get_dbus_proxy(_CONFIG_OBJECT, _CONFIG_INTERFACE)
-        zone_path = config.getZoneByName('(s)', zone)
-        config_zone = _get_dbus_proxy(zone_path, _CONFIG_ZONE_INTERFACE)
-        with ignore_dbus_error(service_error='ALREADY_ENABLED'):
-            config_zone.addService('(s)', port)
+        for zone in sorted(zones):
+            added = {port for port, zone_ in add if zone_ == zone}
+            removed = {port for port, zone_ in remove if zone_ == zone}
+
+            services = set(zone_proxy.getServices('(s)', zone))
+            for port in sorted(added - services):
+                with ignore_dbus_error(service_error='ALREADY_ENABLED'):
+                    zone_proxy.addService('(ssi)', zone, port, 0)
+
+            for port in sorted(removed & services):
+                with ignore_dbus_error(service_error='NOT_ENABLED'):
+                    zone_proxy.removeService('(ss)', zone, port)
+
+            zone_path = config.getZoneByName('(s)', zone)
+            config_zone = _get_dbus_proxy(zone_path, _CONFIG_ZONE_INTERFACE)
+            services = set(config_zone.getServices())
+            new_services = (services | added) - removed
+            if new_services != services:
+                config_zone.setServices('(as)', sorted(new_services))
+
+    state.invalidate(zones_only=True)
+
+
+def add_service(port, zone):
+    """Enable a service in firewall"""
+    apply_service_changes(add=[(port, zone)])
 
 
 def remove_service(port, zone):
     """Remove a service in firewall"""
-    with ignore_dbus_error(dbus_error='ServiceUnknown'):
-        zone_proxy = _get_dbus_proxy(_FIREWALLD_OBJECT, _ZONE_INTERFACE)
-        with ignore_dbus_error(service_error='NOT_ENABLED'):
-            zone_proxy.removeService('(ss)', zone, port)
-
-        config = _get_dbus_proxy(_CONFIG_OBJECT, _CONFIG_INTERFACE)
-        zone_path = config.getZoneByName('(s)', zone)
-        config_zone = _get_dbus_proxy(zone_path, _CONFIG_ZONE_INTERFACE)
-        with ignore_dbus_error(service_error='NOT_ENABLED'):
-            config_zone.removeService('(s)', port)
+    apply_service_changes(remove=[(port, zone)])
 
 
 def _run(arguments, superuser=False):
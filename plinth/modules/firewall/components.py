@@ -3,6 +3,7 @@
 App component for other apps to use firewall functionality.
 """
 
+import collections
 import logging
 import re
 
@@ -20,6 +21,9 @@ class Firewall(app.FollowerComponent):
 
     _all_firewall_components = {}
 
+    # Enabled components using each port in each zone, (port, zone) -> IDs
+    _port_users = collections.defaultdict(set)
+
     def __init__(self, component_id, name=None, ports=None, is_external=False):
         """Initialize the firewall component."""
         super().__init__(component_id)
@@ -32,6 +36,8 @@ class Firewall(app.FollowerComponent):
         self.is_external = is_external
 
         self._all_firewall_components[component_id] = self
+        for users in self._port_users.values():
+            users.discard(component_id)
 
     @property
     def ports_details(self):
@@ -45,60 +51,57 @@ class Firewall(app.FollowerComponent):
 
         return ports_details
 
+    @property
+    def zones(self):
+        """Return the zones in which the ports of this component are open."""
+        return ['internal', 'external'] if self.is_external else ['internal']
+
     @classmethod
     def list(cls):
         """Return a list of all firewall ports."""
         return cls._all_firewall_components.values()
 
+    def set_enabled(self, enabled):
+        """Update the internal enabled state of the component."""
+        super().set_enabled(enabled)
+        self._update_port_users()
+
+    def _update_port_users(self):
+        """Update the index of enabled components using each port."""
+        for port in self.ports:
+            for zone in ('internal', 'external'):
+                users = self._port_users[(port, zone)]
+                if self._is_enabled and zone in self.zones:
+                    users.add(self.component_id)
+                else:
+                    users.discard(self.component_id)
+
     def enable(self):
         """Open firewall ports when the component is enabled."""
         super().enable()
+        self._update_port_users()
         firewall.try_with_reload(self._enable)
 
     def _enable(self):
         """Open firewall ports."""
-        internal_enabled_ports = firewall.get_enabled_services(zone='internal')
-        external_enabled_ports = firewall.get_enabled_services(zone='external')
-
         logger.info('Firewall ports opened - %s, %s', self.name, self.ports)
-        for port in self.ports:
-            if port not in internal_enabled_ports:
-                firewall.add_service(port, zone='internal')
-
-            if (self.is_external and port not in external_enabled_ports):
-                firewall.add_service(port, zone='external')
+        firewall.apply_service_changes(
+            add=[(port, zone) for port in self.ports for zone in self.zones])
 
     def disable(self):
         """Close firewall ports when the component is disabled."""
         super().disable()
+        self._update_port_users()
         firewall.try_with_reload(self._disable)
 
     def _disable(self):
-        """Close firewall ports."""
-        internal_enabled_ports = firewall.get_enabled_services(zone='internal')
-        external_enabled_ports = firewall.get_enabled_services(zone='external')
-
+        """Close firewall ports not used by any other enabled component."""
         logger.info('Firewall ports closed - %s, %s', self.name, self.ports)
-        for port in self.ports:
-            if port in internal_enabled_ports:
-                enabled_components_on_port = [
-                    component.is_enabled()
-                    for component in self._all_firewall_components.values()
-                    if port in component.ports
-                    and self.component_id != component.component_id
-                ]
-                if not any(enabled_components_on_port):
-                    firewall.remove_service(port, zone='internal')
-
-            if port in external_enabled_ports:
-                enabled_components_on_port = [
-                    component.is_enabled()
-                    for component in self._all_firewall_components.values()
-                    if port in component.ports and self.component_id !=
-                    component.component_id and component.is_external
-                ]
-                if not any(enabled_components_on_port):
-                    firewall.remove_service(port, zone='external')
+        firewall.apply_service_changes(remove=[
+            (port, zone) for port in self.ports
+            for zone in ('internal', 'external')
+            if not self._port_users[(port, zone)]
+        ])
 
     @staticmethod
     def get_internal_interfaces():
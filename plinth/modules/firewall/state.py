@@ -0,0 +1,160 @@
+# SPDX-License-Identifier: AGPL-3.0-or-later
+"""
+Keep a snapshot of the firewalld runtime state in memory.
+
+Whether firewalld is running, the services and interfaces of zones and the
+ports of services are read over D-Bus when first needed. Once monitoring has
+started, they are kept until firewalld announces a change with a D-Bus signal,
+is reloaded or is restarted. Without monitoring, the state is read on every
+call.
+"""
+
+import logging
+import threading
+
+from plinth.modules import firewall
+from plinth.utils import import_from_gi
+
+gio = import_from_gi('Gio', '2.0')
+glib = import_from_gi('GLib', '2.0')
+
+# Indexes of services and interfaces in the result of getZoneSettings()
+_ZONE_SERVICES = 5
+_ZONE_INTERFACES = 10
+
+_lock = threading.Lock()
+_cache = {'running': None, 'zones': {}, 'services': {}, 'generation': 0}
+_monitoring = {}
+
+logger = logging.getLogger(__name__)
+
+
+def is_running():
+    """Return whether firewalld is running."""
+    with _lock:
+        if _cache['running']:
+            return True
+
+        generation = _cache['generation']
+
+    proxy = firewall._get_dbus_proxy(firewall._FIREWALLD_OBJECT,
+                                     firewall._FIREWALLD_INTERFACE)
+    try:
+        result = proxy.call_sync(
+            'org.freedesktop.DBus.Properties.Get',
+            glib.Variant('(ss)', (firewall._FIREWALLD_INTERFACE, 'state')),
+            gio.DBusCallFlags.NONE, -1, None)
+    except glib.Error:
+        return False  # Not running, don't cache
+
+    running = result.unpack()[0] == 'RUNNING'
+    if running:
+        _store(generation, 'running', running)
+
+    return running
+
+
+def get_zone(zone):
+    """Return the services and interfaces of a zone as a dictionary.
+
+    Raise glib.Error when firewalld is not running.
+    """
+    with _lock:
+        settings = _cache['zones'].get(zone)
+        generation = _cache['generation']
+
+    if settings is None:
+        proxy = firewall._get_dbus_proxy(firewall._FIREWALLD_OBJECT,
+                                         firewall._FIREWALLD_INTERFACE)
+        result = proxy.getZoneSettings('(s)', zone)
+        settings = {
+            'services': list(result[_ZONE_SERVICES]),
+            'interfaces': list(result[_ZONE_INTERFACES])
+        }
+        _store(generation, 'zones', settings, zone)
+
+    return settings
+
+
+def get_service_ports(service):
+    """Return the list of (port, protocol) of a service.
+
+    Raise glib.Error when the service is unknown or firewalld is not running.
+    """
+    with _lock:
+        ports = _cache['services'].get(service)
+        generation = _cache['generation']
+
+    if ports is None:
+        config = firewall._get_dbus_proxy(firewall._CONFIG_OBJECT,
+                                          firewall._CONFIG_INTERFACE)
+        service_path = config.getServiceByName('(s)', service)
+        service_proxy = firewall._get_dbus_proxy(
+            service_path, firewall._CONFIG_SERVICE_INTERFACE)
+        ports = service_proxy.getPorts()
+        _store(generation, 'services', ports, service)
+
+    return ports
+
+
+def _store(generation, key, value, name=None):
+    """Keep a value read from firewalld while monitoring.
+
+    The value is not kept if a change was announced since generation.
+    """
+    with _lock:
+        if not _monitoring or generation != _cache['generation']:
+            return
+
+        if name is None:
+            _cache[key] = value
+        else:
+            _cache[key][name] = value
+
+
+def invalidate(zones_only=False):
+    """Forget the cached state of zones or all of the cached state."""
+    with _lock:
+        _cache['generation'] += 1
+        _cache['zones'].clear()
+        if not zones_only:
+            _cache['running'] = None
+            _cache['services'].clear()
+
+
+def _on_signal(_connection, _sender, object_path, _interface, signal,
+               _parameters, _user_data):
+    """Invalidate the cache when firewalld announces a change."""
+    if signal == 'Reloaded' or \
+       object_path.startswith(firewall._CONFIG_OBJECT):
+        invalidate()
+    else:
+        invalidate(zones_only=True)
+
+
+def _on_name_changed(_connection, _name, *_args):
+    """Invalidate the cache when firewalld is started or stopped."""
+    invalidate()
+
+
+def start_monitoring():
+    """Subscribe to signals from firewalld announcing changes.
+
+    Signals are delivered by the GLib main loop.
+    """
+    if _monitoring:
+        return
+
+    try:
+        connection = gio.bus_get_sync(gio.BusType.SYSTEM)
+    except glib.Error as exception:
+        logger.warning('Unable to monitor firewalld: %s', exception)
+        return
+
+    _monitoring['signals'] = connection.signal_subscribe(
+        firewall._DBUS_NAME, None, None, None, None,
+        gio.DBusSignalFlags.NONE, _on_signal, None)
+    _monitoring['name'] = gio.bus_watch_name_on_connection(
+        connection, firewall._DBUS_NAME, gio.BusNameWatcherFlags.NONE,
+        _on_name_changed, _on_name_changed)
+    invalidate()
@@ -3,7 +3,7 @@
 Tests for firewall app component.
 """
 
-from unittest.mock import call, patch
+from unittest.mock import patch
 
 import pytest
 
@@ -14,6 +14,7 @@ from plinth.modules.firewall.components import Firewall
 def fixture_empty_firewall_list():
     """Remove all entries in firewall list before starting a test."""
     Firewall._all_firewall_components = {}
+    Firewall._port_users.clear()
 
 
 def test_init_without_arguments():
@@ -61,69 +62,66 @@ def test_port_details(get_port_details):
     }]
 
 
-@patch('plinth.modules.firewall.add_service')
-@patch('plinth.modules.firewall.get_enabled_services')
-def test_enable(get_enabled_services, add_service):
+@patch('plinth.modules.firewall.apply_service_changes')
+def test_enable(apply_service_changes):
     """Test enabling a firewall component."""
-    def get_enabled_services_side_effect(zone):
-        return {'internal': ['test-port1'], 'external': ['test-port2']}[zone]
-
-    get_enabled_services.side_effect = get_enabled_services_side_effect
     # Internal
     firewall = Firewall('test-firewall-1', ports=['test-port1', 'test-port2'],
                         is_external=False)
     firewall.enable()
-    calls = [call('test-port2', zone='internal')]
-    add_service.assert_has_calls(calls)
+    apply_service_changes.assert_called_once_with(
+        add=[('test-port1', 'internal'), ('test-port2', 'internal')])
 
     # External
-    add_service.reset_mock()
+    apply_service_changes.reset_mock()
     firewall = Firewall('test-firewall-2', ports=['test-port1', 'test-port2'],
                         is_external=True)
     firewall.enable()
-    calls = [
-        call('test-port1', zone='external'),
-        call('test-port2', zone='internal')
-    ]
-    add_service.assert_has_calls(calls)
+    apply_service_changes.assert_called_once_with(add=[
+        ('test-port1', 'internal'), ('test-port1', 'external'),
+        ('test-port2', 'internal'), ('test-port2', 'external')
+    ])
 
 
-@patch('plinth.modules.firewall.remove_service')
-@patch('plinth.modules.firewall.add_service')
-@patch('plinth.modules.firewall.get_enabled_services')
-def test_disable(get_enabled_services, add_service, remove_service):
+@patch('plinth.modules.firewall.apply_service_changes')
+def test_disable(apply_service_changes):
     """Test disabling a firewall component."""
     Firewall('firewall-1', ports=['test-port1'], is_external=False)
     Firewall('firewall-2', ports=['test-port2'], is_external=False).enable()
     Firewall('firewall-3', ports=['test-port4'], is_external=True)
-    Firewall('firewall-4', ports=['test-port5'], is_external=True).enable()
+    Firewall('firewall-4', ports=['test-port5'],
+             is_external=True).set_enabled(True)
 
-    def get_enabled_services_side_effect(zone):
-        return {
-            'internal': ['test-port1', 'test-port2'],
-            'external': ['test-port4', 'test-port5']
-        }[zone]
-
-    get_enabled_services.side_effect = get_enabled_services_side_effect
     all_ports = [
         'test-port1', 'test-port2', 'test-port3', 'test-port4', 'test-port5',
         'test-port6'
     ]
     # Internal
+    apply_service_changes.reset_mock()
     firewall = Firewall('test-firewall-1', ports=all_ports, is_external=False)
     firewall.disable()
-    calls = [call('test-port1', zone='internal')]
-    remove_service.assert_has_calls(calls)
-
-    # External
-    remove_service.reset_mock()
-    firewall = Firewall('test-firewall-2', ports=all_ports, is_external=True)
+    apply_service_changes.assert_called_once_with(remove=[
+        ('test-port1', 'internal'), ('test-port1', 'external'),
+        ('test-port2', 'external'), ('test-port3', 'internal'),
+        ('test-port3', 'external'), ('test-port4', 'internal'),
+        ('test-port4', 'external'), ('test-port6', 'internal'),
+        ('test-port6', 'external')
+    ])
+
+    # External, other component using the same ports is enabled
+    apply_service_changes.reset_mock()
+    Firewall('test-firewall-2', ports=['test-port6'],
+             is_external=True).set_enabled(True)
+    firewall = Firewall('test-firewall-3', ports=['test-port5', 'test-port6'],
+                        is_external=True)
+    firewall.enable()
     firewall.disable()
-    calls = [
-        call('test-port1', zone='internal'),
-        call('test-port4', zone='external')
-    ]
-    remove_service.assert_has_calls(calls)
+    apply_service_changes.assert_called_with(remove=[])
+
+    # Disabling the last user of a port closes it
+    Firewall._all_firewall_components['firewall-4'].disable()
+    apply_service_changes.assert_called_with(
+        remove=[('test-port5', 'internal'), ('test-port5', 'external')])
 
 
 @patch('plinth.modules.firewall.get_port_details')
@@ -0,0 +1,87 @@
+# SPDX-License-Identifier: AGPL-3.0-or-later
+"""
+Tests for firewall operations over D-Bus.
+"""
+
+from unittest.mock import MagicMock, call, patch
+
+import pytest
+
+from plinth.modules import firewall
+
+
+@pytest.fixture(name='proxies')
+def fixture_proxies():
+    """Return fake D-Bus proxies for firewalld objects."""
+    runtime_services = {
+        'internal': ['ssh', 'http'],
+        'external': ['http'],
+    }
+    config_services = {
+        'internal': ['ssh', 'http'],
+        'external': ['http'],
+    }
+    zone_proxy = MagicMock()
+    zone_proxy.getServices.side_effect = \
+        lambda signature, zone: runtime_services[zone]
+
+    config = MagicMock()
+    config.getZoneByName.side_effect = \
+        lambda signature, zone: '/config/zone/' + zone
+
+    config_zones = {}
+    for zone, services in config_services.items():
+        config_zones['/config/zone/' + zone] = MagicMock()
+        config_zones['/config/zone/' + zone].getServices.return_value = \
+            services
+
+    def get_dbus_proxy(object_, interface):
+        if interface == firewall._ZONE_INTERFACE:
+            return zone_proxy
+
+        if interface == firewall._CONFIG_INTERFACE:
+            return config
+
+        return config_zones[object_]
+
+    with patch('plinth.modules.firewall._get_dbus_proxy',
+               side_effect=get_dbus_proxy):
+        yield zone_proxy, config, config_zones
+
+
+def test_apply_service_changes(proxies):
+    """Test adding and removing services in one batch."""
+    zone_proxy, config, config_zones = proxies
+    firewall.apply_service_changes(
+        add=[('http', 'internal'), ('https', 'internal'),
+             ('https', 'external')],
+        remove=[('ssh', 'internal'), ('dns', 'internal')])
+
+    assert zone_proxy.getServices.call_count == 2
+    zone_proxy.addService.assert_has_calls([
+        call('(ssi)', 'external', 'https', 0),
+        call('(ssi)', 'internal', 'https', 0)
+    ])
+    assert zone_proxy.addService.call_count == 2
+    zone_proxy.removeService.assert_called_once_with('(ss)', 'internal',
+                                                     'ssh')
+
+    config_zones['/config/zone/internal'].setServices.assert_called_once_with(
+        '(as)', ['http', 'https'])
+    config_zones['/config/zone/external'].setServices.assert_called_once_with(
+        '(as)', ['http', 'https'])
+
+
+def test_apply_service_changes_unchanged(proxies):
+    """Test that nothing is written when services are already as needed."""
+    zone_proxy, config, config_zones = proxies
+    firewall.add_service('http', 'external')
+    firewall.remove_service('dns', 'internal')
+
+    zone_proxy.addService.assert_not_called()
+    zone_proxy.removeService.assert_not_called()
+    for config_zone in config_zones.values():
+        config_zone.setServices.assert_not_called()
+
+    firewall.apply_service_changes()
+    assert zone_proxy.getServices.call_count == 2
@@ -0,0 +1,119 @@
+# SPDX-License-Identifier: AGPL-3.0-or-later
+"""
+Tests for the snapshot of firewalld state.
+"""
+
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from plinth.modules import firewall
+from plinth.modules.firewall import state
+
+
+def _zone_settings(services, interfaces):
+    """Return zone settings as returned by firewalld."""
+    settings = [''] * 16
+    settings[5] = services
+    settings[10] = interfaces
+    return tuple(settings)
+
+
+@pytest.fixture(name='proxy')
+def fixture_proxy():
+    """Return a fake D-Bus proxy for firewalld and reset the state."""
+    proxy = MagicMock()
+    proxy.call_sync.return_value.unpack.return_value = ('RUNNING', )
+    proxy.getZoneSettings.side_effect = lambda signature, zone: {
+        'internal': _zone_settings(['http', 'ssh'], ['eth0']),
+        'external': _zone_settings(['http'], ['eth1']),
+    }[zone]
+    proxy.getServiceByName.return_value = '/config/service/1'
+    proxy.getPorts.return_value = [('80', 'tcp')]
+    cache = {
+        'running': None,
+        'zones': {},
+        'services': {},
+        'generation': 0
+    }
+    with patch('plinth.modules.firewall._get_dbus_proxy',
+               return_value=proxy), \
+            patch.object(state, '_cache', cache), \
+            patch.object(state, '_monitoring', {}):
+        yield proxy
+
+
+def test_without_monitoring(proxy):
+    """Test that state is read on every call without monitoring."""
+    assert firewall.get_enabled_status()
+    assert firewall.get_enabled_services('internal') == ['http', 'ssh']
+    assert firewall.get_enabled_services('external') == ['http']
+    assert firewall.get_interfaces('internal') == ['eth0']
+    assert firewall.get_enabled_services('internal') == ['http', 'ssh']
+    assert proxy.getZoneSettings.call_count == 4
+    assert firewall.get_enabled_status()
+    assert proxy.call_sync.call_count == 2
+
+    proxy.call_sync.return_value.unpack.return_value = ('FAILED', )
+    assert not firewall.get_enabled_status()
+    proxy.call_sync.side_effect = firewall.glib.Error('Not running')
+    assert not firewall.get_enabled_status()
+
+
+def test_monitoring(proxy):
+    """Test that state is kept until firewalld signals a change."""
+    state._monitoring['signals'] = 1
+    for _ in range(2):
+        assert firewall.get_enabled_status()
+        assert firewall.get_enabled_services('internal') == ['http', 'ssh']
+        assert firewall.get_interfaces('internal') == ['eth0']
+        assert firewall.get_enabled_services('external') == ['http']
+
+    proxy.call_sync.assert_called_once()
+    assert proxy.getZoneSettings.call_count == 2
+
+    state._on_signal(None, None, firewall._FIREWALLD_OBJECT,
+                     firewall._ZONE_INTERFACE, 'ServiceAdded', None, None)
+    assert firewall.get_enabled_status()
+    assert firewall.get_enabled_services('internal') == ['http', 'ssh']
+    proxy.call_sync.assert_called_once()
+    assert proxy.getZoneSettings.call_count == 3
+
+    state._on_signal(None, None, firewall._FIREWALLD_OBJECT,
+                     firewall._FIREWALLD_INTERFACE, 'Reloaded', None, None)
+    assert firewall.get_enabled_status()
+    assert proxy.call_sync.call_count == 2
+
+
+def test_port_details(proxy):
+    """Test that ports of services are cached until changed."""
+    assert firewall.get_port_details('http') == [('80', 'tcp')]
+    assert firewall.get_port_details('http') == [('80', 'tcp')]
+    assert proxy.getServiceByName.call_count == 2
+
+    proxy.getServiceByName.reset_mock()
+    state._monitoring['signals'] = 1
+    assert firewall.get_port_details('http') == [('80', 'tcp')]
+    assert firewall.get_port_details('http') == [('80', 'tcp')]
+    proxy.getServiceByName.assert_called_once_with('(s)', 'http')
+
+    proxy.getServiceByName.side_effect = firewall.glib.Error('Unknown')
+    assert firewall.get_port_details('unknown') == []
+
+    state._on_signal(None, None, firewall._CONFIG_OBJECT + '/service/1',
+                     firewall._CONFIG_SERVICE_INTERFACE, 'Updated', None,
+                     None)
+    assert firewall.get_port_details('http') == []
+
+
+def test_cache_changed_while_reading(proxy):
+    """Test that state is not kept if a change is announced meanwhile."""
+    state._monitoring['signals'] = 1
+
+    def _get_zone_settings(_signature, _zone):
+        state.invalidate(zones_only=True)
+        return _zone_settings(['http'], ['eth0'])
+
+    proxy.getZoneSettings.side_effect = _get_zone_settings
+    assert firewall.get_enabled_services('internal') == ['http']
+    assert not state._cache['zones']
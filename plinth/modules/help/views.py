@@ -3,6 +3,8 @@
 Help app for FreedomBox.
 """
 
+import datetime
+import json
 import mimetypes
 import os
 import pathlib
@@ -115,7 +117,33 @@ def download_manual(request):
 
 
 def status_log(request):
-    """Serve the last 100 lines of plinth's status log"""
-    output = actions.superuser_run('help', ['get-logs'])
-    context = {'num_lines': 100, 'data': output}
+    """Serve plinth's status log 100 lines at a time, latest lines first."""
+    num_lines = 100
+    arguments = ['get-logs', '--lines', str(num_lines)]
+    before = request.GET.get('before')
+    if before:
+        arguments.append('--before-cursor=' + before)
+
+    filter_ = request.GET.get('filter')
+    if filter_:
+        arguments.append('--filter=' + filter_)
+
+    entries = json.loads(actions.superuser_run('help', arguments))
+    lines = []
+    for entry in entries:
+        timestamp = datetime.datetime.fromisoformat(entry['timestamp'])
+        lines.append('{timestamp} {identifier}[{pid}]: {message}'.format(
+            timestamp=timestamp.strftime('%b %d %H:%M:%S'), **entry))
+
+    older_cursor = None
+    if len(entries) == num_lines:
+        older_cursor = entries[0]['cursor']
+
+    context = {
+        'num_lines': num_lines,
+        'data': '\n'.join(lines),
+        'filter': filter_,
+        'older_cursor': older_cursor,
+        'is_latest': not before,
+    }
     return TemplateResponse(request, 'statuslog.html', context)
@@ -9,7 +9,7 @@ from logging import Logger
 from django.utils.text import format_lazy
 from django.utils.translation import ugettext_lazy as _
 
-from plinth import actions
+from plinth import actions, addresses
 from plinth import app as app_module
 from plinth import daemon, kvstore, menu, network
 
@@ -126,35 +126,25 @@ def set_router_configuration_type(router_configuration_type):
 def _get_shared_interfaces():
     """Get active network interfaces in shared mode."""
     shared_interfaces = []
-    for connection in network.get_connection_list():
+    snapshot = network.get_snapshot()
+    for connection in snapshot.get_connection_list():
         if not connection['is_active']:
             continue
 
-        connection_uuid = connection['uuid']
-        connection = network.get_connection(connection_uuid)
-
-        settings_ipv4 = connection.get_setting_ip4_config()
-        if settings_ipv4.get_method() == 'shared':
-            settings_connection = connection.get_setting_connection()
-            interface = settings_connection.get_interface_name()
-            if interface:
-                shared_interfaces.append(interface)
+        connection = snapshot.get_connection(connection['uuid'])
+        if connection['ipv4'].get('method') == 'shared' and \
+           connection['interface_name']:
+            shared_interfaces.append(connection['interface_name'])
 
     return shared_interfaces
 
 
 def _get_interface_addresses(interfaces):
     """Get the IPv4 addresses for the given interfaces."""
-    output = subprocess.check_output(['ip', '-o', 'addr'])
-    lines = output.decode().splitlines()
-
-    addresses = []
-    for line in lines:
-        parts = line.split()
-        if parts[1] in interfaces and parts[2] == 'inet':
-            addresses.append(parts[3].split('/')[0])
-
-    return addresses
+    return [
+        address['address'] for address in addresses.get_ip_addresses()
+        if address['interface'] in interfaces and address['kind'] == '4'
+    ]
 
 
 def _diagnose_dnssec(kind='4'):
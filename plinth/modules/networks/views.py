@@ -1,6 +1,7 @@
 # SPDX-License-Identifier: AGPL-3.0-or-later
 
 import logging
+import time
 
 from django.contrib import messages
 from django.http import HttpResponseRedirect
@@ -21,6 +22,9 @@ from .forms import (ConnectionTypeSelectForm, EthernetForm, GenericForm,
 
 logger = logging.getLogger(__name__)
 
+# Number of seconds after which Wi-Fi scan results are refreshed
+WIFI_SCAN_MAX_AGE = 30
+
 # i18n for device.state
 # https://developer.gnome.org/libnm/1.29/libnm-nm-dbus-interface.html#NMDeviceState
 CONNECTION_METHOD_STRINGS = {
@@ -128,6 +132,7 @@ def index(request):
             'has_diagnostics': True,
             'is_enabled': True,
             'connections': connections,
+            'has_wifi_devices': network.has_wifi_devices(),
             'network_topology': network_topology_type,
             'internet_connectivity_type': internet_connection_type,
         })
@@ -135,8 +140,9 @@ def index(request):
 
 def show(request, uuid):
     """Serve connection information."""
+    snapshot = network.get_snapshot()
     try:
-        connection = network.get_connection(uuid)
+        connection_status = snapshot.get_connection(uuid)
     except network.ConnectionNotFound:
         messages.error(request,
                        _('Cannot show connection: '
@@ -144,50 +150,47 @@ def show(request, uuid):
         return redirect(reverse_lazy('networks:index'))
 
     # Connection status
-    connection_status = network.get_status_from_connection(connection)
     connection_status['zone_string'] = dict(network.ZONES).get(
         connection_status['zone'], connection_status['zone'])
-    connection_status['ipv4']['method_string'] = CONNECTION_METHOD_STRINGS.get(
-        connection_status['ipv4']['method'],
-        connection_status['ipv4']['method'])
-    connection_status['ipv6']['method_string'] = CONNECTION_METHOD_STRINGS.get(
-        connection_status['ipv6']['method'],
-        connection_status['ipv6']['method'])
+    for setting in ('ipv4', 'ipv6'):
+        method = connection_status[setting].get('method')
+        connection_status[setting]['method_string'] = \
+            CONNECTION_METHOD_STRINGS.get(method, method)
 
     # Active connection status
     try:
-        active_connection = network.get_active_connection(uuid)
-        active_connection_status = \
-            network.get_status_from_active_connection(active_connection)
+        active_connection_status = snapshot.get_active_connection(uuid)
     except network.ConnectionNotFound:
         active_connection_status = {}
-        active_connection = None
 
     # Device status
-    device = None
-    if active_connection and active_connection.get_devices():
-        device = active_connection.get_devices()[0]
+    if active_connection_status.get('devices'):
+        interface_name = active_connection_status['devices'][0]
     else:
         interface_name = connection_status['interface_name']
-        if interface_name:
-            device = network.get_device_by_interface_name(interface_name)
 
-    device_status = network.get_status_from_device(device)
-    device_status['state_string'] = DEVICE_STATE_STRINGS.get(
-        device_status['state'], device_status['state'])
-    device_status['state_reason_string'] = DEVICE_STATE_REASON_STRINGS.get(
-        device_status['state_reason'], device_status['state_reason'])
-    device_status['type_string'] = DEVICE_TYPE_STRINGS.get(
-        device_status['type'], device_status['type'])
+    device_status = None
+    if interface_name:
+        device_status = snapshot.get_device(interface_name)
+
+    if device_status:
+        device_status['state_string'] = DEVICE_STATE_STRINGS.get(
+            device_status['state'], device_status['state'])
+        device_status['state_reason_string'] = \
+            DEVICE_STATE_REASON_STRINGS.get(device_status['state_reason'],
+                                            device_status['state_reason'])
+        device_status['type_string'] = DEVICE_TYPE_STRINGS.get(
+            device_status['type'], device_status['type'])
 
     # Access point status
     access_point_status = None
     if connection_status['type'] == '802-11-wireless':
         access_point_status = network.get_status_from_wifi_access_point(
-            device, connection_status['wireless']['ssid'])
-        connection_status['wireless'][
-            'mode_string'] = WIRELESS_MODE_STRINGS.get(
-                connection['wireless']['mode'], connection['wireless']['mode'])
+            device_status, connection_status['wireless']['ssid'])
+        if device_status and 'mode' in device_status['wireless']:
+            mode = device_status['wireless']['mode']
+            device_status['wireless']['mode_string'] = \
+                WIRELESS_MODE_STRINGS.get(mode, mode)
 
     return TemplateResponse(
         request, 'connection_show.html', {
@@ -363,12 +366,36 @@ def deactivate(request, uuid):
 
 
 def scan(request):
-    """Show a list of nearby visible Wi-Fi access points."""
-    access_points = network.wifi_scan()
-    return TemplateResponse(request, 'wifi_scan.html', {
+    """Show a list of nearby visible Wi-Fi access points.
+
+    Show the results of the latest scan right away and start a new scan if
+    neither the latest scan nor the latest attempt to scan is recent. Refresh
+    the page once after requesting a scan and until the scan is complete.
+    """
+    has_wifi_devices = network.has_wifi_devices()
+    scan_status = network.get_wifi_scan_status()
+    last_attempt = max(scan_status['time'] or 0, scan_status['requested']
+                       or 0)
+    requested = False
+    if has_wifi_devices and not scan_status['pending'] and \
+       time.time() - last_attempt > WIFI_SCAN_MAX_AGE:
+        network.request_wifi_scan()
+        requested = True
+
+    scanning = bool(scan_status['pending'])
+    scan_failed = bool(scan_status['failed']) and \
+        scan_status['failed'] > (scan_status['time'] or 0)
+    context = {
         'title': _('Nearby Wi-Fi Networks'),
-        'access_points': access_points
-    })
+        'access_points': network.wifi_scan(),
+        'has_wifi_devices': has_wifi_devices,
+        'scanning': scanning,
+        'scan_failed': scan_failed,
+    }
+    if scanning or requested:
+        context['refresh_page_sec'] = 3
+
+    return TemplateResponse(request, 'wifi_scan.html', context)
 
 
 def add(request):
@@ -28,6 +28,8 @@ _description = [
       'and services.'),
     _('Performance metrics are collected by Performance Co-Pilot and can be '
       'viewed using the Cockpit app.'),
+    _('Usage of CPU, memory and disk by the services of each app is also '
+      'recorded. It is summarized below and shown on the page of each app.'),
 ]
 
 app = None
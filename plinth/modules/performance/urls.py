@@ -5,9 +5,8 @@ FreedomBox app for System Monitoring (cockpit-pcp) in ‘System’.
 
 from django.conf.urls import url
 
-from plinth.views import AppView
+from .views import PerformanceAppView
 
 urlpatterns = [
-    url(r'^sys/performance/$', AppView.as_view(app_id='performance'),
-        name='index'),
+    url(r'^sys/performance/$', PerformanceAppView.as_view(), name='index'),
 ]
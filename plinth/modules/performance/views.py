@@ -0,0 +1,20 @@
+# SPDX-License-Identifier: AGPL-3.0-or-later
+"""
+Views for the performance app.
+"""
+
+from plinth import metrics
+from plinth.views import AppView
+
+
+class PerformanceAppView(AppView):
+    """Show the app along with a summary of resource usage by apps."""
+
+    app_id = 'performance'
+    template_name = 'performance.html'
+
+    def get_context_data(self, *args, **kwargs):
+        """Add usage of resources by apps to the context."""
+        context = super().get_context_data(*args, **kwargs)
+        context['apps_usage'] = metrics.get_apps_usage()
+        return context
@@ -6,10 +6,11 @@ FreedomBox app to configure Privoxy.
 from django.urls import reverse_lazy
 from django.utils.translation import ugettext_lazy as _
 
-from plinth import action_utils, actions
+from plinth import actions
 from plinth import app as app_module
 from plinth import cfg, frontpage, menu
 from plinth.daemon import Daemon
+from plinth.modules.apache import probe
 from plinth.modules.apache.components import diagnose_url
 from plinth.modules.backups.components import BackupRestore
 from plinth.modules.firewall.components import Firewall
@@ -106,14 +107,14 @@ def diagnose_url_with_proxy():
     """Run a diagnostic on a URL with a proxy."""
     url = 'https://debian.org/'  # Gives a simple redirect to www.
 
-    results = []
-    for address in action_utils.get_addresses():
+    def _diagnose(address):
         proxy = 'http://{host}:8118/'.format(host=address['url_address'])
         env = {'https_proxy': proxy}
 
         result = diagnose_url(url, kind=address['kind'], env=env)
         result[0] = _('Access {url} with proxy {proxy} on tcp{kind}') \
             .format(url=url, proxy=proxy, kind=address['kind'])
-        results.append(result)
+        return result
 
-    return results
+    prober = probe.get_prober()
+    return prober.map(_diagnose, prober.get_addresses())
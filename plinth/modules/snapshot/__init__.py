@@ -15,7 +15,7 @@ from plinth import menu
 from plinth.modules import storage
 from plinth.modules.backups.components import BackupRestore
 
-from . import manifest
+from . import manifest, state
 
 version = 4
 
@@ -66,6 +66,8 @@ class SnapshotApp(app_module.App):
                                                **manifest.backup)
         self.add(backup_restore)
 
+        state.start_monitoring()
+
 
 class SnapshotBackupRestore(BackupRestore):
     """Component to backup/restore snapshot module."""
@@ -0,0 +1,127 @@
+# SPDX-License-Identifier: AGPL-3.0-or-later
+"""
+Keep the list of snapshots in memory.
+
+Snapshots are listed by snapperd over D-Bus when first needed. All changes to
+snapshots, including those by the snapper command and its timers, are made by
+snapperd which announces them with D-Bus signals. Once monitoring has started,
+the list is kept until such a signal is received. Without monitoring, the list
+is read on every call.
+"""
+
+import copy
+import datetime
+import json
+import logging
+import threading
+
+from plinth import actions
+from plinth.utils import import_from_gi
+
+gio = import_from_gi('Gio', '2.0')
+glib = import_from_gi('GLib', '2.0')
+
+_DBUS_NAME = 'org.opensuse.Snapper'
+_DBUS_OBJECT = '/org/opensuse/Snapper'
+
+_lock = threading.Lock()
+_cache = {'snapshots': None, 'generation': 0}
+_monitoring = {}
+
+logger = logging.getLogger(__name__)
+
+
+def get_snapshots():
+    """Return the list of snapshots, newest first."""
+    with _lock:
+        snapshots = _cache['snapshots']
+        generation = _cache['generation']
+
+    if snapshots is None:
+        output = actions.superuser_run('snapshot', ['list'])
+        snapshots = json.loads(output)
+        for snapshot in snapshots:
+            snapshot['date'] = datetime.datetime.fromtimestamp(
+                snapshot['date'])
+
+        with _lock:
+            # Don't keep the result if a change was announced meanwhile
+            if _monitoring and generation == _cache['generation']:
+                _cache['snapshots'] = snapshots
+
+    return copy.deepcopy(snapshots)
+
+
+def get_snapshot(number):
+    """Return a snapshot by its number or None."""
+    for snapshot in get_snapshots():
+        if snapshot['number'] == number:
+            return snapshot
+
+    return None
+
+
+def delete_snapshots(numbers):
+    """Delete snapshots with a single call to snapperd.
+
+    Consecutive numbers are passed to the action as ranges to keep the command
+    line short when deleting many snapshots.
+    """
+    if not numbers:
+        return
+
+    try:
+        actions.superuser_run('snapshot', ['delete'] + _get_ranges(numbers))
+    finally:
+        invalidate()
+
+
+def _get_ranges(numbers):
+    """Return a list of numbers and ranges like 7-9 from a list of numbers."""
+    ranges = []
+    for number in sorted({int(number) for number in numbers}):
+        if ranges and ranges[-1][1] == number - 1:
+            ranges[-1][1] = number
+        else:
+            ranges.append([number, number])
+
+    return [
+        str(first) if first == last else '{}-{}'.format(first, last)
+        for first, last in ranges
+    ]
+
+
+def invalidate():
+    """Forget the cached list of snapshots."""
+    with _lock:
+        _cache['snapshots'] = None
+        _cache['generation'] += 1
+
+
+def _on_signal(_connection, _sender, _object_path, _interface, _signal,
+               _parameters, _user_data):
+    """Invalidate the cache when snapperd announces a change."""
+    invalidate()
+
+
+def start_monitoring():
+    """Subscribe to signals from snapperd announcing changes.
+
+    snapperd emits SnapshotCreated, SnapshotModified and SnapshotsDeleted
+    among others. snapperd exits when idle and is started again on demand, so
+    it is not watched for appearing and disappearing from the bus. Signals are
+    delivered by the GLib main loop.
+    """
+    if _monitoring:
+        return
+
+    try:
+        connection = gio.bus_get_sync(gio.BusType.SYSTEM)
+    except glib.Error as exception:
+        logger.warning('Unable to monitor snapshots: %s', exception)
+        return
+
+    _monitoring['signals'] = connection.signal_subscribe(
+        _DBUS_NAME, _DBUS_NAME, None, _DBUS_OBJECT, None,
+        gio.DBusSignalFlags.NONE, _on_signal, None)
+    invalidate()
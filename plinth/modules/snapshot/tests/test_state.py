@@ -0,0 +1,106 @@
+# SPDX-License-Identifier: AGPL-3.0-or-later
+"""
+Test module for keeping the list of snapshots.
+"""
+
+import datetime
+import json
+from unittest.mock import call, patch
+
+import pytest
+
+from plinth.modules.snapshot import state
+
+SNAPSHOTS = [{
+    'number': '2',
+    'is_default': True,
+    'is_active': False,
+    'type': 'single',
+    'pre_number': '',
+    'date': 1590000100,
+    'user': 'root',
+    'cleanup': 'timeline',
+    'description': 'timeline',
+}, {
+    'number': '1',
+    'is_default': False,
+    'is_active': True,
+    'type': 'single',
+    'pre_number': '',
+    'date': 1590000000,
+    'user': 'root',
+    'cleanup': '',
+    'description': 'first root filesystem',
+}]
+
+
+@pytest.fixture(name='superuser_run')
+def fixture_superuser_run():
+    """Return the list of snapshots from the action."""
+    with patch.object(state, '_cache', {
+            'snapshots': None,
+            'generation': 0
+    }), \
+            patch.object(state, '_monitoring', {}), \
+            patch('plinth.actions.superuser_run') as superuser_run:
+        superuser_run.return_value = json.dumps(SNAPSHOTS)
+        yield superuser_run
+
+
+def test_get_snapshots(superuser_run):
+    """Test listing snapshots without monitoring."""
+    snapshots = state.get_snapshots()
+    assert [snapshot['number'] for snapshot in snapshots] == ['2', '1']
+    assert snapshots[1]['date'] == datetime.datetime.fromtimestamp(1590000000)
+    assert state.get_snapshot('1')['is_active']
+    assert state.get_snapshot('3') is None
+    assert superuser_run.call_count == 3
+    superuser_run.assert_called_with('snapshot', ['list'])
+
+
+def test_cache(superuser_run):
+    """Test that snapshots are cached while monitoring."""
+    state._monitoring['signals'] = 1
+    state.get_snapshots()[0]['description'] = 'changed'
+    assert state.get_snapshot('2')['description'] == 'timeline'
+    superuser_run.assert_called_once()
+
+    state._on_signal(None, None, None, None, 'SnapshotCreated', None, None)
+    state.get_snapshots()
+    assert superuser_run.call_count == 2
+
+
+def test_cache_changed_while_listing(superuser_run):
+    """Test that a list is not kept if a change is announced meanwhile."""
+    state._monitoring['signals'] = 1
+
+    def _list(*_args):
+        state.invalidate()
+        return json.dumps(SNAPSHOTS)
+
+    superuser_run.side_effect = _list
+    state.get_snapshots()
+    assert state._cache['snapshots'] is None
+
+
+@pytest.mark.parametrize('numbers, ranges', [
+    (['5'], ['5']),
+    (['3', '1', '2', '7', '5', '6', '3'], ['1-3', '5-7']),
+    (['10', '12', '9'], ['9-10', '12']),
+])
+def test_get_ranges(numbers, ranges):
+    """Test compressing snapshot numbers into ranges."""
+    assert state._get_ranges(numbers) == ranges
+
+
+def test_delete_snapshots(superuser_run):
+    """Test deleting snapshots in one call and forgetting the list."""
+    state._monitoring['signals'] = 1
+    state.get_snapshots()
+    state.delete_snapshots(['4', '2', '3', '8'])
+    state.delete_snapshots([])
+    assert superuser_run.call_args_list == [
+        call('snapshot', ['list']),
+        call('snapshot', ['delete', '2-4', '8'])
+    ]
+    assert state._cache['snapshots'] is None
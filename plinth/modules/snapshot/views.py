@@ -3,7 +3,6 @@
 Views for snapshot module.
 """
 
-import json
 import urllib.parse
 
 from django.contrib import messages
@@ -19,7 +18,7 @@ from plinth.errors import ActionError
 from plinth.modules import snapshot as snapshot_module
 from plinth.modules import storage
 
-from . import get_configuration
+from . import get_configuration, state
 from .forms import SnapshotForm
 
 
@@ -87,6 +86,7 @@ def manage(request):
     if request.method == 'POST':
         if 'create' in request.POST:
             actions.superuser_run('snapshot', ['create'])
+            state.invalidate()
             messages.success(request, _('Created snapshot.'))
         if 'delete_selected' in request.POST:
             to_delete = request.POST.getlist('snapshot_list')
@@ -98,8 +98,7 @@ def manage(request):
                 url = reverse('snapshot:delete-selected')
                 return HttpResponseRedirect(f'{url}?{params}')
 
-    output = actions.superuser_run('snapshot', ['list'])
-    snapshots = json.loads(output)
+    snapshots = state.get_snapshots()
     has_deletable_snapshots = any([
         snapshot for snapshot in snapshots
         if not snapshot['is_default'] and not snapshot['is_active']
@@ -169,8 +168,7 @@ def delete_selected(request):
     if not to_delete:
         return redirect(reverse('snapshot:manage'))
 
-    output = actions.superuser_run('snapshot', ['list'])
-    snapshots = json.loads(output)
+    snapshots = state.get_snapshots()
     snapshots_to_delete = [
         snapshot for snapshot in snapshots if snapshot['number'] in to_delete
         and not snapshot['is_active'] and not snapshot['is_default']
@@ -178,10 +176,8 @@ def delete_selected(request):
 
     if request.method == 'POST':
         try:
-            for snapshot in snapshots_to_delete:
-                actions.superuser_run('snapshot',
-                                      ['delete', snapshot['number']])
-
+            state.delete_snapshots(
+                [snapshot['number'] for snapshot in snapshots_to_delete])
             messages.success(request, _('Deleted selected snapshots'))
         except ActionError as exception:
             if 'Config is in use.' in exception.args[2]:
@@ -204,6 +200,7 @@ def rollback(request, number):
     """Show confirmation to rollback to a snapshot."""
     if request.method == 'POST':
         actions.superuser_run('snapshot', ['rollback', number])
+        state.invalidate()
         messages.success(
             request,
             _('Rolled back to snapshot #{number}.').format(number=number))
@@ -212,14 +209,7 @@ def rollback(request, number):
             _('The system must be restarted to complete the rollback.'))
         return redirect(reverse('power:restart'))
 
-    output = actions.superuser_run('snapshot', ['list'])
-    snapshots = json.loads(output)
-
-    snapshot = None
-    for current_snapshot in snapshots:
-        if current_snapshot['number'] == number:
-            snapshot = current_snapshot
-
+    snapshot = state.get_snapshot(number)
     return TemplateResponse(request, 'snapshot_rollback.html', {
         'title': _('Rollback to Snapshot'),
         'snapshot': snapshot
@@ -5,6 +5,8 @@ FreedomBox app to manage storage.
 
 import base64
 import logging
+import math
+import os
 import subprocess
 
 import psutil
@@ -13,7 +15,7 @@ from django.utils.translation import ugettext_noop
 
 from plinth import actions
 from plinth import app as app_module
-from plinth import cfg, glib, menu
+from plinth import cfg, glib, menu, metrics
 from plinth.errors import ActionError, PlinthError
 from plinth.modules.backups.components import BackupRestore
 from plinth.utils import format_lazy
@@ -36,6 +38,14 @@ logger = logging.getLogger(__name__)
 
 is_essential = True
 
+# Filesystem types not shown, in addition to those without any blocks
+_IGNORED_FILESYSTEM_TYPES = {
+    'autofs', 'devpts', 'devtmpfs', 'proc', 'rootfs', 'sysfs', 'tmpfs'
+}
+
+# Severity and numbers of the low disk space notification last written
+_low_disk_space_state = {}
+
 app = None
 
 
@@ -63,9 +73,8 @@ class StorageApp(app_module.App):
                                        **manifest.backup)
         self.add(backup_restore)
 
-        # Check every hour for low disk space, every 3 minutes in debug mode
-        interval = 180 if cfg.develop else 3600
-        glib.schedule(interval, warn_about_low_disk_space)
+        # Check for low disk space whenever usage is sampled
+        metrics.add_handler(warn_about_low_disk_space)
 
         # Schedule initialization of UDisks2 initialization
         glib.schedule(3, udisks2.init, repeat=False)
@@ -75,51 +84,156 @@ def get_disks():
     """Returns list of disks and their free space.
 
     The primary source of information is UDisks' list of block devices.
-    Information from df is used for free space available.
+    Information from the mount table is used for free space available.
 
     """
-    disks_from_df = _get_disks_from_df()
-    disks = udisks2.get_disks()
-    for disk in disks:
-        disk['size'] = format_bytes(disk['size'])
+    disks = _get_disks_from_udisks()
+    mounts_index = _index_by_mount_point(_get_disks_from_mounts())
 
-    # Add info from df to the disks from udisks based on mount point.
+    # Add usage info to the disks from udisks based on mount point.
     for disk in disks:
-        for disk_from_df in disks_from_df:
-            if disk_from_df['mount_point'] in disk['mount_points']:
-                disk['mount_point'] = disk_from_df['mount_point']
+        for mount_point in disk['mount_points']:
+            mount = mounts_index.get(mount_point)
+            if mount:
+                disk['mount_point'] = mount['mount_point']
                 for key in ('percent_used', 'size', 'used', 'free', 'size_str',
                             'used_str', 'free_str'):
-                    disk[key] = disk_from_df[key]
+                    disk[key] = mount[key]
 
     return sorted(disks, key=lambda disk: disk['device'])
 
 
 def get_mounts():
-    """Return list of mounts by combining information from df and UDisks.
+    """Return list of mounts by combining information from mounts and UDisks.
 
-    The primary source of information is the df command. Information from
+    The primary source of information is the mount table. Information from
     UDisks is used for labels.
 
     """
-    disks = _get_disks_from_df()
-    disks_from_udisks = udisks2.get_disks()
-    for disk in disks_from_udisks:
-        disk['size'] = format_bytes(disk['size'])
+    disks = _get_disks_from_mounts()
+    udisks_index = _index_by_mount_point(_get_disks_from_udisks())
 
-    # Add info from udisks to the disks from df based on mount point.
-    for disk_from_df in disks:
-        for disk_from_udisks in disks_from_udisks:
-            if disk_from_df['mount_point'] in disk_from_udisks['mount_points']:
-                disk_from_df.update(disk_from_udisks)
+    # Add info from udisks to the mounts based on mount point.
+    for disk in disks:
+        disk_from_udisks = udisks_index.get(disk['mount_point'])
+        if disk_from_udisks:
+            disk.update(disk_from_udisks)
 
     return sorted(disks, key=lambda disk: disk['device'])
 
 
-def _get_disks_from_df():
-    """Return the list of disks and free space available using 'df'."""
+def _index_by_mount_point(disks):
+    """Return a dictionary of disks keyed by each of their mount points."""
+    index = {}
+    for disk in disks:
+        if 'mount_points' in disk:
+            mount_points = disk['mount_points']
+        else:
+            mount_points = [disk['mount_point']]
+
+        for mount_point in mount_points:
+            index.setdefault(mount_point, disk)
+
+    return index
+
+
+def _get_disks_from_udisks():
+    """Return the list of disks known to UDisks with formatted sizes."""
+    disks = udisks2.get_disks()
+    for disk in disks:
+        disk['size'] = format_bytes(disk['size'])
+
+    return disks
+
+
+def _get_disks_from_mounts():
+    """Return the list of disks and free space available from mount table.
+
+    Free space is read using statvfs() in this process. Mount table entries are
+    filtered the same way 'df' does. Mount points that are not accessible to
+    this process are read by running 'df' as superuser.
+
+    """
+    disks = {}
+    unreadable_mount_points = []
+    for partition in psutil.disk_partitions(all=True):
+        if partition.fstype in _IGNORED_FILESYSTEM_TYPES:
+            continue
+
+        try:
+            stat = os.statvfs(partition.mountpoint)
+        except PermissionError:
+            unreadable_mount_points.append(partition.mountpoint)
+            continue
+        except OSError:
+            continue
+
+        # Filesystems without blocks are pseudo filesystems
+        if not stat.f_blocks:
+            continue
+
+        size = stat.f_blocks * stat.f_frsize
+        used = (stat.f_blocks - stat.f_bfree) * stat.f_frsize
+        free = stat.f_bavail * stat.f_frsize
+        _add_disk(
+            disks,
+            _make_disk(partition.device, partition.fstype, size, used, free,
+                       _get_percent_used(used, free), partition.mountpoint))
+
+    if unreadable_mount_points:
+        for disk in _get_disks_from_df(unreadable_mount_points):
+            _add_disk(disks, disk)
+
+    return list(disks.values())
+
+
+def _add_disk(disks, disk):
+    """Add a disk to a dictionary of disks by device.
+
+    When a device is mounted multiple times, prefer the shortest mount point
+    like 'df' does.
+    """
+    existing_disk = disks.get(disk['device'])
+    if existing_disk and len(existing_disk['mount_point']) <= len(
+            disk['mount_point']):
+        return
+
+    disks[disk['device']] = disk
+
+
+def _get_percent_used(used, free):
+    """Return percentage of space used rounded up like 'df' does."""
+    total = used + free
+    if not total:
+        return 0
+
+    return math.ceil(used * 100 / total)
+
+
+def _make_disk(device, filesystem_type, size, used, free, percent_used,
+               mount_point):
+    """Return disk information in the format used by views."""
+    return {
+        'device': device,
+        'filesystem_type': filesystem_type,
+        'size': size,
+        'used': used,
+        'free': free,
+        'percent_used': percent_used,
+        'mount_point': mount_point,
+        'size_str': format_bytes(size),
+        'used_str': format_bytes(used),
+        'free_str': format_bytes(free),
+        'label': None,
+        'is_removable': None,
+    }
+
+
+def _get_disks_from_df(mount_points):
+    """Return the list of disks and free space of mount points using 'df'."""
     try:
-        output = actions.superuser_run('storage', ['usage-info'])
+        output = actions.superuser_run('storage',
+                                       ['usage-info', '--'] + mount_points)
     except subprocess.CalledProcessError as exception:
         logger.exception('Error getting disk information: %s', exception)
         return []
@@ -127,19 +241,12 @@ def _get_disks_from_df():
     disks = []
     for line in output.splitlines()[1:]:
         parts = line.split(maxsplit=6)
-        keys = ('device', 'filesystem_type', 'size', 'used', 'free',
-                'percent_used', 'mount_point')
-        disk = dict(zip(keys, parts))
-        disk['percent_used'] = int(disk['percent_used'].rstrip('%'))
-        disk['size'] = int(disk['size'])
-        disk['used'] = int(disk['used'])
-        disk['free'] = int(disk['free'])
-        disk['size_str'] = format_bytes(disk['size'])
-        disk['used_str'] = format_bytes(disk['used'])
-        disk['free_str'] = format_bytes(disk['free'])
-        disk['label'] = None
-        disk['is_removable'] = None
-        disks.append(disk)
+        device, filesystem_type, size, used, free, percent_used, \
+            mount_point = parts
+        disks.append(
+            _make_disk(device, filesystem_type, int(size), int(used),
+                       int(free), int(percent_used.rstrip('%')),
+                       mount_point))
 
     return disks
 
@@ -155,15 +262,12 @@ def get_filesystem_type(mount_point='/'):
 
 def get_mount_info(mount_point):
     """Get information about the free space of a mount point."""
-    mounts = get_mounts()
-    list_root = [
-        mount for mount in mounts if mount_point == mount['mount_point']
-    ]
-    if not list_root:
+    mount = _index_by_mount_point(_get_disks_from_mounts()).get(mount_point)
+    if not mount:
         raise PlinthError('Mount point {} not found.'.format(mount_point))
 
-    percent_used = list_root[0]['percent_used']
-    free_bytes = list_root[0]['free']
+    percent_used = mount['percent_used']
+    free_bytes = mount['free']
     free_gib = free_bytes / (1024**3)
     return {
         'percent_used': percent_used,
@@ -283,24 +387,29 @@ def setup(helper, old_version=None):
             pass
 
 
-def warn_about_low_disk_space(request):
-    """Warn about insufficient space on root partition."""
-    from plinth.notification import Notification
+def warn_about_low_disk_space(sample):
+    """Warn about insufficient space on root partition.
 
-    try:
-        root_info = get_mount_info('/')
-    except PlinthError:
-        return
+    The notification is only written when its severity or the numbers shown
+    change.
+    """
+    from plinth.notification import Notification
 
-    show = False
-    if root_info['percent_used'] > 90 or root_info['free_gib'] < 1:
+    percent_used = int(sample.disk_percent_used)
+    free_gib = sample.disk_free / (1024**3)
+    severity = None
+    if percent_used > 90 or free_gib < 1:
         severity = 'error'
-        show = True
-    elif root_info['percent_used'] > 75 or root_info['free_gib'] < 2:
+    elif percent_used > 75 or free_gib < 2:
         severity = 'warning'
-        show = True
 
-    if not show:
+    free_space = format_bytes(int(sample.disk_free))
+    state = (severity, percent_used, free_space) if severity else None
+    if _low_disk_space_state.get('last', False) == state:
+        return
+
+    _low_disk_space_state['last'] = state
+    if not severity:
         try:
             Notification.get('storage-low-disk-space').delete()
         except KeyError:
@@ -314,8 +423,8 @@ def warn_about_low_disk_space(request):
         data = {
             'app_icon': 'fa-hdd-o',
             'app_name': 'translate:' + ugettext_noop('Storage'),
-            'percent_used': root_info['percent_used'],
-            'free_space': format_bytes(root_info['free_bytes'])
+            'percent_used': percent_used,
+            'free_space': free_space
         }
         actions = [{
             'type': 'link',
@@ -8,9 +8,14 @@ import pathlib
 import re
 import subprocess
 import tempfile
+from collections import namedtuple
+from unittest.mock import patch
 
 import pytest
 
+from plinth import metrics
+from plinth.modules import storage
+
 
 def _get_partition_device(device, partition_number):
     """Return the device corresponding to a partition in a given device."""
@@ -311,3 +316,118 @@ class TestActions:
     def test_validate_directory_creatable(self, path, error):
         """Test that directory creatable validation returns expected output."""
         self.assert_validate_directory(path, error, check_creatable=True)
+
+
+_Partition = namedtuple('_Partition', ['device', 'mountpoint', 'fstype'])
+_StatVFS = namedtuple('_StatVFS',
+                      ['f_blocks', 'f_bfree', 'f_bavail', 'f_frsize'])
+
+
+@patch('os.statvfs')
+@patch('psutil.disk_partitions')
+def test_get_disks_from_mounts(disk_partitions, statvfs):
+    """Test that usage info is read from the mount table like df does."""
+    disk_partitions.return_value = [
+        _Partition('/dev/sda1', '/', 'ext4'),
+        _Partition('tmpfs', '/run', 'tmpfs'),
+        _Partition('cgroup2', '/sys/fs/cgroup', 'cgroup2'),
+        _Partition('/dev/sda1', '/srv/bind', 'ext4'),
+        _Partition('/dev/sdb1', '/media/root/disk', 'vfat'),
+    ]
+    stats = {
+        '/': _StatVFS(1000, 400, 300, 4096),
+        '/sys/fs/cgroup': _StatVFS(0, 0, 0, 4096),
+        '/srv/bind': _StatVFS(1000, 400, 300, 4096),
+        '/media/root/disk': _StatVFS(100, 100, 100, 512),
+    }
+    statvfs.side_effect = stats.get
+
+    disks = storage._get_disks_from_mounts()
+    assert [disk['mount_point'] for disk in disks] == ['/', '/media/root/disk']
+    assert disks[0]['size'] == 1000 * 4096
+    assert disks[0]['used'] == 600 * 4096
+    assert disks[0]['free'] == 300 * 4096
+    assert disks[0]['percent_used'] == 67
+    assert disks[1]['percent_used'] == 0
+
+
+@patch('plinth.actions.superuser_run')
+@patch('os.statvfs')
+@patch('psutil.disk_partitions')
+def test_get_disks_from_mounts_fallback(disk_partitions, statvfs,
+                                        superuser_run):
+    """Test that df is used only for mount points that are not accessible."""
+    disk_partitions.return_value = [
+        _Partition('/dev/sda1', '/', 'ext4'),
+        _Partition('/dev/sdb1', '/media/other/disk', 'ext4'),
+    ]
+
+    def _statvfs(mount_point):
+        if mount_point != '/':
+            raise PermissionError
+
+        return _StatVFS(1000, 400, 300, 4096)
+
+    statvfs.side_effect = _statvfs
+    superuser_run.return_value = (
+        'Filesystem Type Size Used Avail Use% Mounted on\n'
+        '/dev/sdb1 ext4 2048 1024 1024 50% /media/other/disk\n')
+    disks = storage._get_disks_from_mounts()
+    superuser_run.assert_called_once_with(
+        'storage', ['usage-info', '--', '/media/other/disk'])
+    assert [disk['mount_point'] for disk in disks] == \
+        ['/', '/media/other/disk']
+    assert disks[0]['size'] == 1000 * 4096
+    assert disks[1]['size'] == 2048
+    assert disks[1]['percent_used'] == 50
+
+
+@patch('plinth.modules.storage._get_disks_from_mounts')
+@patch('plinth.modules.storage.udisks2.get_disks')
+def test_get_mounts(get_disks, get_disks_from_mounts):
+    """Test merging information from mounts and UDisks."""
+    get_disks_from_mounts.return_value = [
+        storage._make_disk('/dev/sdb1', 'vfat', 100, 50, 50, 50,
+                           '/media/root/disk'),
+        storage._make_disk('/dev/sda1', 'ext4', 100, 10, 90, 10, '/'),
+    ]
+    get_disks.return_value = [{
+        'device': '/dev/sdb1',
+        'label': 'disk',
+        'size': 100,
+        'filesystem_type': 'vfat',
+        'is_removable': True,
+        'mount_points': ['/media/root/disk'],
+    }]
+    mounts = storage.get_mounts()
+    assert [mount['device'] for mount in mounts] == ['/dev/sda1', '/dev/sdb1']
+    assert mounts[0]['label'] is None
+    assert mounts[1]['label'] == 'disk'
+    assert mounts[1]['is_removable']
+    assert mounts[1]['free'] == 50
+
+
+@patch('plinth.notification.Notification')
+def test_warn_about_low_disk_space(notification):
+    """Test that notification is written only when it changes."""
+    gib = 1024**3
+
+    def _sample(free, percent_used):
+        return metrics.Sample(0, 100 * gib, free * gib, percent_used, 0, 0, 0)
+
+    with patch.object(storage, '_low_disk_space_state', {}):
+        storage.warn_about_low_disk_space(_sample(50, 50))
+        storage.warn_about_low_disk_space(_sample(49, 51))
+        notification.get.assert_called_once_with('storage-low-disk-space')
+        notification.get.return_value.delete.assert_called_once()
+
+        storage.warn_about_low_disk_space(_sample(20, 80))
+        storage.warn_about_low_disk_space(_sample(20, 80))
+        notification.update_or_create.assert_called_once()
+        assert notification.update_or_create.call_args[1][
+            'severity'] == 'warning'
+
+        storage.warn_about_low_disk_space(_sample(0.5, 80))
+        assert notification.update_or_create.call_count == 2
+        assert notification.update_or_create.call_args[1][
+            'severity'] == 'error'
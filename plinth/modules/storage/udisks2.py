@@ -43,6 +43,10 @@ _ERRORS = {
 
 _jobs = {}
 
+_objects = {}
+_objects_lock = threading.Lock()
+_objects_loaded = False
+
 logger = logging.getLogger(__name__)
 
 
@@ -135,45 +139,87 @@ class Loop(Proxy):
     properties = {'backing_file': ('ay', 'BackingFile')}
 
 
-def _is_removable(object_path):
+def _decode_bytes(value):
+    """Return a string from a NULL terminated D-Bus byte array."""
+    if not value:
+        return ''
+
+    return bytes(value)[:-1].decode()
+
+
+def _is_removable(block):
     """Return True if the device is not part of fstab or crypttab."""
-    block = BlockDevice(object_path)
-    for type_, _details in block.configuration:
+    for type_, _details in block.get('Configuration', []):
         if type_ in ('fstab', 'crypttab'):
             return False
 
     return True
 
 
-def get_disks():
-    """List devices that can be ejected."""
-    devices = []
+def _get_managed_objects():
+    """Return all UDisks2 objects with their interfaces and properties.
+
+    Once the signal handlers are connected, the cached copy of the objects is
+    returned. It is kept up-to-date using InterfacesAdded, InterfacesRemoved
+    and PropertiesChanged signals. Before that, UDisks2 is queried directly
+    with a single GetManagedObjects() call.
+
+    """
+    with _objects_lock:
+        if _objects_loaded:
+            return {
+                object_path: dict(interfaces)
+                for object_path, interfaces in _objects.items()
+            }
+
+    manager = _get_dbus_proxy(_OBJECTS['UDisks2'],
+                              _INTERFACES['ObjectManager'])
+    return manager.GetManagedObjects()
+
+
+def _load_objects():
+    """Fill the cache of UDisks2 objects."""
+    global _objects_loaded
 
     manager = _get_dbus_proxy(_OBJECTS['UDisks2'],
                               _INTERFACES['ObjectManager'])
     objects = manager.GetManagedObjects()
-    for object_, interface_and_properties in objects.items():
-        if _INTERFACES['Block'] not in interface_and_properties:
-            continue
+    with _objects_lock:
+        _objects.clear()
+        for object_path, interfaces in objects.items():
+            _objects[object_path] = {
+                interface: dict(properties)
+                for interface, properties in interfaces.items()
+            }
+
+        _objects_loaded = True
+
+    return objects
 
-        block = BlockDevice(object_)
-        if block.id_usage != 'filesystem':
+
+def get_disks():
+    """List devices that can be ejected."""
+    devices = []
+
+    objects = _get_managed_objects()
+    for interfaces in objects.values():
+        block = interfaces.get(_INTERFACES['Block'])
+        if not block or block.get('IdUsage') != 'filesystem':
             continue
 
+        file_system = interfaces.get(_INTERFACES['Filesystem'], {})
+        mount_points = [
+            _decode_bytes(mount_point)
+            for mount_point in file_system.get('MountPoints', [])
+        ]
         device = {
-            'device': block.device,
-            'label': block.id_label,
-            'size': block.size,
-            'filesystem_type': block.id_type,
-            'is_removable': _is_removable(object_),
-            'mount_points': [],
+            'device': _decode_bytes(block.get('Device')),
+            'label': block.get('IdLabel'),
+            'size': block.get('Size'),
+            'filesystem_type': block.get('IdType'),
+            'is_removable': _is_removable(block),
+            'mount_points': mount_points,
         }
-        try:
-            file_system = Filesystem(object_)
-            device['mount_points'] = file_system.mount_points
-        except Exception:
-            continue
-
         devices.append(device)
 
     return devices
@@ -307,6 +353,11 @@ def _on_interfaces_added(_connection, _sender_name, _object_path,
 
     """
     object_path, interfaces = parameters
+    with _objects_lock:
+        known_interfaces = _objects.setdefault(object_path, {})
+        for interface, properties in interfaces.items():
+            known_interfaces[interface] = dict(properties)
+
     if object_path.startswith(_OBJECTS['jobs']):
         _on_job_created(object_path, interfaces)
 
@@ -322,7 +373,15 @@ def _on_interfaces_removed(_connection, _sender_name, _object_path,
     Runs in glib thread. No blocking operations.
 
     """
-    object_path, _interfaces = parameters
+    object_path, interfaces = parameters
+    with _objects_lock:
+        known_interfaces = _objects.get(object_path, {})
+        for interface in interfaces:
+            known_interfaces.pop(interface, None)
+
+        if not known_interfaces:
+            _objects.pop(object_path, None)
+
     if object_path.startswith(_OBJECTS['jobs']):
         _on_job_removed(object_path)
 
@@ -335,7 +394,14 @@ def _on_properties_changed(_connection, _sender_name, object_path,
     Runs in glib thread. No blocking operations.
 
     """
-    interface_changed, properties_changed, _properties_invalided = parameters
+    interface_changed, properties_changed, properties_invalidated = parameters
+    with _objects_lock:
+        properties = _objects.get(object_path, {}).get(interface_changed)
+        if properties is not None:
+            properties.update(properties_changed)
+            for property_ in properties_invalidated:
+                properties.pop(property_, None)
+
     if interface_changed == _INTERFACES['Ata'] and \
        'SmartFailing' in properties_changed:
         drive = Drive(object_path)
@@ -375,11 +441,8 @@ def _connect():
                                 _on_properties_changed, None, None)
 
 
-def _check_failing_drives():
+def _check_failing_drives(objects):
     """Check if any of the drives are failing and report."""
-    manager = _get_dbus_proxy(_OBJECTS['UDisks2'],
-                              _INTERFACES['ObjectManager'])
-    objects = manager.GetManagedObjects()
     for _, interface_and_properties in objects.items():
         if _INTERFACES['Drive'] in interface_and_properties and \
            _INTERFACES['Ata'] in interface_and_properties:
@@ -388,11 +451,8 @@ def _check_failing_drives():
                 interface_and_properties[_INTERFACES['Ata']]['SmartFailing'])
 
 
-def _mount_initial_devices():
+def _mount_initial_devices(objects):
     """Check if any of the block devices need mounting."""
-    manager = _get_dbus_proxy(_OBJECTS['UDisks2'],
-                              _INTERFACES['ObjectManager'])
-    objects = manager.GetManagedObjects()
     for object_, interface_and_properties in objects.items():
         if _INTERFACES['Filesystem'] in interface_and_properties:
             _consider_for_mounting(object_)
@@ -401,9 +461,13 @@ def _mount_initial_devices():
 def init(_data):
     """Subscribe to signals from UDisks2 and check for failing drives.
 
+    Also fill the cache of UDisks2 objects which the signal handlers keep
+    up-to-date from then on.
+
     Runs in a separate thread from glib thread due to blocking operations.
 
     """
     _connect()
-    _check_failing_drives()
-    _mount_initial_devices()
+    objects = _load_objects()
+    _check_failing_drives(objects)
+    _mount_initial_devices(objects)
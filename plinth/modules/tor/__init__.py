@@ -9,7 +9,7 @@ from django.utils.translation import ugettext_lazy as _
 
 from plinth import action_utils, actions
 from plinth import app as app_module
-from plinth import menu
+from plinth import cfg, glib, menu
 from plinth.daemon import (Daemon, app_is_running, diagnose_netcat,
                            diagnose_port_listening)
 from plinth.modules.apache.components import diagnose_url
@@ -103,6 +103,12 @@ class TorApp(app_module.App):
                                          domain_type='domain-type-tor',
                                          name=hostname, services=services)
 
+        # Keep the status shown in the Tor page fresh, every 3 minutes or every
+        # 30 seconds in debug mode.
+        interval = 30 if cfg.develop else 180
+        glib.schedule(3, _refresh_status, repeat=False)
+        glib.schedule(interval, _refresh_status)
+
     def diagnose(self):
         """Run diagnostics and return the results."""
         results = super().diagnose()
@@ -165,10 +171,17 @@ def setup(helper, old_version=None):
     helper.call('post', app.enable)
 
 
+def _refresh_status(_data):
+    """Refresh the remembered Tor status in background."""
+    setup_helper = globals()['setup_helper']
+    if setup_helper.get_state() != 'needs-setup':
+        utils.refresh_status()
+
+
 def update_hidden_service_domain(status=None):
     """Update HS domain with Name Services module."""
     if not status:
-        status = utils.get_status()
+        status = utils.refresh_status()
 
     domain_removed.send_robust(sender='tor', domain_type='domain-type-tor')
 
@@ -32,6 +32,27 @@ class TestTor:
         """
         utils.get_status()
 
+    @staticmethod
+    @patch('plinth.modules.tor.utils.get_status')
+    def test_cached_status(get_status):
+        """Test that status is remembered until invalidated."""
+        utils.invalidate_status()
+        get_status.return_value = {'enabled': True}
+        assert utils.get_cached_status() == {'enabled': True}
+        assert utils.get_cached_status() == {'enabled': True}
+        get_status.assert_called_once()
+
+        get_status.return_value = {'enabled': False}
+        assert utils.refresh_status() == {'enabled': False}
+        assert utils.get_cached_status() == {'enabled': False}
+        assert get_status.call_count == 2
+
+        utils.invalidate_status()
+        get_status.return_value = {'enabled': True}
+        assert utils.get_cached_status() == {'enabled': True}
+        assert get_status.call_count == 3
+        utils.invalidate_status()
+
 
 class TestTorForm:
     """Test whether Tor configration form works."""
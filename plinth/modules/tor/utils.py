@@ -6,6 +6,7 @@ Tor utility functions
 import glob
 import itertools
 import json
+import threading
 
 import augeas
 
@@ -18,6 +19,9 @@ APT_SOURCES_URI_PATHS = ('/files/etc/apt/sources.list/*/uri',
                          '/files/etc/apt/sources.list.d/*/*/uri')
 APT_TOR_PREFIX = 'tor+'
 
+_status = None
+_status_lock = threading.Lock()
+
 
 def get_status(initialized=True):
     """Return current Tor status."""
@@ -59,6 +63,39 @@ def get_status(initialized=True):
     }
 
 
+def get_cached_status():
+    """Return the last known Tor status.
+
+    The status is refreshed periodically in background and after
+    configuration changes. It is read synchronously only if it is not known.
+
+    """
+    with _status_lock:
+        status = _status
+
+    if status is None:
+        status = refresh_status()
+
+    return status
+
+
+def refresh_status():
+    """Read the current Tor status and remember it."""
+    global _status
+    status = get_status()
+    with _status_lock:
+        _status = status
+
+    return status
+
+
+def invalidate_status():
+    """Forget the remembered Tor status after a configuration change."""
+    global _status
+    with _status_lock:
+        _status = None
+
+
 def iter_apt_uris(aug):
     """Iterate over all the APT source URIs."""
     return itertools.chain.from_iterable(
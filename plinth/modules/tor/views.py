@@ -22,7 +22,7 @@ def index(request):
     if config_process:
         _collect_config_result(request)
 
-    status = tor_utils.get_status()
+    status = tor_utils.get_cached_status()
     form = None
 
     if request.method == 'POST':
@@ -30,7 +30,7 @@ def index(request):
         # pylint: disable=E1101
         if form.is_valid():
             _apply_changes(request, status, form.cleaned_data)
-            status = tor_utils.get_status()
+            status = tor_utils.get_cached_status()
             form = TorForm(initial=status, prefix='tor')
     else:
         form = TorForm(initial=status, prefix='tor')
@@ -126,6 +126,7 @@ def __apply_changes(request, old_status, new_status):
 
     if arguments:
         actions.superuser_run('tor', ['configure'] + arguments)
+        tor_utils.invalidate_status()
         if not needs_restart:
             messages.success(request, _('Configuration updated.'))
 
@@ -149,7 +150,7 @@ def _collect_config_result(request):
     if return_code is None:
         return
 
-    status = tor_utils.get_status()
+    status = tor_utils.refresh_status()
 
     tor.update_hidden_service_domain(status)
 
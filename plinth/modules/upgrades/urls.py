@@ -20,4 +20,5 @@ urlpatterns = [
         views.UpdateFirstbootProgressView.as_view(),
         name='update-firstboot-progress'),
     url(r'^sys/upgrades/upgrade/$', views.upgrade, name='upgrade'),
+    url(r'^sys/upgrades/log/$', views.UpgradesLogView.as_view(), name='log'),
 ]
@@ -2,11 +2,12 @@
 """
 FreedomBox app for upgrades.
 """
+import json
 import subprocess
 
 from apt.cache import Cache
 from django.contrib import messages
-from django.http import HttpResponseRedirect
+from django.http import Http404, HttpResponseRedirect
 from django.shortcuts import redirect
 from django.urls import reverse_lazy
 from django.utils.translation import ugettext as _
@@ -20,6 +21,8 @@ from plinth.views import AppView
 
 from .forms import BackportsFirstbootForm, ConfigureForm, UpdateFirstbootForm
 
+LOG_NAMES = ('unattended-upgrades', 'unattended-upgrades-dpkg')
+
 
 class UpgradesConfigurationView(AppView):
     """Serve configuration page."""
@@ -40,7 +43,7 @@ class UpgradesConfigurationView(AppView):
         context['is_backports_requested'] = upgrades.is_backports_requested()
         context['is_busy'] = (_is_updating()
                               or package.is_package_manager_busy())
-        context['log'] = get_log()
+        context['logs'] = get_log()
         context['refresh_page_sec'] = 3 if context['is_busy'] else None
         context['version'] = __version__
         context['new_version'] = is_newer_version_available()
@@ -106,9 +109,56 @@ def get_os_release():
     return output
 
 
-def get_log():
-    """Return the current log for unattended upgrades."""
-    return actions.superuser_run('upgrades', ['get-log'])
+def get_log(log=None, lines=100, before=None, filter_=None):
+    """Return lines from the end of the unattended upgrades logs.
+
+    Log files are read backwards from the end, or from the byte offset
+    'before', so that they are never read fully.
+
+    """
+    arguments = ['get-log', '--lines', str(lines)]
+    if log:
+        arguments += ['--log', log]
+
+    if before is not None:
+        arguments += ['--before', str(before)]
+
+    if filter_:
+        arguments.append('--filter=' + filter_)
+
+    logs = json.loads(actions.superuser_run('upgrades', arguments))
+    for log_info in logs.values():
+        log_info['text'] = '\n'.join(log_info['lines'])
+
+    return logs
+
+
+class UpgradesLogView(TemplateView):
+    """Show a page of lines from one of the unattended upgrades logs."""
+    template_name = 'upgrades_log.html'
+
+    def get_context_data(self, *args, **kwargs):
+        """Return template context data."""
+        context = super().get_context_data(*args, **kwargs)
+        name = self.request.GET.get('log')
+        if name not in LOG_NAMES:
+            raise Http404
+
+        try:
+            before = int(self.request.GET['before'])
+        except (KeyError, ValueError):
+            before = None
+
+        filter_ = self.request.GET.get('filter') or None
+        log = get_log(name, before=before, filter_=filter_).get(name)
+        if not log:
+            raise Http404
+
+        context['title'] = _('Update Logs')
+        context['name'] = name
+        context['log'] = log
+        context['filter'] = filter_
+        return context
 
 
 def _is_updating():
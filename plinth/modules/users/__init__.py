@@ -4,6 +4,7 @@ FreedomBox app to manage users.
 """
 
 import grp
+import json
 import subprocess
 
 from plinth import actions
@@ -13,6 +14,7 @@ from plinth.daemon import Daemon
 from django.utils.text import format_lazy
 from django.utils.translation import ugettext_lazy as _, ugettext_lazy
 
+from . import directory
 from .components import UsersAndGroups
 
 version = 3
@@ -128,15 +130,29 @@ def remove_group(group):
 
 def get_last_admin_user():
     """If there is only one admin user return its name else return None."""
-    output = actions.superuser_run('users', ['get-group-users', 'admin'])
-    admin_users = output.strip().split('\n')
-
-    if len(admin_users) == 1 and admin_users[0]:
+    admin_users = directory.get_group_users('admin')
+    if len(admin_users) == 1:
         return admin_users[0]
 
     return None
 
 
+def modify_ldap_user(username, auth_username, auth_password, **changes):
+    """Apply a set of changes to an LDAP user with a single action call.
+
+    Possible changes are new_username, groups (complete list of groups the user
+    should be part of), password and status ('active' or 'inactive').
+
+    """
+    changes.update({
+        'username': username,
+        'auth_user': auth_username,
+        'auth_password': auth_password
+    })
+    actions.superuser_run('users', ['modify-user'],
+                          input=json.dumps(changes).encode())
+
+
 def add_user_to_share_group(username, service=None):
     """Add user to the freedombox-share group."""
     try:
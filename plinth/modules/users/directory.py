@@ -0,0 +1,182 @@
+# SPDX-License-Identifier: AGPL-3.0-or-later
+"""
+Read-only queries on users and groups in the LDAP directory.
+
+Queries are sent directly to slapd over its local socket instead of running
+ldapscripts tools through the users action with sudo. The connection is
+authenticated with SASL EXTERNAL as the local user running the service, which
+the default access rules allow to read the names and memberships queried here.
+Connections are kept in a small pool and reused across requests.
+"""
+
+import contextlib
+import logging
+import queue
+
+import ldap
+import ldap.filter
+
+LDAP_URI = 'ldapi:///'
+BASE_DN = 'dc=thisbox'
+USERS_DN = 'ou=users,' + BASE_DN
+GROUPS_DN = 'ou=groups,' + BASE_DN
+
+# Primary group of all users, not shown as a membership
+_PRIMARY_GROUP = 'users'
+
+_POOL_SIZE = 4
+
+_pool = queue.LifoQueue(maxsize=_POOL_SIZE)
+
+logger = logging.getLogger(__name__)
+
+
+def _connect():
+    """Return a new connection bound to the directory."""
+    connection = ldap.initialize(LDAP_URI)
+    connection.sasl_non_interactive_bind_s('EXTERNAL')
+    return connection
+
+
+def _close(connection):
+    """Close a connection ignoring any errors."""
+    try:
+        connection.unbind_s()
+    except ldap.LDAPError:
+        pass
+
+
+def _release(connection):
+    """Return a connection to the pool or close it if the pool is full."""
+    try:
+        _pool.put_nowait(connection)
+    except queue.Full:
+        _close(connection)
+
+
+@contextlib.contextmanager
+def _get_connection():
+    """Borrow a connection from the pool and return it after use.
+
+    Connections that failed with the server going away are dropped instead of
+    being returned to the pool.
+    """
+    try:
+        connection = _pool.get_nowait()
+    except queue.Empty:
+        connection = _connect()
+
+    try:
+        yield connection
+    except ldap.SERVER_DOWN:
+        _close(connection)
+        raise
+    except ldap.LDAPError:
+        _release(connection)
+        raise
+
+    _release(connection)
+
+
+def _decode_entry(attributes):
+    """Return attributes of an entry with values decoded to strings."""
+    return {
+        key: [value.decode() for value in values]
+        for key, values in attributes.items()
+    }
+
+
+def search(base, filterstr, attributes, scope=ldap.SCOPE_SUBTREE):
+    """Search the directory and return a list of (dn, attributes) tuples.
+
+    A pooled connection may have been closed by a restart of slapd, so the
+    search is retried once on a fresh connection. Searching a non-existent
+    base returns an empty list.
+    """
+    for attempt in range(2):
+        try:
+            with _get_connection() as connection:
+                results = connection.search_s(base, scope, filterstr,
+                                              attributes)
+                break
+        except ldap.SERVER_DOWN:
+            if attempt:
+                raise
+        except ldap.NO_SUCH_OBJECT:
+            return []
+
+    return [(dn, _decode_entry(attributes)) for dn, attributes in results
+            if dn is not None]
+
+
+def _query(function, *args):
+    """Run a query and return an empty list on failure."""
+    try:
+        return function(*args)
+    except ldap.LDAPError as exception:
+        logger.error('Error querying LDAP directory: %s', exception)
+        return []
+
+
+def _get_group_users(group):
+    """Search for the members of a group."""
+    filterstr = ldap.filter.filter_format('(&(objectClass=posixGroup)(cn=%s))',
+                                          [group])
+    results = search(GROUPS_DN, filterstr, ['memberUid'])
+    return [
+        user for _, attributes in results
+        for user in attributes.get('memberUid', [])
+    ]
+
+
+def get_group_users(group):
+    """Return the list of users who are members of a group."""
+    return _query(_get_group_users, group)
+
+
+def _get_user_groups(username):
+    """Search for the groups of a user."""
+    filterstr = ldap.filter.filter_format(
+        '(&(objectClass=posixGroup)(memberUid=%s))', [username])
+    results = search(GROUPS_DN, filterstr, ['cn'])
+    return [
+        attributes['cn'][0] for _, attributes in results
+        if attributes['cn'][0] != _PRIMARY_GROUP
+    ]
+
+
+def get_user_groups(username):
+    """Return the list of groups a user is a member of."""
+    return _query(_get_user_groups, username)
+
+
+def _get_users_with_groups():
+    """Search for all users and groups and map users to their groups."""
+    filterstr = '(|(objectClass=posixAccount)(objectClass=posixGroup))'
+    results = search(BASE_DN, filterstr,
+                     ['objectClass', 'uid', 'cn', 'memberUid'])
+    users = {}
+    groups = {}
+    for _, attributes in results:
+        if 'posixAccount' in attributes['objectClass']:
+            users[attributes['uid'][0]] = []
+        else:
+            groups[attributes['cn'][0]] = attributes.get('memberUid', [])
+
+    for group, members in sorted(groups.items()):
+        if group == _PRIMARY_GROUP:
+            continue
+
+        for member in members:
+            if member in users:
+                users[member].append(group)
+
+    return users
+
+
+def get_users_with_groups():
+    """Return a dictionary mapping each user to the list of their groups.
+
+    All users and groups are retrieved with a single search.
+    """
+    return _query(_get_users_with_groups) or {}
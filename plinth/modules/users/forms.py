@@ -22,7 +22,7 @@ from plinth.modules.security import set_restricted_access
 from plinth.translation import set_language
 from plinth.utils import is_user_admin
 
-from . import get_last_admin_user
+from . import get_last_admin_user, modify_ldap_user
 from .components import UsersAndGroups
 
 
@@ -150,19 +150,18 @@ class CreateUserForm(ValidNewUsernameCheckMixin,
                     _('Creating LDAP user failed: {error}'.format(
                         error=error)))
 
-            for group in self.cleaned_data['groups']:
+            groups = self.cleaned_data['groups']
+            if groups:
                 try:
-                    actions.superuser_run('users', [
-                        'add-user-to-group',
-                        user.get_username(), group, '--auth-user',
-                        auth_username
-                    ], input=confirm_password.encode())
+                    modify_ldap_user(user.get_username(), auth_username,
+                                     confirm_password, groups=groups)
                 except ActionError as error:
                     messages.error(
                         self.request,
-                        _('Failed to add new user to {group} group: {error}').
-                        format(group=group, error=error))
+                        _('Failed to add new user to groups: {error}').format(
+                            error=error))
 
+            for group in groups:
                 group_object, created = Group.objects.get_or_create(name=group)
                 group_object.user_set.add(user)
 
@@ -250,76 +249,36 @@ class UserUpdateForm(ValidNewUsernameCheckMixin, PasswordConfirmForm,
             user.save()
             self.save_m2m()
 
-            output = actions.superuser_run('users',
-                                           ['get-user-groups', self.username])
-            old_groups = output.strip().split('\n')
-            old_groups = [group for group in old_groups if group]
-
+            changes = {
+                'groups': list(user.groups.values_list('name', flat=True))
+            }
             if self.username != user.get_username():
-                try:
-                    actions.superuser_run(
-                        'users',
-                        ['rename-user', self.username,
-                         user.get_username()])
-                except ActionError:
-                    messages.error(self.request,
-                                   _('Renaming LDAP user failed.'))
-
-            new_groups = user.groups.values_list('name', flat=True)
-            for old_group in old_groups:
-                if old_group not in new_groups:
-                    try:
-                        actions.superuser_run('users', [
-                            'remove-user-from-group',
-                            user.get_username(), old_group, '--auth-user',
-                            auth_username
-                        ], input=confirm_password.encode())
-                    except ActionError:
-                        messages.error(self.request,
-                                       _('Failed to remove user from group.'))
-
-            for new_group in new_groups:
-                if new_group not in old_groups:
-                    try:
-                        actions.superuser_run('users', [
-                            'add-user-to-group',
-                            user.get_username(), new_group, '--auth-user',
-                            auth_username
-                        ], input=confirm_password.encode())
-                    except ActionError:
-                        messages.error(self.request,
-                                       _('Failed to add user to group.'))
+                changes['new_username'] = user.get_username()
+
+            is_active = self.cleaned_data['is_active']
+            if self.initial['is_active'] != is_active:
+                changes['status'] = 'active' if is_active else 'inactive'
 
             try:
-                actions.superuser_run('ssh', [
-                    'set-keys',
-                    '--username',
-                    user.get_username(),
-                    '--keys',
-                    self.cleaned_data['ssh_keys'].strip(),
-                    '--auth-user',
-                    auth_username,
-                ], input=confirm_password.encode())
+                modify_ldap_user(self.username, auth_username,
+                                 confirm_password, **changes)
             except ActionError:
-                messages.error(self.request, _('Unable to set SSH keys.'))
+                messages.error(self.request, _('Updating LDAP user failed.'))
 
-            is_active = self.cleaned_data['is_active']
-            if self.initial['is_active'] != is_active:
-                if is_active:
-                    status = 'active'
-                else:
-                    status = 'inactive'
+            ssh_keys = self.cleaned_data['ssh_keys'].strip()
+            if self.initial.get('ssh_keys') != ssh_keys:
                 try:
-                    actions.superuser_run('users', [
-                        'set-user-status',
+                    actions.superuser_run('ssh', [
+                        'set-keys',
+                        '--username',
                         user.get_username(),
-                        status,
+                        '--keys',
+                        ssh_keys,
                         '--auth-user',
                         auth_username,
                     ], input=confirm_password.encode())
                 except ActionError:
-                    messages.error(self.request,
-                                   _('Failed to change user status.'))
+                    messages.error(self.request, _('Unable to set SSH keys.'))
 
         return user
 
@@ -352,14 +311,10 @@ class UserChangePasswordForm(PasswordConfirmForm, SetPasswordForm):
         user = super(UserChangePasswordForm, self).save(commit)
         auth_username = self.request.user.username
         if commit:
-            process_input = '{0}\n{1}'.format(
-                self.cleaned_data['new_password1'],
-                self.cleaned_data['confirm_password']).encode()
             try:
-                actions.superuser_run('users', [
-                    'set-user-password',
-                    user.get_username(), '--auth-user', auth_username
-                ], input=process_input)
+                modify_ldap_user(user.get_username(), auth_username,
+                                 self.cleaned_data['confirm_password'],
+                                 password=self.cleaned_data['new_password1'])
             except ActionError:
                 messages.error(self.request,
                                _('Changing LDAP user password failed.'))
@@ -395,10 +350,8 @@ class FirstBootForm(ValidNewUsernameCheckMixin, auth.forms.UserCreationForm):
                         error=error)))
 
             try:
-                actions.superuser_run(
-                    'users',
-                    ['add-user-to-group',
-                     user.get_username(), 'admin'])
+                modify_ldap_user(user.get_username(), '', '',
+                                 groups=['admin'])
             except ActionError as error:
                 messages.error(
                     self.request,
@@ -6,6 +6,7 @@ Test module to exercise user actions.
 it is recommended to run this module with root privileges in a virtual machine.
 """
 
+import json
 import pathlib
 import random
 import re
@@ -443,3 +444,41 @@ def test_user_group_interactions():
             'remove-user-from-group', '--auth-user', admin_user, user1,
             random_group
         ], input=admin_password.encode())
+
+
+def test_modify_user():
+    """Test applying a set of changes to a user in one action call."""
+    _create_admin_if_does_not_exist()
+    admin_user, admin_password = _get_admin_user_password()
+
+    group1, group2, group3 = _create_group(), _create_group(), _random_string()
+    old_username, _ = _create_user(groups=[group1, group2])
+    new_username = _random_string()
+    new_password = 'pass $123'
+    changes = {
+        'username': old_username,
+        'auth_user': admin_user,
+        'auth_password': admin_password,
+        'new_username': new_username,
+        'groups': [group2, group3],
+        'password': new_password,
+    }
+    _call_action(['modify-user'], input=json.dumps(changes).encode())
+    _cleanup_users.remove(old_username)
+    _cleanup_users.add(new_username)
+    _cleanup_groups.add(group3)
+
+    assert not _get_user_groups(old_username)
+    assert sorted(_get_user_groups(new_username)) == sorted([group2, group3])
+    assert _try_login_to_ssh(new_username, new_password)
+
+    # Changing other user's password requires admin credentials
+    other_user, other_password = _create_user()
+    changes = {
+        'username': new_username,
+        'auth_user': other_user,
+        'auth_password': other_password,
+        'password': new_password,
+    }
+    with pytest.raises(subprocess.CalledProcessError):
+        _call_action(['modify-user'], input=json.dumps(changes).encode())
@@ -0,0 +1,109 @@
+# SPDX-License-Identifier: AGPL-3.0-or-later
+"""
+Tests for LDAP directory queries.
+"""
+
+from unittest.mock import Mock, patch
+
+import ldap
+import pytest
+
+from plinth.modules.users import directory
+
+ENTRIES = [
+    ('uid=alice,ou=users,dc=thisbox', {
+        'objectClass': [b'posixAccount', b'inetOrgPerson'],
+        'uid': [b'alice']
+    }),
+    ('uid=bob,ou=users,dc=thisbox', {
+        'objectClass': [b'posixAccount', b'inetOrgPerson'],
+        'uid': [b'bob']
+    }),
+    ('cn=admin,ou=groups,dc=thisbox', {
+        'objectClass': [b'posixGroup'],
+        'cn': [b'admin'],
+        'memberUid': [b'alice']
+    }),
+    ('cn=wiki,ou=groups,dc=thisbox', {
+        'objectClass': [b'posixGroup'],
+        'cn': [b'wiki'],
+        'memberUid': [b'bob', b'alice']
+    }),
+    ('cn=users,ou=groups,dc=thisbox', {
+        'objectClass': [b'posixGroup'],
+        'cn': [b'users'],
+        'memberUid': [b'alice', b'bob']
+    }),
+    ('cn=bit-torrent,ou=groups,dc=thisbox', {
+        'objectClass': [b'posixGroup'],
+        'cn': [b'bit-torrent']
+    }),
+    (None, ['ldap://referral']),
+]
+
+
+@pytest.fixture(name='connection')
+def fixture_connection():
+    """Return a mock LDAP connection used for all new connections."""
+    connection = Mock()
+    connection.search_s.return_value = ENTRIES
+    while not directory._pool.empty():
+        directory._pool.get_nowait()
+
+    with patch('ldap.initialize', return_value=connection) as initialize:
+        connection.initialize = initialize
+        yield connection
+
+
+def test_get_users_with_groups(connection):
+    """Test listing all users with their groups in a single search."""
+    assert directory.get_users_with_groups() == {
+        'alice': ['admin', 'wiki'],
+        'bob': ['wiki']
+    }
+    connection.search_s.assert_called_once()
+    assert connection.search_s.call_args[0][0] == 'dc=thisbox'
+
+
+def test_get_user_groups(connection):
+    """Test getting groups of a user."""
+    connection.search_s.return_value = [ENTRIES[2], ENTRIES[4]]
+    assert directory.get_user_groups('al*ce') == ['admin']
+    filterstr = connection.search_s.call_args[0][2]
+    assert filterstr == r'(&(objectClass=posixGroup)(memberUid=al\2ace))'
+
+
+def test_get_group_users(connection):
+    """Test getting members of a group."""
+    connection.search_s.return_value = [ENTRIES[3]]
+    assert directory.get_group_users('wiki') == ['bob', 'alice']
+
+    connection.search_s.return_value = [ENTRIES[5]]
+    assert directory.get_group_users('bit-torrent') == []
+
+    connection.search_s.return_value = []
+    assert directory.get_group_users('missing') == []
+
+
+def test_connection_reuse(connection):
+    """Test that connections are pooled and reconnected when broken."""
+    directory.get_group_users('admin')
+    directory.get_group_users('admin')
+    connection.initialize.assert_called_once_with('ldapi:///')
+    connection.sasl_non_interactive_bind_s.assert_called_once_with(
+        'EXTERNAL')
+
+    connection.search_s.side_effect = [ldap.SERVER_DOWN(), [ENTRIES[2]]]
+    assert directory.get_group_users('admin') == ['alice']
+    assert connection.initialize.call_count == 2
+    connection.unbind_s.assert_called_once()
+
+
+def test_query_errors(connection):
+    """Test that queries return empty results on errors."""
+    connection.search_s.side_effect = ldap.NO_SUCH_OBJECT()
+    assert directory.get_user_groups('alice') == []
+
+    connection.search_s.side_effect = ldap.SERVER_DOWN()
+    assert directory.get_group_users('admin') == []
+    assert directory.get_users_with_groups() == {}
@@ -33,12 +33,8 @@ def fixture_users_urls():
 
 def action_run(action, options, **kwargs):
     """Action return values."""
-    if action == 'users' and options == ['get-group-users', 'admin']:
-        return 'admin'
     if action == 'ssh' and options[:2] == ['get-keys', '--username']:
         return ''
-    if action == 'users' and options == ['get-user-groups', 'tester']:
-        return ''
 
     return None
 
@@ -54,8 +50,14 @@ def module_patch():
     UsersAndGroups('users-and-groups-minetest',
                    reserved_usernames=['debian-minetest'])
 
+    users_groups = {'admin': ['admin'], 'tester': []}
+
     with patch('pwd.getpwall', return_value=pwd_users),\
-            patch('plinth.actions.superuser_run', side_effect=action_run):
+            patch('plinth.actions.superuser_run', side_effect=action_run),\
+            patch('plinth.modules.users.directory.get_group_users',
+                  return_value=['admin']),\
+            patch('plinth.modules.users.directory.get_users_with_groups',
+                  return_value=users_groups):
         yield
 
 
@@ -19,7 +19,7 @@ from plinth.modules import first_boot
 from plinth.utils import is_user_admin
 from plinth.views import AppView
 
-from . import get_last_admin_user
+from . import directory
 from .forms import (CreateUserForm, FirstBootForm, UserChangePasswordForm,
                     UserUpdateForm)
 
@@ -63,7 +63,16 @@ class UserList(AppView, ContextMixin, django.views.generic.ListView):
 
     def get_context_data(self, *args, **kwargs):
         context = super(UserList, self).get_context_data(*args, **kwargs)
-        context['last_admin_user'] = get_last_admin_user()
+        users_groups = directory.get_users_with_groups()
+        for user in self.object_list:
+            user.ldap_groups = users_groups.get(user.username, [])
+
+        admin_users = [
+            username for username, groups in users_groups.items()
+            if 'admin' in groups
+        ]
+        context['last_admin_user'] = \
+            admin_users[0] if len(admin_users) == 1 else None
         return context
 
 
@@ -198,9 +207,7 @@ class FirstBootView(django.views.generic.CreateView):
         """Add admin users to context data."""
         context = super().get_context_data(*args, **kwargs)
 
-        output = actions.superuser_run('users', ['get-group-users', 'admin'])
-        admin_users = output.strip().split('\n') if output.strip() else []
-        context['admin_users'] = admin_users
+        context['admin_users'] = directory.get_group_users('admin')
 
         return context
 
@@ -64,6 +64,32 @@ class AddClientForm(forms.Form):
         validators=[validate_key])
 
 
+class AddClientsForm(forms.Form):
+    """Form to add many clients at once."""
+    public_keys = forms.CharField(
+        label=_('Public Keys'), widget=forms.Textarea,
+        help_text=_('Public keys of the peers, one per line.'))
+
+    def clean_public_keys(self):
+        """Return a list of valid and unique public keys."""
+        public_keys = [
+            line.strip()
+            for line in self.cleaned_data['public_keys'].splitlines()
+            if line.strip()
+        ]
+        for public_key in public_keys:
+            try:
+                validate_key(public_key)
+            except ValidationError:
+                raise ValidationError(
+                    _('Invalid key: {key}').format(key=public_key))
+
+        if len(set(public_keys)) != len(public_keys):
+            raise ValidationError(_('A public key is listed more than once.'))
+
+        return public_keys
+
+
 class AddServerForm(forms.Form):
     """Form to add server."""
     peer_endpoint = forms.CharField(
@@ -6,7 +6,8 @@ Tests for wireguard module forms.
 import pytest
 from django.core.exceptions import ValidationError
 
-from plinth.modules.wireguard.forms import validate_endpoint, validate_key
+from plinth.modules.wireguard.forms import (AddClientsForm, validate_endpoint,
+                                            validate_key)
 
 
 @pytest.mark.parametrize('key', [
@@ -62,3 +63,16 @@ def test_validate_endpoint_invalid_patterns(endpoint):
     """Test that invalid wireguard endpoint patterns are rejected."""
     with pytest.raises(ValidationError):
         validate_endpoint(endpoint)
+
+
+def test_add_clients_form():
+    """Test that public keys are read one per line and validated."""
+    key1 = 'gKQhVGla4UtdqeY1dQ21G5lqrnX5NFcSEAqzM5iSdl0='
+    key2 = 'uHWSYIjPnS9fYFhZ0mf22IkOMyrWXDlfpXs6ve4QGHk='
+    form = AddClientsForm({'public_keys': ' {}\n\n{} \r\n'.format(key1, key2)})
+    assert form.is_valid()
+    assert form.cleaned_data['public_keys'] == [key1, key2]
+
+    for public_keys in ('{}\ninvalid-key'.format(key1),
+                        '{}\n{}'.format(key1, key1)):
+        assert not AddClientsForm({'public_keys': public_keys}).is_valid()
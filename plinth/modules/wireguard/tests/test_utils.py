@@ -0,0 +1,198 @@
+# SPDX-License-Identifier: AGPL-3.0-or-later
+"""
+Tests for WireGuard utilities.
+"""
+
+import base64
+import json
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from plinth.modules.wireguard import utils
+
+
+def test_public_key_from_private_key():
+    """Test deriving a public key using the test vector from RFC 7748."""
+    private_key = bytes.fromhex(
+        '77076d0a7318a57d3c16c17251b26645df4c2f87ebc0992ab177fba51db92c2a')
+    public_key = bytes.fromhex(
+        '8520f0098930a754748b7ddcb43ef75a0dbf3a0d26381af4eba4a98eaa9b4e6a')
+    assert utils._get_public_key_from_private_key(
+        base64.b64encode(private_key).decode()) == \
+        base64.b64encode(public_key).decode()
+
+    with pytest.raises(ValueError):
+        utils._get_public_key_from_private_key('invalid-key')
+
+
+def test_generate_private_key():
+    """Test that generated private keys are unique and clamped."""
+    key1 = utils._generate_private_key()
+    key2 = utils._generate_private_key()
+    assert key1 != key2
+    assert len(key1) == 44
+    key = base64.b64decode(key1)
+    assert key[0] & 7 == 0
+    assert key[31] & 128 == 0
+    assert key[31] & 64 == 64
+    assert utils._get_public_key_from_private_key(key1)
+
+
+@patch('plinth.network.get_connection_list')
+@patch('socket.if_nameindex')
+def test_find_next_interface(if_nameindex, get_connection_list):
+    """Test finding an interface name not used by links or connections."""
+    if_nameindex.return_value = [(1, 'lo'), (2, 'wg0'), (3, 'wg1')]
+    get_connection_list.return_value = [{'interface_name': 'wg2'}]
+    assert utils._find_next_interface() == 'wg3'
+
+
+@patch('plinth.modules.wireguard.utils.get_nm_info')
+@patch('plinth.actions.superuser_run')
+def test_get_info(superuser_run, get_nm_info):
+    """Test that the status of interfaces is reused for a short time."""
+    superuser_run.return_value = json.dumps({
+        'wg0': {
+            'public_key': 'server-public-key',
+            'peers': [{
+                'public_key': 'client-public-key',
+                'latest_handshake': 1600000000,
+            }]
+        }
+    })
+    get_nm_info.side_effect = lambda: {
+        'wg0': {
+            'private_key': 'server-private-key',
+            'peers': {}
+        }
+    }
+    with patch.object(utils, '_status', {'output': None, 'time': None}):
+        for _ in range(2):
+            info = utils.get_info()
+            server = info['my_server']
+            assert server['public_key'] == 'server-public-key'
+            status = server['peers']['client-public-key']['status']
+            assert status['latest_handshake'].year == 2020
+
+        superuser_run.assert_called_once_with('wireguard', ['get-info'])
+
+        utils.invalidate_status()
+        utils.get_info()
+        assert superuser_run.call_count == 2
+
+
+def _peer(public_key, allowed_ips):
+    """Return a fake WireGuard peer."""
+    peer = MagicMock()
+    peer.get_public_key.return_value = public_key
+    peer.get_allowed_ips_len.return_value = len(allowed_ips)
+    peer.get_allowed_ip.side_effect = lambda index: allowed_ips[index]
+    return peer
+
+
+def test_address_allocator():
+    """Test allocating free addresses in the server subnet."""
+    peers = [
+        _peer('key1', ['10.84.0.2']),
+        _peer('key2', ['10.84.0.4/32']),
+    ]
+    allocator = utils.AddressAllocator(peers)
+    assert allocator.allocate() == ['10.84.0.3']
+    assert allocator.allocate(2) == ['10.84.0.5', '10.84.0.6']
+    with pytest.raises(IndexError):
+        allocator.allocate(250)
+
+    assert len(allocator.allocate(247)) == 247
+    with pytest.raises(IndexError):
+        allocator.allocate()
+
+
+@pytest.fixture(name='server')
+def fixture_server():
+    """Return a fake server connection, its settings and peers."""
+    peers = [_peer('key1', ['10.84.0.2'])]
+
+    def get_peer_by_public_key(public_key):
+        for index, peer in enumerate(peers):
+            if peer.get_public_key() == public_key:
+                return peer, index
+
+        return None, -1
+
+    connection = MagicMock()
+    connection.get_uuid.return_value = 'uuid'
+    settings = connection.get_setting_by_name.return_value
+    settings.get_peers_len.side_effect = lambda: len(peers)
+    settings.get_peer.side_effect = lambda index: peers[index]
+    settings.get_peer_by_public_key.side_effect = get_peer_by_public_key
+    settings.append_peer.side_effect = peers.append
+    settings.remove_peer.side_effect = peers.pop
+    with patch('plinth.modules.wireguard.utils._server_connection',
+               return_value=connection), \
+            patch('plinth.network.reactivate_connection'):
+        yield connection, settings, peers
+
+
+def _new_peer():
+    """Return a fake new WireGuard peer that records its settings."""
+    peer = MagicMock()
+    allowed_ips = []
+    peer.append_allowed_ip.side_effect = \
+        lambda address, _accept_invalid: allowed_ips.append(address)
+    peer.get_allowed_ips_len.side_effect = lambda: len(allowed_ips)
+    peer.get_allowed_ip.side_effect = lambda index: allowed_ips[index]
+    peer.set_public_key.side_effect = \
+        lambda key, _accept_invalid: setattr(peer, 'public_key', key)
+    peer.get_public_key.side_effect = lambda: peer.public_key
+    return peer
+
+
+def test_add_clients(server):
+    """Test adding many clients with a single change."""
+    connection, settings, _ = server
+    with patch.object(utils.nm, 'WireGuardPeer') as wireguard_peer, \
+            patch.object(utils, '_status', {'output': '{}', 'time': 0}):
+        new_peers = [_new_peer() for _ in range(3)]
+        wireguard_peer.new.side_effect = new_peers
+        utils.add_clients(['key2', 'key3', 'key4'])
+        assert utils._status['output'] is None
+
+    keys = ['key2', 'key3', 'key4']
+    addresses = ['10.84.0.3', '10.84.0.4', '10.84.0.5']
+    for peer, key, address in zip(new_peers, keys, addresses):
+        peer.set_public_key.assert_called_once_with(key, False)
+        peer.append_allowed_ip.assert_called_once_with(address, False)
+        settings.append_peer.assert_any_call(peer)
+
+    connection.commit_changes.assert_called_once_with(True)
+    utils.network.reactivate_connection.assert_called_once_with('uuid')
+
+    for public_keys in (['key1'], ['key5', 'key5']):
+        with pytest.raises(ValueError):
+            utils.add_clients(public_keys)
+
+    assert settings.append_peer.call_count == 3
+    connection.commit_changes.assert_called_once_with(True)
+
+
+def test_allocation_follows_peers(server):
+    """Test that addresses are allocated from the current peers."""
+    _, settings, peers = server
+    with patch.object(utils.nm, 'WireGuardPeer') as wireguard_peer:
+        wireguard_peer.new.side_effect = lambda: _new_peer()
+        utils.add_client('key2')
+        assert peers[-1].get_allowed_ip(0) == '10.84.0.3'
+        assert settings.get_peer.call_count == 1
+
+        utils.remove_client('key2')
+        utils.add_client('key3')
+        assert peers[-1].get_allowed_ip(0) == '10.84.0.3'
+
+        # Addresses changed elsewhere are respected
+        peers[0] = _peer('key1', ['10.84.0.4'])
+        utils.add_client('key4')
+        assert peers[-1].get_allowed_ip(0) == '10.84.0.2'
+
+    with pytest.raises(KeyError):
+        utils.remove_client('key2')
@@ -11,6 +11,8 @@ urlpatterns = [
     url(r'^apps/wireguard/$', views.WireguardView.as_view(), name='index'),
     url(r'^apps/wireguard/client/add/$', views.AddClientView.as_view(),
         name='add-client'),
+    url(r'^apps/wireguard/client/add-multiple/$',
+        views.AddClientsView.as_view(), name='add-clients'),
     url(r'^apps/wireguard/client/(?P<public_key>[^/]+)/show/$',
         views.ShowClientView.as_view(), name='show-client'),
     url(r'^apps/wireguard/client/(?P<public_key>[^/]+)/edit/$',
@@ -3,12 +3,18 @@
 Utilities for managing WireGuard.
 """
 
+import base64
 import datetime
+import heapq
 import json
 import logging
-import subprocess
+import socket
+import threading
 import time
 
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import x25519
+
 from plinth import actions, network
 from plinth.utils import import_from_gi
 
@@ -16,6 +22,12 @@ nm = import_from_gi('NM', '1.0')
 
 IP_TEMPLATE = '10.84.0.{}'
 
+# Number of seconds for which the status of interfaces and peers is reused
+STATUS_TIMEOUT = 5
+
+_status = {'output': None, 'time': None}
+_status_lock = threading.Lock()
+
 logger = logging.getLogger(__name__)
 
 
@@ -66,10 +78,31 @@ def get_nm_info():
     return connections
 
 
+def _get_status():
+    """Return status of interfaces and peers reusing a recent result.
+
+    Reading peers and their transfer statistics from the kernel needs
+    privileges, so all interfaces are read with a single action.
+    """
+    with _status_lock:
+        if _status['output'] is None or \
+           time.monotonic() - _status['time'] > STATUS_TIMEOUT:
+            _status['output'] = actions.superuser_run('wireguard',
+                                                      ['get-info'])
+            _status['time'] = time.monotonic()
+
+        return json.loads(_status['output'])
+
+
+def invalidate_status():
+    """Forget the status of interfaces after a change in configuration."""
+    with _status_lock:
+        _status['output'] = None
+
+
 def get_info():
     """Return server and clients info."""
-    output = actions.superuser_run('wireguard', ['get-info'])
-    status = json.loads(output)
+    status = _get_status()
 
     nm_info = get_nm_info()
 
@@ -127,24 +160,35 @@ def enable_connections(enable):
             except network.ConnectionNotFound:
                 pass  # Connection is already inactive
 
+    invalidate_status()
+
 
 def _get_public_key_from_private_key(private_key):
-    process = subprocess.run(['wg', 'pubkey'], check=True, capture_output=True,
-                             input=private_key.encode())
-    return process.stdout.decode()
+    """Return the base64 encoded public key for a private key."""
+    key = x25519.X25519PrivateKey.from_private_bytes(
+        base64.b64decode(private_key))
+    public_key = key.public_key().public_bytes(
+        serialization.Encoding.Raw, serialization.PublicFormat.Raw)
+    return base64.b64encode(public_key).decode()
 
 
 def _generate_private_key():
-    """Return a private key generated by 'wg' command."""
-    process = subprocess.run(['wg', 'genkey'], check=True, capture_output=True)
-    return process.stdout.decode().strip()
+    """Return a new base64 encoded private key as 'wg genkey' does."""
+    key = x25519.X25519PrivateKey.generate().private_bytes(
+        serialization.Encoding.Raw, serialization.PrivateFormat.Raw,
+        serialization.NoEncryption())
+    key = bytearray(key)
+    # Clamp the key as described in RFC 7748
+    key[0] &= 248
+    key[31] = (key[31] & 127) | 64
+    return base64.b64encode(bytes(key)).decode()
 
 
 def _find_next_interface():
     """Find next unused wireguard interface name."""
-    output = subprocess.check_output(['wg', 'show',
-                                      'interfaces']).decode().strip()
-    interfaces = output.split()
+    interfaces = {name for _, name in socket.if_nameindex()}
+    interfaces.update(connection['interface_name']
+                      for connection in network.get_connection_list())
     interface_num = 1
     new_interface_name = 'wg1'
     while new_interface_name in interfaces:
@@ -166,6 +210,7 @@ def add_server(settings):
         settings['wireguard']['private_key'] = _generate_private_key()
 
     network.add_connection(settings)
+    invalidate_status()
 
 
 def edit_server(interface, settings):
@@ -178,6 +223,7 @@ def edit_server(interface, settings):
     connection = network.get_connection_by_interface_name(interface)
     network.edit_connection(connection, settings)
     network.reactivate_connection(connection.get_uuid())
+    invalidate_status()
 
 
 def setup_server():
@@ -211,22 +257,47 @@ def setup_server():
     logger.info('Created new WireGuard server connection')
 
 
-def _get_next_available_ip_address(settings):
-    """Get the next available IP address to allocate to a client."""
-    allocated_ips = set()
-    for peer_index in range(settings.get_peers_len()):
-        peer = settings.get_peer(peer_index)
-        for ip_index in range(peer.get_allowed_ips_len()):
-            allowed_ip = peer.get_allowed_ip(ip_index)
-            # We assume these are simple IP addresses but they can be subnets.
-            allocated_ips.add(allowed_ip)
+class AddressAllocator:
+    """Allocate IP addresses to clients in the subnet of the server.
+
+    The addresses used by existing peers are collected in a single pass. Free
+    addresses are then handed out, lowest first, without looking at other
+    peers again.
+    """
+
+    def __init__(self, peers):
+        """Initialize the allocator from a list of WireGuard peers."""
+        allocated_ips = set()
+        for peer in peers:
+            allocated_ips.update(_get_peer_addresses(peer))
 
-    for index in range(2, 254):
-        ip_address = IP_TEMPLATE.format(index)
-        if ip_address not in allocated_ips:
-            return ip_address
+        self._free = [
+            index for index in range(2, 254)
+            if IP_TEMPLATE.format(index) not in allocated_ips
+        ]
 
-    raise IndexError('Reached client limit')
+    def allocate(self, count=1):
+        """Return a list of free addresses and mark them as used.
+
+        Raise IndexError if not enough addresses are free. No addresses are
+        used in that case.
+        """
+        if count > len(self._free):
+            raise IndexError('Reached client limit')
+
+        return [
+            IP_TEMPLATE.format(heapq.heappop(self._free))
+            for _ in range(count)
+        ]
+
+
+def _get_peer_addresses(peer):
+    """Return the addresses allowed for a WireGuard peer."""
+    # We assume these are simple IP addresses but they can be subnets.
+    return [
+        peer.get_allowed_ip(ip_index).split('/')[0]
+        for ip_index in range(peer.get_allowed_ips_len())
+    ]
 
 
 def _server_connection():
@@ -255,22 +326,42 @@ def _server_connection():
     return connection
 
 
-def add_client(public_key):
-    """Add a permission for a client to connect our server."""
+def add_clients(public_keys):
+    """Add permissions for clients to connect our server in one change.
+
+    Raise ValueError if a peer with one of the public keys already exists.
+    Raise IndexError if there are not enough free addresses. No clients are
+    added in either case.
+    """
     setting_name = nm.SETTING_WIREGUARD_SETTING_NAME
     connection = _server_connection()
     settings = connection.get_setting_by_name(setting_name)
-    peer, _ = settings.get_peer_by_public_key(public_key)
-    if peer:
+    public_keys = list(public_keys)
+    if len(set(public_keys)) != len(public_keys) or any(
+            settings.get_peer_by_public_key(public_key)[0]
+            for public_key in public_keys):
         raise ValueError('Peer with public key already exists')
 
-    peer = nm.WireGuardPeer.new()
-    peer.set_public_key(public_key, False)
-    peer.set_persistent_keepalive(25)  # To keep NAT 'connections' alive
-    peer.append_allowed_ip(_get_next_available_ip_address(settings), False)
-    settings.append_peer(peer)
+    peers = [
+        settings.get_peer(index) for index in range(settings.get_peers_len())
+    ]
+    addresses = AddressAllocator(peers).allocate(len(public_keys))
+    for public_key, address in zip(public_keys, addresses):
+        peer = nm.WireGuardPeer.new()
+        peer.set_public_key(public_key, False)
+        # To keep NAT 'connections' alive
+        peer.set_persistent_keepalive(25)
+        peer.append_allowed_ip(address, False)
+        settings.append_peer(peer)
+
     connection.commit_changes(True)
     network.reactivate_connection(connection.get_uuid())
+    invalidate_status()
+
+
+def add_client(public_key):
+    """Add a permission for a client to connect our server."""
+    add_clients([public_key])
 
 
 def remove_client(public_key):
@@ -285,3 +376,4 @@ def remove_client(public_key):
     settings.remove_peer(peer_index)
     connection.commit_changes(True)
     network.reactivate_connection(connection.get_uuid())
+    invalidate_status()
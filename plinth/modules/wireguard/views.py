@@ -61,6 +61,37 @@ class AddClientView(SuccessMessageMixin, FormView):
         return super().form_valid(form)
 
 
+class AddClientsView(SuccessMessageMixin, FormView):
+    """View to add many clients at once."""
+    form_class = forms.AddClientsForm
+    template_name = 'wireguard_add_clients.html'
+    success_url = reverse_lazy('wireguard:index')
+    success_message = _('Added new clients.')
+
+    def get_context_data(self, **kwargs):
+        """Return additional context for rendering the template."""
+        context = super().get_context_data(**kwargs)
+        context['title'] = _('Add Allowed Clients')
+        return context
+
+    def form_valid(self, form):
+        """Add the clients."""
+        public_keys = form.cleaned_data.get('public_keys')
+        try:
+            utils.add_clients(public_keys)
+        except ValueError:
+            messages.warning(
+                self.request,
+                _('Client with one of the public keys already exists'))
+            return redirect('wireguard:index')
+        except IndexError:
+            messages.error(self.request,
+                           _('Not enough free addresses for the clients'))
+            return redirect('wireguard:index')
+
+        return super().form_valid(form)
+
+
 class ShowClientView(SuccessMessageMixin, TemplateView):
     """View to show a client's details."""
     template_name = 'wireguard_show_client.html'
@@ -250,5 +281,6 @@ class DeleteServerView(SuccessMessageMixin, TemplateView):
         """Delete the server."""
         connection = network.get_connection_by_interface_name(interface)
         network.delete_connection(connection.get_uuid())
+        utils.invalidate_status()
         messages.success(request, _('Server deleted.'))
         return redirect('wireguard:index')
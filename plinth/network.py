@@ -4,6 +4,7 @@ Helper functions for working with network manager.
 """
 
 import collections
+import copy
 import logging
 import socket
 import struct
@@ -21,6 +22,19 @@ logger = logging.getLogger(__name__)
 
 _client = None
 
+_snapshot = None
+
+_update_pending = False
+
+# Time of the latest Wi-Fi scan, of the latest request to scan and of the
+# latest failure to start scanning, and the time at which each interface that
+# is still scanning was asked to scan
+_wifi_scan = {'time': None, 'requested': None, 'failed': None, 'pending': {}}
+
+# Number of seconds after which an interface that has not finished scanning is
+# no longer waited for
+WIFI_SCAN_TIMEOUT = 30
+
 ZONES = [('external', _('External')), ('internal', _('Internal'))]
 
 CONNECTION_TYPE_NAMES = collections.OrderedDict([
@@ -41,6 +55,70 @@ class DeviceNotFound(Exception):
     pass
 
 
+class Snapshot:
+    """Status of connections and devices at a point in time.
+
+    A snapshot is built on the GLib thread and never changes afterwards. It
+    can be read from any thread. Copies of the status dictionaries are
+    returned so that callers may modify them.
+    """
+
+    def __init__(self, connections, active_connections, devices):
+        """Initialize the snapshot.
+
+        connections and active_connections map connection UUIDs to status
+        dictionaries. devices maps interface names to status dictionaries.
+        """
+        self._connections = connections
+        self._active_connections = active_connections
+        self._devices = devices
+
+    def get_connection_list(self):
+        """Return a list of connections, active connections first."""
+        connections = [{
+            'name': status['id'],
+            'uuid': status['uuid'],
+            'interface_name': status['interface_name'],
+            'type': status['type'],
+            'type_name': status['type_name'],
+            'is_active': status['uuid'] in self._active_connections,
+            'primary': status['primary'],
+            'zone': status['zone'],
+        } for status in self._connections.values()]
+        connections.sort(key=lambda connection: connection['is_active'],
+                         reverse=True)
+        return connections
+
+    def get_connection(self, connection_uuid):
+        """Return status of a connection.
+
+        Raise ConnectionNotFound if a connection with that uuid is not
+        found.
+        """
+        try:
+            return copy.deepcopy(self._connections[connection_uuid])
+        except KeyError:
+            raise ConnectionNotFound(connection_uuid)
+
+    def get_active_connection(self, connection_uuid):
+        """Return status of an active connection.
+
+        Raise ConnectionNotFound if the connection is not active.
+        """
+        try:
+            return copy.deepcopy(self._active_connections[connection_uuid])
+        except KeyError:
+            raise ConnectionNotFound(connection_uuid)
+
+    def get_device(self, interface_name):
+        """Return status of a device or None if it is not found."""
+        return copy.deepcopy(self._devices.get(interface_name))
+
+    def get_devices(self):
+        """Return a list with status of all devices."""
+        return copy.deepcopy(list(self._devices.values()))
+
+
 def ipv4_string_to_int(address):
     """Return an integer equivalent of a string contain IPv4 address."""
     return struct.unpack('=I', socket.inet_aton(address))[0]
@@ -59,6 +137,7 @@ def init():
         global _client
         _client = nm.Client.new_finish(result)
         logger.info('Created Network manager client')
+        _watch_client(_client)
 
     logger.info('Creating network manager client')
     nm.Client.new_async(None, new_callback, None)
@@ -72,6 +151,98 @@ def get_nm_client():
     raise Exception('Client not yet ready')
 
 
+def get_snapshot():
+    """Return the latest snapshot of connections and devices."""
+    if _snapshot:
+        return _snapshot
+
+    raise Exception('Client not yet ready')
+
+
+def _build_snapshot(client):
+    """Return a new snapshot from the objects of a client."""
+    active_connections = {}
+    for active_connection in client.get_active_connections():
+        status = get_status_from_active_connection(active_connection)
+        status['devices'] = [
+            device.get_iface()
+            for device in active_connection.get_devices() or []
+        ]
+        active_connections[active_connection.get_uuid()] = status
+
+    connections = {}
+    for connection in client.get_connections():
+        status = get_status_from_connection(connection)
+        # Display a friendly type name if known.
+        status['type_name'] = CONNECTION_TYPE_NAMES.get(
+            status['type'], status['type'])
+        connections[status['uuid']] = status
+
+    devices = {}
+    for device in client.get_devices():
+        status = get_status_from_device(device)
+        devices[status['interface_name']] = status
+
+    return Snapshot(connections, active_connections, devices)
+
+
+def _update_snapshot(_user_data=None):
+    """Replace the snapshot with a newly built one."""
+    global _snapshot, _update_pending
+    _update_pending = False
+    _snapshot = _build_snapshot(_client)
+    return False  # Don't repeat
+
+
+def _schedule_update(*_args):
+    """Rebuild the snapshot once the current batch of events is handled."""
+    global _update_pending
+    if not _update_pending:
+        _update_pending = True
+        glib.idle_add(_update_snapshot, None)
+
+
+def _watch_object(_source, nm_object, signal):
+    """Rebuild the snapshot when an object emits a signal."""
+    nm_object.connect(signal, _schedule_update)
+    _schedule_update()
+
+
+def _watch_device(_source, device):
+    """Rebuild the snapshot when a device changes or finishes scanning."""
+    device.connect('notify', _schedule_update)
+    if device.get_device_type() == nm.DeviceType.WIFI:
+        device.connect('notify::last-scan', _on_wifi_scanned)
+
+    _schedule_update()
+
+
+def _watch_client(client):
+    """Keep the snapshot updated from signals emitted by a client.
+
+    Signals are emitted on the GLib thread which created the client. This is
+    the only thread that reads libnm objects to build snapshots.
+    """
+    client.connect('connection-added', _watch_object, 'changed')
+    client.connect('connection-removed', _schedule_update)
+    client.connect('active-connection-added', _watch_object, 'notify')
+    client.connect('active-connection-removed', _schedule_update)
+    client.connect('device-added', _watch_device)
+    client.connect('device-removed', _on_device_removed)
+    client.connect('notify::primary-connection', _schedule_update)
+
+    for connection in client.get_connections():
+        connection.connect('changed', _schedule_update)
+
+    for active_connection in client.get_active_connections():
+        active_connection.connect('notify', _schedule_update)
+
+    for device in client.get_devices():
+        _watch_device(client, device)
+
+    _update_snapshot()
+
+
 def _callback(source_object, result, user_data):
     """Called when an operation is completed."""
     del source_object  # Unused
@@ -106,8 +277,13 @@ def get_status_from_connection(connection):
     status['interface_name'] = connection.get_interface_name()
     status['primary'] = _is_primary(connection)
 
-    status['ipv4']['method'] = connection.get_setting_ip4_config().get_method()
-    status['ipv6']['method'] = connection.get_setting_ip6_config().get_method()
+    settings_ipv4 = connection.get_setting_ip4_config()
+    if settings_ipv4:
+        status['ipv4']['method'] = settings_ipv4.get_method()
+
+    settings_ipv6 = connection.get_setting_ip6_config()
+    if settings_ipv6:
+        status['ipv6']['method'] = settings_ipv6.get_method()
 
     if status['type'] == '802-11-wireless':
         setting_wireless = connection.get_setting_wireless()
@@ -164,6 +340,11 @@ def get_status_from_device(device):
     if device.get_device_type() == nm.DeviceType.WIFI:
         status['wireless']['bitrate'] = device.get_bitrate() / 1000
         status['wireless']['mode'] = device.get_mode().value_nick
+        status['wireless']['access_points'] = [{
+            'ssid': _get_ssid(access_point),
+            'strength': access_point.get_strength(),
+            'frequency': access_point.get_frequency(),
+        } for access_point in device.get_access_points()]
 
     if device.get_device_type() == nm.DeviceType.ETHERNET:
         status['ethernet']['speed'] = device.get_speed()
@@ -172,24 +353,38 @@ def get_status_from_device(device):
     return status
 
 
-def get_status_from_wifi_access_point(device, ssid):
-    """Return the current status of an access point."""
+def get_status_from_wifi_access_point(device_status, ssid):
+    """Return the current status of an access point.
+
+    device_status is the status of a Wi-Fi device as returned by
+    get_status_from_device().
+    """
     status = {}
 
-    if not ssid or not device:
+    if not ssid or not device_status:
         return status
 
-    for access_point in device.get_access_points():
-        if access_point and access_point.get_ssid() and \
-           access_point.get_ssid().get_data() == ssid:
-            status['strength'] = access_point.get_strength()
-            frequency = access_point.get_frequency()
+    for access_point in device_status['wireless']['access_points']:
+        if access_point['ssid'] == ssid:
+            status['strength'] = access_point['strength']
+            frequency = access_point['frequency']
             status['channel'] = _get_wifi_channel_from_frequency(frequency)
             break
 
     return status
 
 
+def _get_ssid(access_point):
+    """Return the bytes in SSID of an access point.
+
+    Don't convert to utf-8 or escape it in any way as it may contain null
+    bytes. When this is used in the URL it will be escaped properly and
+    unescaped when taken as view function's argument.
+    """
+    ssid = access_point.get_ssid()
+    return ssid.get_data() if ssid else ''
+
+
 def _get_wifi_channel_from_frequency(frequency):
     """Get the wifi channel form a particular SSID"""
     # TODO: Hard coded list of wifi frequencys and their corresponding
@@ -217,40 +412,7 @@ def _get_wifi_channel_from_frequency(frequency):
 
 def get_connection_list():
     """Get a list of active and available connections."""
-    client = get_nm_client()
-    primary_connection = client.get_primary_connection()
-
-    active_uuids = []
-    for connection in client.get_active_connections():
-        active_uuids.append(connection.get_uuid())
-
-    connections = []
-    for connection in client.get_connections():
-        # Display a friendly type name if known.
-        connection_type = connection.get_connection_type()
-        connection_type_name = CONNECTION_TYPE_NAMES.get(
-            connection_type, connection_type)
-
-        settings_connection = connection.get_setting_connection()
-        zone = settings_connection.get_zone()
-
-        connection.get_interface_name()
-
-        connections.append({
-            'name': connection.get_id(),
-            'uuid': connection.get_uuid(),
-            'interface_name': connection.get_interface_name(),
-            'type': connection_type,
-            'type_name': connection_type_name,
-            'is_active': connection.get_uuid() in active_uuids,
-            'primary':
-                (primary_connection
-                 and primary_connection.get_uuid() == connection.get_uuid()),
-            'zone': zone,
-        })
-    connections.sort(key=lambda connection: connection['is_active'],
-                     reverse=True)
-    return connections
+    return get_snapshot().get_connection_list()
 
 
 def get_connection(connection_uuid):
@@ -596,24 +758,112 @@ def delete_connection(connection_uuid):
     return name
 
 
+def has_wifi_devices():
+    """Return whether there are any Wi-Fi devices."""
+    return any('access_points' in device['wireless']
+               for device in get_snapshot().get_devices())
+
+
 def wifi_scan():
-    """Scan for available access points across all Wi-Fi devices."""
-    access_points = []
-    for device in get_nm_client().get_devices():
-        if device.get_device_type() != nm.DeviceType.WIFI:
+    """Return access points found by the latest scans of Wi-Fi devices.
+
+    Access points with the same SSID are listed once with the strongest
+    signal, strongest first.
+    """
+    access_points = {}
+    for device in get_snapshot().get_devices():
+        if 'access_points' not in device['wireless']:
             continue
 
-        for access_point in device.get_access_points():
-            # Retrieve the bytes in SSID.  Don't convert to utf-8 or
-            # escape it in any way as it may contain null bytes.  When
-            # this is used in the URL it will be escaped properly and
-            # unescaped when taken as view function's argument.
-            ssid = access_point.get_ssid()
-            ssid_string = ssid.get_data() if ssid else ''
-            access_points.append({
-                'interface_name': device.get_iface(),
-                'ssid': ssid_string,
-                'strength': access_point.get_strength()
-            })
-
-    return access_points
+        for access_point in device['wireless']['access_points']:
+            ssid = access_point['ssid']
+            if ssid not in access_points or \
+               access_points[ssid]['strength'] < access_point['strength']:
+                access_points[ssid] = {
+                    'interface_name': device['interface_name'],
+                    'ssid': ssid,
+                    'strength': access_point['strength']
+                }
+
+    return sorted(access_points.values(),
+                  key=lambda access_point: access_point['strength'],
+                  reverse=True)
+
+
+def get_wifi_scan_status():
+    """Return the times of the latest Wi-Fi scan, request to scan and failure.
+
+    Also return the interfaces that are still scanning. Interfaces that were
+    asked to scan more than WIFI_SCAN_TIMEOUT seconds ago are not included.
+    """
+    status = _wifi_scan
+    return dict(status, pending=_get_scanning_interfaces(status['pending']))
+
+
+def _get_scanning_interfaces(pending):
+    """Return interfaces asked to scan that have not timed out."""
+    now = time.time()
+    return frozenset(interface for interface, requested in pending.items()
+                     if now - requested <= WIFI_SCAN_TIMEOUT)
+
+
+def _stop_waiting_for_scan(interface, **kwargs):
+    """Forget that an interface is scanning and update the scan status."""
+    global _wifi_scan
+    pending = {
+        other: requested
+        for other, requested in _wifi_scan['pending'].items()
+        if other != interface
+    }
+    _wifi_scan = dict(_wifi_scan, pending=pending, **kwargs)
+
+
+def request_wifi_scan():
+    """Start scanning for access points on all Wi-Fi devices.
+
+    Return immediately. Results appear in the snapshot as each device
+    finishes scanning.
+    """
+    glib.idle_add(_request_wifi_scan, None)
+
+
+def _request_wifi_scan(_user_data):
+    """Request a scan from all Wi-Fi devices not already scanning."""
+    global _wifi_scan
+    now = time.time()
+    scanning = _get_scanning_interfaces(_wifi_scan['pending'])
+    pending = {
+        interface: requested
+        for interface, requested in _wifi_scan['pending'].items()
+        if interface in scanning
+    }
+    for device in get_nm_client().get_devices():
+        if device.get_device_type() == nm.DeviceType.WIFI and \
+           device.get_iface() not in pending:
+            device.request_scan_async(None, _on_wifi_scan_requested, None)
+            pending[device.get_iface()] = now
+
+    _wifi_scan = dict(_wifi_scan, requested=now, pending=pending)
+    return False  # Don't repeat
+
+
+def _on_wifi_scan_requested(device, result, _user_data):
+    """Stop waiting for a device if it could not start scanning."""
+    try:
+        device.request_scan_finish(result)
+    except glib.Error as exception:
+        logger.warning('Unable to scan for Wi-Fi networks on %s: %s',
+                       device.get_iface(), exception)
+        _stop_waiting_for_scan(device.get_iface(), failed=time.time())
+
+
+def _on_wifi_scanned(device, _pspec):
+    """Collect access points when a device has finished scanning."""
+    _stop_waiting_for_scan(device.get_iface(), time=time.time())
+    _schedule_update()
+
+
+def _on_device_removed(_client, device):
+    """Stop waiting for a removed device to finish scanning."""
+    _stop_waiting_for_scan(device.get_iface())
+    _schedule_update()
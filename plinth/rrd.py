@@ -0,0 +1,216 @@
+# SPDX-License-Identifier: AGPL-3.0-or-later
+"""
+Store time series in round robin files of fixed size.
+
+A round robin file holds a fixed number of records in each of its archives.
+The first archive receives every record appended. When a record starts a new
+step of the next archive, the records of the previous step are averaged into
+one record of the next archive, and so on. This keeps recent data at full
+resolution and older data downsampled while the file never grows. Records are
+the time followed by one value per field, all stored as doubles.
+"""
+
+import array
+import os
+import struct
+import tempfile
+import threading
+import time
+
+_MAGIC = b'PLRR'
+_VERSION = 1
+
+# Magic, version, number of archives, number of fields
+_HEADER = struct.Struct('=4sHHI')
+
+# Step in seconds, size, index of the next record and number of records
+_ARCHIVE = struct.Struct('=IIII')
+
+_DOUBLE_SIZE = array.array('d').itemsize
+
+
+class RoundRobinFile:
+    """A file with fixed size archives of records at different steps."""
+
+    def __init__(self, path, fields, archives):
+        """Initialize with a list of field names and (step, size) of archives.
+
+        Each archive after the first one must have a step that is a multiple
+        of the previous archive's step.
+        """
+        self.path = path
+        self.fields = tuple(fields)
+        self.archives = [tuple(archive) for archive in archives]
+        self._record_length = 1 + len(self.fields)
+        self._lock = threading.Lock()
+
+        offset = _HEADER.size + _ARCHIVE.size * len(self.archives)
+        self._offsets = []
+        for _, size in self.archives:
+            self._offsets.append(offset)
+            offset += size * self._record_length * _DOUBLE_SIZE
+
+        self._file_size = offset
+
+    def append(self, time_, values):
+        """Add a record and downsample it into the following archives."""
+        record = (time_, ) + tuple(values)
+        if len(record) != self._record_length:
+            raise ValueError('Expected values for {}'.format(self.fields))
+
+        with self._lock:
+            state = self._load()
+            if state is None:
+                state = self._create()
+
+            with open(self.path, 'r+b') as file_handle:
+                self._append(file_handle, state, 0, record)
+                file_handle.seek(_HEADER.size)
+                for (step, size), (next_, count) in zip(self.archives, state):
+                    file_handle.write(_ARCHIVE.pack(step, size, next_, count))
+
+    def read(self, since=None, archive=None):
+        """Return the records of an archive, oldest first, after a time.
+
+        By default, the archive with the finest step that goes back to the
+        given time is used. Records are (time, value, ...) tuples.
+        """
+        if archive is None:
+            archive = self._choose_archive(since)
+
+        with self._lock:
+            state = self._load()
+            if state is None:
+                return []
+
+            with open(self.path, 'rb') as file_handle:
+                records = self._read_archive(file_handle, state, archive)
+
+        if since is None:
+            return records
+
+        return [record for record in records if record[0] > since]
+
+    def _choose_archive(self, since):
+        """Return the index of the finest archive covering a time."""
+        if since is None:
+            return 0
+
+        now = time.time()
+        for index, (step, size) in enumerate(self.archives):
+            if now - step * size <= since:
+                return index
+
+        return len(self.archives) - 1
+
+    def _load(self):
+        """Return [next, count] of each archive or None if not usable.
+
+        A file of another version or with different fields or archives is
+        not usable.
+        """
+        try:
+            with open(self.path, 'rb') as file_handle:
+                size = os.fstat(file_handle.fileno()).st_size
+                data = file_handle.read(self._offsets[0])
+        except FileNotFoundError:
+            return None
+
+        if size != self._file_size or len(data) != self._offsets[0]:
+            return None
+
+        magic, version, archives, fields = _HEADER.unpack_from(data)
+        if (magic, version, archives, fields) != \
+           (_MAGIC, _VERSION, len(self.archives), len(self.fields)):
+            return None
+
+        state = []
+        for index, archive in enumerate(self.archives):
+            step, size, next_, count = _ARCHIVE.unpack_from(
+                data, _HEADER.size + index * _ARCHIVE.size)
+            if (step, size) != archive or next_ >= size or count > size:
+                return None
+
+            state.append([next_, count])
+
+        return state
+
+    def _create(self):
+        """Write an empty file replacing an unusable one, return state."""
+        directory = os.path.dirname(self.path)
+        os.makedirs(directory, exist_ok=True)
+        with tempfile.NamedTemporaryFile(dir=directory, delete=False) as file_:
+            file_.write(
+                _HEADER.pack(_MAGIC, _VERSION, len(self.archives),
+                             len(self.fields)))
+            for step, size in self.archives:
+                file_.write(_ARCHIVE.pack(step, size, 0, 0))
+
+            file_.truncate(self._file_size)
+
+        os.replace(file_.name, self.path)
+        return [[0, 0] for _ in self.archives]
+
+    def _append(self, file_handle, state, index, record):
+        """Write a record to an archive and consolidate the one before."""
+        size = self.archives[index][1]
+        next_, count = state[index]
+        previous = None
+        if count:
+            previous = self._read_records(file_handle, index,
+                                          (next_ - 1) % size, 1)[0]
+
+        self._write_record(file_handle, index, next_, record)
+        state[index] = [(next_ + 1) % size, min(count + 1, size)]
+
+        if index + 1 == len(self.archives) or previous is None:
+            return
+
+        step = self.archives[index + 1][0]
+        bucket = previous[0] // step
+        if bucket == record[0] // step:
+            return
+
+        records = [
+            record_
+            for record_ in self._read_archive(file_handle, state, index)
+            if record_[0] // step == bucket
+        ]
+        average = tuple(
+            sum(column) / len(records) for column in zip(*records))
+        self._append(file_handle, state, index + 1,
+                     (bucket * step, ) + average[1:])
+
+    def _read_archive(self, file_handle, state, index):
+        """Return all the records of an archive, oldest first."""
+        size = self.archives[index][1]
+        next_, count = state[index]
+        start = (next_ - count) % size
+        if start + count <= size:
+            return self._read_records(file_handle, index, start, count)
+
+        return self._read_records(file_handle, index, start,
+                                  size - start) + self._read_records(
+                                      file_handle, index, 0, next_)
+
+    def _read_records(self, file_handle, index, start, count):
+        """Return a number of consecutive records of an archive."""
+        values = array.array('d')
+        file_handle.seek(self._get_offset(index, start))
+        values.frombytes(
+            file_handle.read(count * self._record_length * _DOUBLE_SIZE))
+        length = self._record_length
+        return [
+            tuple(values[position:position + length])
+            for position in range(0, len(values), length)
+        ]
+
+    def _write_record(self, file_handle, index, position, record):
+        """Write a record at a position of an archive."""
+        file_handle.seek(self._get_offset(index, position))
+        file_handle.write(array.array('d', record).tobytes())
+
+    def _get_offset(self, index, position):
+        """Return the offset in the file of a record of an archive."""
+        return self._offsets[index] + \
+            position * self._record_length * _DOUBLE_SIZE
@@ -464,6 +464,10 @@ def backup_create(browser, app_name, archive_name=None):
     browser.find_by_value(app_name).first.check()
     submit(browser)
 
+    # Backups run in the background, wait until done
+    eventually(lambda: '/sys/backups/operations/' not in browser.url,
+               timeout=120)
+
 
 def backup_restore(browser, app_name, archive_name=None):
     nav_to_module(browser, 'backups')
@@ -0,0 +1,76 @@
+# SPDX-License-Identifier: AGPL-3.0-or-later
+"""
+Test module for the service action.
+"""
+
+import imp
+import json
+import pathlib
+from unittest.mock import patch
+
+import pytest
+
+
+def _action_file():
+    """Return the path to the 'service' actions file."""
+    current_directory = pathlib.Path(__file__).parent
+    return str(current_directory / '..' / '..' / 'actions' / 'service')
+
+
+service_actions = imp.load_source('service', _action_file())
+
+
+@pytest.fixture(name='index_file')
+def fixture_index_file(tmp_path):
+    """Use temporary modules-enabled directory and index file."""
+    config_path = tmp_path / 'modules-enabled'
+    config_path.mkdir()
+    for module in ('tor', 'privoxy'):
+        (config_path / module).write_text(f'plinth.modules.{module}\n')
+
+    (config_path / '.hidden').write_text('plinth.modules.openvpn\n')
+    index_file = tmp_path / 'index' / 'managed-services.json'
+    with patch.object(service_actions, 'module_config_path',
+                      str(config_path)), \
+            patch.object(service_actions, 'MANAGED_SERVICES_INDEX',
+                         str(index_file)):
+        yield index_file
+
+
+def test_managed_services(index_file):
+    """Test that managed services are collected and indexed."""
+    services = service_actions._get_managed_services()
+    assert services == {'tor@plinth', 'privoxy'}
+    index = json.loads(index_file.read_text())
+    assert index['services'] == ['privoxy', 'tor@plinth']
+    assert set(index['modules']) == {
+        'plinth.modules.tor', 'plinth.modules.privoxy'
+    }
+
+
+def test_managed_services_index(index_file):
+    """Test that the index is used until modules change."""
+    service_actions._get_managed_services()
+    with patch.object(service_actions,
+                      '_get_managed_services_of_module') as get_services:
+        assert service_actions._get_managed_services() == {
+            'tor@plinth', 'privoxy'
+        }
+        get_services.assert_not_called()
+
+        index_file.chmod(0o666)
+        service_actions._get_managed_services()
+        assert get_services.call_count == 2
+
+        get_services.reset_mock()
+        (pathlib.Path(service_actions.module_config_path) /
+         'openvpn').write_text('plinth.modules.openvpn\n')
+        service_actions._get_managed_services()
+        assert get_services.call_count == 3
+
+
+def test_assert_service_is_managed(index_file):
+    """Test that only managed services are allowed."""
+    service_actions._assert_service_is_managed_by_plinth('privoxy')
+    with pytest.raises(ValueError):
+        service_actions._assert_service_is_managed_by_plinth('ssh')
@@ -0,0 +1,54 @@
+# SPDX-License-Identifier: AGPL-3.0-or-later
+"""
+Test module for action utilities.
+"""
+
+import pytest
+
+from plinth.action_utils import read_file_tail
+
+
+@pytest.fixture(name='log_file')
+def fixture_log_file(tmp_path):
+    """Return path to a log file with 100 numbered lines."""
+    path = tmp_path / 'test.log'
+    path.write_text(''.join(f'line {number}\n' for number in range(100)))
+    return path
+
+
+@pytest.mark.parametrize('block_size', [1, 7, 65536])
+def test_read_file_tail(log_file, block_size):
+    """Test reading the last lines of a file."""
+    result = read_file_tail(str(log_file), lines=3, block_size=block_size)
+    assert result['lines'] == ['line 97', 'line 98', 'line 99']
+    assert result['end'] == result['size'] == log_file.stat().st_size
+    assert result['start'] == result['size'] - len('line 97\n') * 3
+
+
+@pytest.mark.parametrize('block_size', [1, 7, 65536])
+def test_read_file_tail_paging(log_file, block_size):
+    """Test that reading pages backwards returns all lines."""
+    lines = []
+    before = None
+    while before != 0:
+        result = read_file_tail(str(log_file), lines=30, before=before,
+                                block_size=block_size)
+        lines = result['lines'] + lines
+        before = result['start']
+
+    assert lines == [f'line {number}' for number in range(100)]
+
+
+def test_read_file_tail_filter(log_file):
+    """Test reading only lines matching a pattern."""
+    result = read_file_tail(str(log_file), lines=3, pattern='5')
+    assert result['lines'] == ['line 75', 'line 85', 'line 95']
+
+    result = read_file_tail(str(log_file), lines=100, before=result['start'],
+                            pattern='5')
+    assert result['lines'] == [
+        'line 5', 'line 15', 'line 25', 'line 35', 'line 45', 'line 50',
+        'line 51', 'line 52', 'line 53', 'line 54', 'line 55', 'line 56',
+        'line 57', 'line 58', 'line 59', 'line 65'
+    ]
+    assert result['start'] == 0
@@ -0,0 +1,134 @@
+# SPDX-License-Identifier: AGPL-3.0-or-later
+"""
+Test module for enumerating IP addresses with netlink.
+"""
+
+import socket
+import struct
+from unittest.mock import patch
+
+import pytest
+
+from plinth import addresses
+
+
+def _attribute(attribute_type, value):
+    """Return a padded netlink route attribute."""
+    data = struct.pack('=HH', 4 + len(value), attribute_type) + value
+    return data + b'\0' * (-len(data) % 4)
+
+
+def _address_message(family, address, scope, index, label=None):
+    """Return an RTM_NEWADDR netlink message."""
+    prefix = 64 if family == socket.AF_INET6 else 24
+    payload = struct.pack('=BBBBI', family, prefix, 0, scope, index)
+    payload += _attribute(1, socket.inet_pton(family, address))
+    if label:
+        payload += _attribute(3, label.encode() + b'\0')
+
+    return struct.pack('=IHHII', 16 + len(payload), 20, 2, 1, 0) + payload
+
+
+@pytest.fixture(name='cache', autouse=True)
+def fixture_cache():
+    """Use a clean cache without monitoring."""
+    with patch.object(addresses, '_cache', {
+            'addresses': None,
+            'generation': 0
+    }), patch.object(addresses, '_monitoring', {}):
+        yield
+
+
+@pytest.mark.parametrize('kind, address, scope, interface, url_address', [
+    ('4', '192.168.0.1', 'global', 'eth0', '192.168.0.1'),
+    ('6', '2001:db8::1', 'global', 'eth0', '[2001:db8::1]'),
+    ('6', '::1', 'host', 'lo', '[::1]'),
+    ('6', 'fe80::1', 'link', 'eth0', '[fe80::1%eth0]'),
+])
+def test_get_url_address(kind, address, scope, interface, url_address):
+    """Test formatting addresses for URLs."""
+    assert addresses.get_url_address(kind, address, scope,
+                                     interface) == url_address
+
+
+@patch('socket.if_indextoname')
+def test_parse_messages(if_indextoname):
+    """Test parsing addresses from netlink messages."""
+    if_indextoname.side_effect = OSError
+    data = _address_message(socket.AF_INET6, 'fe80::1', 253, 3) + \
+        _address_message(socket.AF_INET, '10.0.0.1', 0, 3, label='wlan0') + \
+        struct.pack('=IHHII', 20, 3, 2, 1, 0) + b'\0' * 4
+
+    messages = list(addresses._parse_messages(data))
+    assert [message_type for message_type, _ in messages] == [20, 20, 3]
+    assert addresses._parse_address(messages[0][1]) == (3, {
+        'kind': '6',
+        'address': 'fe80::1',
+        'url_address': '[fe80::1%3]',
+        'numeric': True,
+        'scope': 'link',
+        'interface': '3',
+    })
+    assert addresses._parse_address(messages[1][1])[1]['interface'] == 'wlan0'
+
+
+def test_get_ip_addresses():
+    """Test enumerating addresses of the machine from the kernel."""
+    result = addresses.get_ip_addresses()
+    loopback = [address for address in result if address['interface'] == 'lo']
+    assert {
+        'kind': '4',
+        'address': '127.0.0.1',
+        'url_address': '127.0.0.1',
+        'numeric': True,
+        'scope': 'host',
+        'interface': 'lo',
+    } in loopback
+
+    hosts = [address['address'] for address in addresses.get_addresses()]
+    assert hosts[-3:] == ['localhost', 'localhost', socket.gethostname()]
+
+
+@patch('plinth.addresses._dump_addresses')
+def test_cache(dump_addresses):
+    """Test that addresses are cached only while monitoring."""
+    dump_addresses.return_value = [{'kind': '4', 'address': '10.0.0.1'}]
+    addresses.get_ip_addresses()
+    addresses.get_ip_addresses()
+    assert dump_addresses.call_count == 2
+
+    addresses._monitoring['socket'] = None
+    addresses.get_ip_addresses()[0]['address'] = 'changed'
+    assert addresses.get_ip_addresses()[0]['address'] == '10.0.0.1'
+    assert dump_addresses.call_count == 3
+
+    addresses.invalidate()
+    addresses.get_ip_addresses()
+    assert dump_addresses.call_count == 4
+
+
+@patch('plinth.addresses._dump_addresses')
+def test_cache_changed_while_dumping(dump_addresses):
+    """Test that a result is not kept if a change is announced meanwhile."""
+    addresses._monitoring['socket'] = None
+
+    def _dump():
+        addresses.invalidate()
+        return []
+
+    dump_addresses.side_effect = _dump
+    addresses.get_ip_addresses()
+    assert addresses._cache['addresses'] is None
+
+
+def test_on_event():
+    """Test that pending events are read and the cache is dropped."""
+    first, second = socket.socketpair()
+    with first, second:
+        first.setblocking(False)
+        second.send(b'event')
+        addresses._cache['addresses'] = []
+        assert addresses._on_event(None, None, first)
+        assert addresses._cache['addresses'] is None
+        with pytest.raises(BlockingIOError):
+            first.recv(1)
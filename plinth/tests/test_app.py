@@ -4,6 +4,7 @@ Test module for App, base class for all applications.
 """
 
 import collections
+import contextlib
 from unittest.mock import patch
 
 import pytest
@@ -130,6 +131,25 @@ def test_app_disable(app_with_components):
         assert not component.is_enabled()
 
 
+def test_app_change_contexts(app_with_components):
+    """Test that components are enabled/disabled in change contexts."""
+    states = []
+
+    @contextlib.contextmanager
+    def context():
+        states.append('enter')
+        yield
+        states.append('exit')
+
+    with patch.object(App, '_change_contexts', []):
+        App.register_change_context(context)
+        App.register_change_context(context)
+        app_with_components.enable()
+        assert states == ['enter', 'exit']
+        app_with_components.disable()
+        assert states == ['enter', 'exit'] * 2
+
+
 def test_app_is_enabled(app_with_components):
     """Test checking for app enabled."""
     app = app_with_components
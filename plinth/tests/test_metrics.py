@@ -0,0 +1,233 @@
+# SPDX-License-Identifier: AGPL-3.0-or-later
+"""
+Test module for sampling usage of disk space and memory.
+"""
+
+import subprocess
+from unittest.mock import Mock, patch
+
+import pytest
+
+from plinth import metrics
+
+MEMINFO = '''MemTotal:        2048000 kB
+MemFree:          100000 kB
+MemAvailable:     512000 kB
+Buffers:           10000 kB
+HugePages_Total:       0
+'''
+
+
+def _sample(time, value=0):
+    """Return a sample with all values set to a number."""
+    return metrics.Sample(time, *([value] * (len(metrics.Sample._fields) - 1)))
+
+
+def test_history():
+    """Test keeping a fixed number of samples."""
+    history = metrics.History(3)
+    assert len(history) == 0
+    assert history.get_latest() is None
+    assert history.get_samples() == []
+
+    history.append(_sample(1))
+    history.append(_sample(2))
+    assert [sample.time for sample in history.get_samples()] == [1, 2]
+
+    for time in range(3, 8):
+        history.append(_sample(time, value=time * 10))
+
+    assert len(history) == 3
+    assert history.get_latest() == _sample(7, 70)
+    assert [sample.time for sample in history.get_samples()] == [5, 6, 7]
+    assert history.get_samples(since=5) == [_sample(6, 60), _sample(7, 70)]
+
+
+def test_get_disk_usage(tmp_path):
+    """Test reading disk usage with statvfs()."""
+    total, free, percent_used = metrics.get_disk_usage(str(tmp_path))
+    assert 0 < free <= total
+    assert 0 <= percent_used <= 100
+
+
+@pytest.fixture(name='memory_files')
+def fixture_memory_files(tmp_path):
+    """Use temporary meminfo and cgroup files."""
+    meminfo = tmp_path / 'meminfo'
+    meminfo.write_text(MEMINFO)
+    cgroup = tmp_path / 'cgroup'
+    cgroup.mkdir()
+    with patch.object(metrics, 'MEMINFO_PATH', meminfo), \
+            patch.object(metrics, 'CGROUP_PATH', cgroup):
+        yield cgroup
+
+
+def test_get_memory_usage(memory_files):
+    """Test reading memory usage from /proc/meminfo."""
+    assert metrics.get_memory_usage() == (2048000 * 1024, 512000 * 1024, 75)
+
+
+def test_get_memory_usage_cgroup_v2(memory_files):
+    """Test reading memory usage of a limited cgroup v2."""
+    (memory_files / 'memory.max').write_text('1000000\n')
+    (memory_files / 'memory.current').write_text('600000\n')
+    (memory_files / 'memory.stat').write_text('anon 400000\n'
+                                              'inactive_file 100000\n')
+    assert metrics.get_memory_usage() == (1000000, 500000, 50)
+
+    (memory_files / 'memory.max').write_text('max\n')
+    assert metrics.get_memory_usage()[0] == 2048000 * 1024
+
+
+def test_get_memory_usage_cgroup_v1(memory_files):
+    """Test reading memory usage of a limited cgroup v1."""
+    (memory_files / 'memory').mkdir()
+    (memory_files / 'memory' / 'memory.limit_in_bytes').write_text('1000\n')
+    (memory_files / 'memory' / 'memory.usage_in_bytes').write_text('900\n')
+    (memory_files / 'memory' / 'memory.stat').write_text(
+        'cache 300\ntotal_inactive_file 100\n')
+    assert metrics.get_memory_usage() == (1000, 200, 80)
+
+
+@patch('plinth.metrics.get_memory_usage')
+@patch('plinth.metrics.get_disk_usage')
+def test_sample(get_disk_usage, get_memory_usage):
+    """Test taking a sample and passing it to handlers."""
+    get_disk_usage.return_value = (100, 40, 60)
+    get_memory_usage.return_value = (200, 50, 75)
+    handler = Mock()
+    failing_handler = Mock(side_effect=RuntimeError)
+    with patch.object(metrics, '_history', metrics.History(2)), \
+            patch.object(metrics, '_handlers', []):
+        metrics.add_handler(failing_handler)
+        metrics.add_handler(handler)
+        metrics.sample()
+        latest = metrics.get_latest()
+        assert latest[1:] == (100, 40, 60, 200, 50, 75)
+        assert metrics.get_history() == [latest]
+        assert metrics.get_history(since=latest.time) == []
+        handler.assert_called_once_with(latest)
+
+
+def test_get_cgroup_usage_v2(memory_files):
+    """Test reading usage counters of a cgroup from cgroup v2."""
+    (memory_files / 'cgroup.controllers').write_text('cpu io memory\n')
+    control_group = '/system.slice/system-openvpn\\x2dserver.slice/' \
+        'openvpn-server@freedombox.service'
+    assert metrics.get_cgroup_usage(control_group) is None
+
+    unit = memory_files / control_group.lstrip('/')
+    unit.mkdir(parents=True)
+    (unit / 'cpu.stat').write_text('usage_usec 5000\nuser_usec 4000\n')
+    (unit / 'memory.current').write_text('3000\n')
+    (unit / 'memory.stat').write_text('anon 2000\ninactive_file 1000\n')
+    (unit / 'io.stat').write_text(
+        '8:0 rbytes=100 wbytes=200 rios=1 wios=2 dbytes=0 dios=0\n'
+        '8:16 rbytes=10 wbytes=20 rios=1 wios=2 dbytes=0 dios=0\n')
+    assert metrics.get_cgroup_usage(control_group) == (5000, 2000, 110, 220)
+
+    (unit / 'io.stat').unlink()
+    assert metrics.get_cgroup_usage(control_group) == (5000, 2000, 0, 0)
+
+
+def test_get_cgroup_usage_v1(memory_files):
+    """Test reading usage counters of a cgroup from cgroup v1."""
+    control_group = '/system.slice/ssh.service'
+    assert metrics.get_cgroup_usage(control_group) is None
+
+    cpu = memory_files / 'cpu,cpuacct' / 'system.slice' / 'ssh.service'
+    memory = memory_files / 'memory' / 'system.slice' / 'ssh.service'
+    blkio = memory_files / 'blkio' / 'system.slice' / 'ssh.service'
+    for path in (cpu, memory, blkio):
+        path.mkdir(parents=True)
+
+    (cpu / 'cpuacct.usage').write_text('5000000\n')
+    (memory / 'memory.usage_in_bytes').write_text('3000\n')
+    (memory / 'memory.stat').write_text('total_inactive_file 1000\n')
+    (blkio / 'blkio.throttle.io_service_bytes').write_text(
+        '8:0 Read 100\n8:0 Write 200\n8:0 Total 300\nTotal 300\n')
+    assert metrics.get_cgroup_usage(control_group) == (5000, 2000, 100, 200)
+
+
+@patch('subprocess.run')
+def test_get_control_groups(run):
+    """Test finding the cgroups of managed services with systemd."""
+    run.return_value.stdout = b'ControlGroup=/system.slice/ssh.service\n\n' \
+        b'ControlGroup=\n\n' \
+        b'ControlGroup=/system.slice/system-openvpn\\x2dserver.slice/' \
+        b'openvpn-server@freedombox.service\n'
+    units = ['ssh', 'privoxy', 'openvpn-server@freedombox']
+    assert metrics.get_control_groups(units) == {
+        'ssh':
+            '/system.slice/ssh.service',
+        'openvpn-server@freedombox':
+            '/system.slice/system-openvpn\\x2dserver.slice/'
+            'openvpn-server@freedombox.service'
+    }
+    run.assert_called_once_with(
+        ['systemctl', 'show', '--property=ControlGroup', '--'] + units,
+        stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, check=True)
+
+    run.reset_mock()
+    assert metrics.get_control_groups([]) == {}
+    run.assert_not_called()
+
+    run.side_effect = FileNotFoundError
+    assert metrics.get_control_groups(units) == {}
+
+
+@pytest.fixture(name='app_metrics')
+def fixture_app_metrics(tmp_path):
+    """Use temporary files for usage of apps by a fake app."""
+    app = Mock(app_id='testapp')
+    with patch('plinth.cfg.data_dir', str(tmp_path)), \
+            patch.object(metrics, '_app_files', {}), \
+            patch.object(metrics, '_unit_counters', {}), \
+            patch('plinth.app.App.list', return_value=[app]), \
+            patch('plinth.metrics._get_app_units') as get_app_units, \
+            patch('plinth.metrics.get_control_groups') as get_control_groups, \
+            patch('plinth.metrics.get_cgroup_usage') as get_unit_usage, \
+            patch('time.time') as time:
+        get_app_units.return_value = ['ssh', 'openvpn-server@freedombox']
+        get_control_groups.return_value = {
+            'ssh': '/system.slice/ssh.service',
+            'openvpn-server@freedombox': '/system.slice/openvpn.service',
+        }
+        yield app, get_unit_usage, time
+
+
+def test_sample_apps(app_metrics):
+    """Test storing usage of apps as rates."""
+    app, get_unit_usage, time = app_metrics
+    assert metrics.get_app_usage('testapp') is None
+
+    time.return_value = 1000
+    get_unit_usage.side_effect = [(0, 100, 0, 0), None]
+    metrics.sample_apps()
+    assert metrics.get_app_usage('testapp') is None
+
+    time.return_value = 1060
+    get_unit_usage.side_effect = [(30 * 10**6, 100, 600, 0), (0, 50, 0, 60)]
+    metrics.sample_apps()
+    time.return_value = 1120
+    get_unit_usage.side_effect = [(0, 300, 0, 0), (6 * 10**6, 100, 0, 60)]
+    metrics.sample_apps()
+
+    usage = metrics.get_app_usage('testapp')
+    assert usage['current'] == {
+        'cpu': 10,
+        'memory': 400,
+        'io_read': 0,
+        'io_write': 0
+    }
+    assert usage['average'] == {
+        'cpu': 30,
+        'memory': 275,
+        'io_read': 5,
+        'io_write': 0
+    }
+    assert usage['peak']['cpu'] == 50
+    assert metrics.get_apps_usage() == [(app, usage)]
+
+    time.return_value = 1500
+    assert metrics.get_app_usage('testapp')['current'] is None
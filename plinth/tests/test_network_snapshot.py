@@ -0,0 +1,211 @@
+# SPDX-License-Identifier: AGPL-3.0-or-later
+"""
+Test module for the snapshot of network connections and devices.
+"""
+
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from plinth import network
+
+
+def _connection(uuid, name, interface_name, method='auto'):
+    """Return a fake NM connection."""
+    connection = MagicMock()
+    connection.get_id.return_value = name
+    connection.get_uuid.return_value = uuid
+    connection.get_connection_type.return_value = '802-3-ethernet'
+    connection.get_setting_connection.return_value.get_zone.return_value = \
+        'internal'
+    connection.get_interface_name.return_value = interface_name
+    connection.get_setting_ip4_config.return_value.get_method.return_value = \
+        method
+    connection.get_setting_ip6_config.return_value = None
+    return connection
+
+
+@pytest.fixture(name='client')
+def fixture_client():
+    """Return a fake NM client with two connections, one active."""
+    client = MagicMock()
+    connection1 = _connection('uuid-1', 'conn1', 'eth0', method='shared')
+    connection2 = _connection('uuid-2', 'conn2', 'eth1')
+    client.get_connections.return_value = [connection1, connection2]
+
+    device = MagicMock()
+    device.get_iface.return_value = 'eth0'
+    device.get_ip4_config.return_value = None
+    device.get_ip6_config.return_value = None
+    device.get_state.return_value.value_nick = 'activated'
+    device.get_type_description.return_value = 'ethernet'
+    client.get_devices.return_value = [device]
+
+    active_connection = MagicMock()
+    active_connection.get_uuid.return_value = 'uuid-1'
+    active_connection.get_devices.return_value = [device]
+    client.get_active_connections.return_value = [active_connection]
+    client.get_primary_connection.return_value = active_connection
+
+    with patch('plinth.network._client', client), \
+            patch('plinth.network._snapshot', None):
+        yield client
+
+
+def test_snapshot(client):
+    """Test building a snapshot from client objects."""
+    with pytest.raises(Exception):
+        network.get_snapshot()
+
+    network._update_snapshot()
+    snapshot = network.get_snapshot()
+    connections = network.get_connection_list()
+    assert [connection['uuid'] for connection in connections] == \
+        ['uuid-1', 'uuid-2']
+    assert connections[0]['is_active']
+    assert connections[0]['primary']
+    assert not connections[1]['is_active']
+    assert not connections[1]['primary']
+
+    connection = snapshot.get_connection('uuid-1')
+    assert connection['ipv4']['method'] == 'shared'
+    assert 'method' not in connection['ipv6']
+    with pytest.raises(network.ConnectionNotFound):
+        snapshot.get_connection('uuid-3')
+
+    assert snapshot.get_active_connection('uuid-1')['devices'] == ['eth0']
+    with pytest.raises(network.ConnectionNotFound):
+        snapshot.get_active_connection('uuid-2')
+
+    assert snapshot.get_device('eth0')['state'] == 'activated'
+    assert snapshot.get_device('eth1') is None
+
+
+def test_snapshot_immutable(client):
+    """Test that a snapshot does not change with client or callers."""
+    network._update_snapshot()
+    snapshot = network.get_snapshot()
+    snapshot.get_connection('uuid-1')['ipv4']['method'] = 'manual'
+    assert snapshot.get_connection('uuid-1')['ipv4']['method'] == 'shared'
+
+    client.get_connections.return_value = []
+    assert len(snapshot.get_connection_list()) == 2
+    network._update_snapshot()
+    assert network.get_connection_list() == []
+    assert len(snapshot.get_connection_list()) == 2
+
+
+@patch('plinth.network.glib.idle_add')
+def test_schedule_update(idle_add, client):
+    """Test that updates are coalesced until the main loop is idle."""
+    network._schedule_update()
+    network._schedule_update()
+    idle_add.assert_called_once()
+    network._update_snapshot()
+    network._schedule_update()
+    assert idle_add.call_count == 2
+    network._update_snapshot()
+
+
+def test_shared_interfaces(client):
+    """Test finding interfaces shared by active connections."""
+    from plinth.modules import networks
+    network._update_snapshot()
+    assert networks._get_shared_interfaces() == ['eth0']
+
+
+def _access_point(ssid, strength):
+    """Return a fake NM access point."""
+    access_point = MagicMock()
+    access_point.get_ssid.return_value.get_data.return_value = ssid
+    access_point.get_strength.return_value = strength
+    access_point.get_frequency.return_value = 2412
+    return access_point
+
+
+def _wifi_device(interface_name, access_points):
+    """Return a fake NM Wi-Fi device."""
+    device = MagicMock()
+    device.get_iface.return_value = interface_name
+    device.get_device_type.return_value = network.nm.DeviceType.WIFI
+    device.get_ip4_config.return_value = None
+    device.get_ip6_config.return_value = None
+    device.get_bitrate.return_value = 54000
+    device.get_access_points.return_value = access_points
+    return device
+
+
+@patch('plinth.network.glib.idle_add')
+def test_wifi_scan(idle_add, client):
+    """Test scanning for access points on all Wi-Fi devices."""
+    wlan0 = _wifi_device('wlan0', [_access_point(b'net1', 40)])
+    wlan1 = _wifi_device(
+        'wlan1', [_access_point(b'net1', 70),
+                  _access_point(b'net2', 50)])
+    client.get_devices.return_value = [wlan0, wlan1]
+    with patch('plinth.network._wifi_scan', {
+            'time': None,
+            'requested': None,
+            'failed': None,
+            'pending': {}
+    }):
+        network.request_wifi_scan()
+        network._request_wifi_scan(None)
+        wlan0.request_scan_async.assert_called_once()
+        status = network.get_wifi_scan_status()
+        assert status['pending'] == {'wlan0', 'wlan1'}
+        assert status['requested']
+        assert not status['time']
+
+        # Not scanned again while scanning
+        network._request_wifi_scan(None)
+        wlan0.request_scan_async.assert_called_once()
+
+        network._on_wifi_scanned(wlan0, None)
+        wlan1.request_scan_finish.side_effect = network.glib.Error('Busy')
+        network._on_wifi_scan_requested(wlan1, None, None)
+        status = network.get_wifi_scan_status()
+        assert not status['pending']
+        assert status['time']
+        assert status['failed']
+
+    network._update_snapshot()
+    assert network.has_wifi_devices()
+    assert network.wifi_scan() == [{
+        'interface_name': 'wlan1',
+        'ssid': b'net1',
+        'strength': 70
+    }, {
+        'interface_name': 'wlan1',
+        'ssid': b'net2',
+        'strength': 50
+    }]
+    assert network.get_status_from_wifi_access_point(
+        network.get_snapshot().get_device('wlan0'), b'net1') == {
+            'strength': 40,
+            'channel': 1
+        }
+
+
+@patch('plinth.network.glib.idle_add')
+def test_wifi_scan_stale(idle_add, client):
+    """Test that interfaces which never finish scanning are not waited for."""
+    wlan0 = _wifi_device('wlan0', [])
+    wlan1 = _wifi_device('wlan1', [])
+    client.get_devices.return_value = [wlan0, wlan1]
+    with patch('plinth.network._wifi_scan', {
+            'time': None,
+            'requested': None,
+            'failed': None,
+            'pending': {}
+    }), patch('time.time') as time:
+        time.return_value = 1000
+        network._request_wifi_scan(None)
+        network._on_device_removed(client, wlan1)
+        assert network.get_wifi_scan_status()['pending'] == {'wlan0'}
+
+        time.return_value = 1000 + network.WIFI_SCAN_TIMEOUT + 1
+        assert not network.get_wifi_scan_status()['pending']
+        network._request_wifi_scan(None)
+        assert wlan0.request_scan_async.call_count == 2
+        assert network.get_wifi_scan_status()['pending'] == {'wlan0', 'wlan1'}
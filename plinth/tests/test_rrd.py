@@ -0,0 +1,72 @@
+# SPDX-License-Identifier: AGPL-3.0-or-later
+"""
+Test module for round robin files of time series.
+"""
+
+import time
+
+import pytest
+
+from plinth.rrd import RoundRobinFile
+
+
+@pytest.fixture(name='rrd_file')
+def fixture_rrd_file(tmp_path):
+    """Return a round robin file with three small archives."""
+    return RoundRobinFile(str(tmp_path / 'metrics' / 'test.rrd'),
+                          ('first', 'second'), [(10, 4), (20, 4), (60, 2)])
+
+
+def test_empty(rrd_file):
+    """Test reading a file that does not exist yet."""
+    assert rrd_file.read() == []
+
+
+def test_append(rrd_file, tmp_path):
+    """Test that records wrap around in an archive of fixed size."""
+    for time_ in range(0, 50, 10):
+        rrd_file.append(time_, (time_ / 10, 1))
+
+    size = (tmp_path / 'metrics' / 'test.rrd').stat().st_size
+    assert rrd_file.read() == [(10, 1, 1), (20, 2, 1), (30, 3, 1),
+                               (40, 4, 1)]
+    assert rrd_file.read(since=20, archive=0) == [(30, 3, 1), (40, 4, 1)]
+
+    for time_ in range(50, 200, 10):
+        rrd_file.append(time_, (time_ / 10, 1))
+
+    assert (tmp_path / 'metrics' / 'test.rrd').stat().st_size == size
+
+
+def test_downsample(rrd_file):
+    """Test averaging records into the following archives."""
+    for time_ in range(0, 130, 10):
+        rrd_file.append(time_, (time_, 2))
+
+    assert rrd_file.read(archive=1) == [(40, 45, 2), (60, 65, 2),
+                                        (80, 85, 2), (100, 105, 2)]
+    assert rrd_file.read(archive=2) == [(0, 25, 2)]
+
+
+def test_incompatible_file(rrd_file, tmp_path):
+    """Test that a file with other fields or archives is replaced."""
+    rrd_file.append(10, (1, 2))
+    other_file = RoundRobinFile(rrd_file.path, ('first', ),
+                                [(10, 4), (20, 4), (60, 2)])
+    assert other_file.read() == []
+    other_file.append(20, (3, ))
+    assert other_file.read() == [(20, 3)]
+    assert rrd_file.read() == []
+
+    with pytest.raises(ValueError):
+        rrd_file.append(30, (1, ))
+
+
+def test_choose_archive(rrd_file):
+    """Test reading from the finest archive covering a period."""
+    assert rrd_file._choose_archive(None) == 0
+    now = time.time()
+    assert rrd_file._choose_archive(now - 30) == 0
+    assert rrd_file._choose_archive(now - 50) == 1
+    assert rrd_file._choose_archive(now - 100) == 2
+    assert rrd_file._choose_archive(now - 1000) == 2
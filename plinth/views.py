@@ -16,7 +16,7 @@ from django.views.generic import TemplateView
 from django.views.generic.edit import FormView
 from stronghold.decorators import public
 
-from plinth import app, package
+from plinth import app, metrics, package
 from plinth.daemon import app_is_running
 from plinth.modules.config import get_advanced_mode
 from plinth.modules.firewall.components import get_port_forwarding_info
@@ -251,6 +251,7 @@ class AppView(FormView):
         context['app_info'] = self.app.info
         context['has_diagnostics'] = self.app.has_diagnostics()
         context['port_forwarding_info'] = get_port_forwarding_info(self.app)
+        context['resource_usage'] = metrics.get_app_usage(self.app.app_id)
         context['app_enable_disable_form'] = self.get_enable_disable_form()
 
         from plinth.modules.firewall.components import Firewall
@@ -291,6 +291,7 @@ setuptools.setup(
     install_requires=[
         'cherrypy >= 3.0',
         'configobj',
+        'cryptography',
         'django >= 1.11.0',
         'django-bootstrap-form',
         'django-simple-captcha',
@@ -298,6 +299,7 @@ setuptools.setup(
         'psutil',
         'python-apt',
         'python-augeas',
+        'python-ldap',
         'requests',
         'ruamel.yaml',
     ],